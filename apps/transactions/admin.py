@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import search
 from .models import Category, Transaction, Budget
 
 
@@ -22,6 +23,15 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ["transaction_type", "category", "user", "date"]
     search_fields = ["description", "user__email"]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Descriptions through the full-text index rather than LIKE '%term%'
+        if not search_term:
+            return queryset, False
+        return (
+            search.matching(queryset, search_term)
+            | queryset.filter(user__email__icontains=search_term)
+        ), False
+
 
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
@@ -0,0 +1,165 @@
+"""
+Async versions of the analytics endpoints, for serving through ASGI.
+
+They return the same JSON as the DRF actions (authentication, throttling,
+response caching and replica routing included), but their queries, the
+throttle store and the cache are used from the db_threads pool, with
+independent queries run concurrently, so a slow report does not hold the
+event loop while it waits on the database or a file lock.
+"""
+
+import functools
+
+from django.http import Http404, JsonResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from fintrack import instrumentation, routing
+from . import caching, db_threads, rollups
+from .models import Budget
+from .serializers import budget_status
+from .views import recurring_summary_data, summary_data, summary_range
+
+
+def _json(data, status=200, headers=None):
+    # Byte for byte what DRF's JSONRenderer produces
+    return JsonResponse(
+        data,
+        status=status,
+        headers=headers,
+        safe=False,
+        encoder=JSONEncoder,
+        json_dumps_params={"separators": (",", ":"), "ensure_ascii": False},
+    )
+
+
+def _authenticate(request):
+    for authenticator_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    raise exceptions.NotAuthenticated
+
+
+def _authenticate_header(request):
+    authenticator = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+    return authenticator.authenticate_header(request)
+
+
+def _check_throttles(request):
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            raise exceptions.Throttled(throttle.wait())
+
+
+def _start(request, endpoint, kwargs):
+    """
+    Authenticate and throttle ``request``, choose its database and look its
+    response up in the cache: (cache key, cached data or None). All of it
+    can block (a user query, the throttle file lock, a file-based cache), so
+    it runs on the pool rather than the event loop.
+    """
+    # Usually no query (token claims), but may load the user
+    request.user = _authenticate(request)
+    _check_throttles(request)
+    routing.read_from_replica(request)
+    key = caching.response_key(request.user.pk, endpoint, request.GET, kwargs)
+    return key, caching.lookup(endpoint, key)
+
+
+def _handle_exception(request, exc):
+    """The response DRF's exception handler makes for ``exc``, as in APIView."""
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        auth_header = _authenticate_header(request)
+        if auth_header:
+            exc.auth_header = auth_header
+        else:
+            exc.status_code = 403
+    context = {"request": request, "view": None, "args": (), "kwargs": {}}
+    response = api_settings.EXCEPTION_HANDLER(exc, context)
+    if response is None:
+        raise exc
+    headers = {
+        name: value for name, value in response.items() if name != "Content-Type"
+    }
+    return _json(response.data, response.status_code, headers)
+
+
+def analytics_view(endpoint):
+    """
+    Wrap an async view returning response data: GET only, authenticated,
+    throttled and cached like the DRF actions, with errors rendered by the
+    DRF exception handler.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, **kwargs):
+            try:
+                if request.method != "GET":
+                    raise exceptions.MethodNotAllowed(request.method)
+                key, data = await db_threads.run(_start, request, endpoint, kwargs)
+                if data is not None:
+                    return _json(data, headers={"X-Cache": "HIT"})
+                data = await view(request, **kwargs)
+            except Exception as exc:
+                return _handle_exception(request, exc)
+
+            await db_threads.run(caching.store, key, data)
+            return _json(data, headers={"X-Cache": "MISS"})
+
+        return wrapper
+
+    return decorator
+
+
+@analytics_view("summary")
+async def summary(request):
+    start_date, end_date = summary_range(request.GET)
+    # The daily and monthly rollup queries run concurrently
+    totals = await rollups.atotals(
+        request.user,
+        start_date,
+        end_date,
+        group_by=["transaction_type", "category__name"],
+    )
+    with instrumentation.timing("serialize"):
+        return summary_data(start_date, end_date, totals)
+
+
+@analytics_view("recurring_summary")
+async def recurring_summary(request):
+    totals = await db_threads.run(rollups.recurring_totals, request.user)
+    with instrumentation.timing("serialize"):
+        return recurring_summary_data(totals)
+
+
+def _budgets(user):
+    return rollups.annotate_budget_spending(
+        Budget.objects.filter(user=user).select_related("category")
+    )
+
+
+def _budget_status(user, pk):
+    budget = _budgets(user).filter(pk=pk).first()
+    if budget is None:
+        raise Http404(f"No {Budget._meta.object_name} matches the given query.")
+    with instrumentation.timing("serialize"):
+        return budget_status(budget)
+
+
+def _budget_status_list(user):
+    with instrumentation.timing("serialize"):
+        return [budget_status(budget) for budget in _budgets(user).order_by("id")]
+
+
+@analytics_view("budget_status")
+async def budget_status_detail(request, pk):
+    return await db_threads.run(_budget_status, request.user, pk)
+
+
+@analytics_view("budget_status_list")
+async def budget_status_list(request):
+    return await db_threads.run(_budget_status_list, request.user)
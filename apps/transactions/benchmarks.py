@@ -0,0 +1,478 @@
+"""
+Benchmark scenarios for ``manage.py benchmark``.
+
+Each scenario receives a seeded ``BenchmarkContext`` (a user with
+transactions and budgets in a throwaway test database) and yields result
+rows as dicts, which the command prints as a table.
+"""
+
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from . import rollups
+from .models import Budget, Category, Transaction
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def timed(func, repeat):
+    """Median wall time of ``func()`` in milliseconds, plus its query count."""
+    func()  # Warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(ctx.captured_queries)
+
+
+class BenchmarkContext:
+    def __init__(self, rows, repeat):
+        self.rows = rows
+        self.repeat = repeat
+        self.user = User.objects.create_user(
+            email="bench@example.com", username="bench", password="bench-pass-1"
+        )
+        self.categories = [
+            Category.objects.create(name=f"Category {i}", user=self.user)
+            for i in range(20)
+        ]
+        self.seed_transactions(rows)
+        for i, category in enumerate(self.categories):
+            Budget.objects.create(
+                user=self.user,
+                category=category,
+                amount=Decimal("1000.00"),
+                start_date=date(2020, 1, 1),
+                end_date=date(2020, 12, 31),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed_transactions(self, rows):
+        rng = random.Random(42)
+        start = date.today() - timedelta(days=3650)
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    user=self.user,
+                    category=rng.choice(self.categories),
+                    amount=Decimal(rng.randint(100, 500000)) / 100,
+                    description=f"Benchmark transaction {i}",
+                    transaction_type=rng.choice(["income", "expense", "expense"]),
+                    date=start + timedelta(days=rng.randint(0, 3649)),
+                    is_recurring=i % 50 == 0,
+                    recurring_type=(
+                        rng.choice(["weekly", "monthly", "yearly"])
+                        if i % 50 == 0
+                        else "none"
+                    ),
+                )
+                for i in range(rows)
+            ),
+            batch_size=500,
+        )
+        rollups.rebuild(user_id=self.user.pk)
+
+
+@scenario
+def list_rendering(ctx):
+    """Transaction and budget lists: ModelSerializer vs RowMapper."""
+    from .views import BudgetViewSet, TransactionViewSet
+
+    cases = [
+        (
+            TransactionViewSet,
+            f"/api/transactions/?pagination=cursor&page_size={page_size}",
+            page_size,
+        )
+        for page_size in (10, 100, 1000)
+    ]
+    cases.append((BudgetViewSet, "/api/budgets/", len(ctx.categories)))
+
+    for viewset, url, page_size in cases:
+        request = lambda: ctx.client.get(url)  # noqa: E731
+        with patch.object(viewset, "use_row_mapper", return_value=False):
+            slow, slow_queries = timed(request, ctx.repeat)
+        fast, fast_queries = timed(request, ctx.repeat)
+        yield {
+            "endpoint": url.split("?")[0],
+            "page size": page_size,
+            "serializer ms": f"{slow:.1f} ({slow_queries}q)",
+            "row mapper ms": f"{fast:.1f} ({fast_queries}q)",
+            "speedup": f"{slow / fast:.1f}x",
+        }
+
+
+@scenario
+def throttle_checks(ctx):
+    """User throttle checks per second: DRF's cache history vs sliding window."""
+    import tempfile
+
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.throttling import UserRateThrottle
+
+    from apps.users import throttling
+
+    request = APIRequestFactory().get("/api/transactions/")
+    request.user = ctx.user
+    checks = 20000
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = throttling.SlidingWindowStore(f"{directory}/throttle.bin")
+        for rate in ("60/minute", "1000/minute", "10000/minute"):
+            for name, throttle_class in (
+                ("cache history", UserRateThrottle),
+                ("sliding window", throttling.UserSlidingWindowThrottle),
+            ):
+                throttle_class = type(
+                    "BenchmarkThrottle",
+                    (throttle_class,),
+                    {"rate": rate, "store": store},
+                )
+                throttle_class.cache.clear()
+                store.clear()
+                throttle = throttle_class()
+                start = time.perf_counter()
+                for _ in range(checks):
+                    throttle.allow_request(request, None)
+                elapsed = time.perf_counter() - start
+                yield {
+                    "rate": rate,
+                    "throttle": name,
+                    "checks/s": f"{checks / elapsed:,.0f}",
+                }
+
+
+@scenario
+def async_analytics(ctx):
+    """Analytics latency: sync DRF actions vs async views on the DB pool."""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from django.db import close_old_connections
+    from django.test import AsyncClient, Client
+
+    from apps.users.tokens import RefreshToken
+    from . import async_views, caching, db_threads
+
+    token = RefreshToken.for_user(ctx.user).access_token
+    auth = {"headers": {"Authorization": f"Bearer {token}"}}
+    paths = [
+        "transactions/summary/?start_date=2016-01-15&end_date=2025-06-20",
+        "transactions/recurring_summary/",
+        "budgets/status/",
+    ]
+    concurrency = 16
+
+    def sync_batch(url):
+        def get(_):
+            Client().get(url, **auth)
+            close_old_connections()
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(get, range(concurrency)))
+
+    loop = asyncio.new_event_loop()
+    client = AsyncClient()
+
+    async def gather(url, count):
+        await asyncio.gather(*(client.get(url, **auth) for _ in range(count)))
+
+    def async_batch(url, count):
+        loop.run_until_complete(gather(url, count))
+
+    with patch.object(caching, "lookup", return_value=None), patch.object(
+        async_views, "_check_throttles"
+    ):
+        for path in paths:
+            sync_url, async_url = f"/api/{path}", f"/api/async/{path}"
+            sync, _ = timed(lambda: Client().get(sync_url, **auth), ctx.repeat)
+            asynchronous, _ = timed(lambda: async_batch(async_url, 1), ctx.repeat)
+            sync_many, _ = timed(lambda: sync_batch(sync_url), ctx.repeat)
+            async_many, _ = timed(
+                lambda: async_batch(async_url, concurrency), ctx.repeat
+            )
+            yield {
+                "endpoint": path.split("?")[0],
+                "sync ms": f"{sync:.1f}",
+                "async ms": f"{asynchronous:.1f}",
+                f"sync x{concurrency} ms": f"{sync_many:.1f}",
+                f"async x{concurrency} ms": f"{async_many:.1f}",
+                # Threads blocked on the database during the concurrent run
+                "threads sync/async": f"{concurrency}/"
+                f"{db_threads.executor()._max_workers}",
+            }
+    loop.close()
+
+
+@scenario
+def transaction_writes(ctx):
+    """Single-transaction creates per second: model re-validation vs trusted save."""
+    from rest_framework.serializers import ModelSerializer
+
+    from .serializers import TransactionSerializer
+
+    # ModelSerializer.create saves through Transaction.save(), so full_clean()
+    # validates everything a second time
+    payload = {
+        "amount": "42.50",
+        "description": "Benchmark <b>write</b>  with   markup",
+        "transaction_type": "expense",
+        "date": date.today().isoformat(),
+        "category": ctx.categories[0].pk,
+    }
+    request = lambda: ctx.client.post(  # noqa: E731
+        "/api/transactions/", payload, format="json"
+    )
+    with patch.object(TransactionSerializer, "create", ModelSerializer.create):
+        slow, slow_queries = timed(request, ctx.repeat)
+    fast, fast_queries = timed(request, ctx.repeat)
+    yield {
+        "endpoint": "POST /api/transactions/",
+        "full_clean writes/s": f"{1000 / slow:,.0f} ({slow_queries}q)",
+        "trusted writes/s": f"{1000 / fast:,.0f} ({fast_queries}q)",
+        "speedup": f"{slow / fast:.1f}x",
+    }
+
+
+@scenario
+def budget_bulk_create(ctx):
+    """A year of monthly budgets for every category: one POST each vs bulk."""
+    import calendar
+    import itertools
+
+    years = itertools.count(2100)  # A fresh, non-overlapping year per run
+
+    def payload():
+        year = next(years)
+        return [
+            {
+                "category": category.pk,
+                "amount": "250.00",
+                "start_date": date(year, month, 1).isoformat(),
+                "end_date": date(
+                    year, month, calendar.monthrange(year, month)[1]
+                ).isoformat(),
+            }
+            for category in ctx.categories
+            for month in range(1, 13)
+        ]
+
+    def one_by_one():
+        for item in payload():
+            ctx.client.post("/api/budgets/", item, format="json")
+
+    def bulk():
+        ctx.client.post("/api/budgets/bulk/", payload(), format="json")
+
+    repeat = min(ctx.repeat, 5)
+    slow, slow_queries = timed(one_by_one, repeat)
+    fast, fast_queries = timed(bulk, repeat)
+    yield {
+        "budgets": len(ctx.categories) * 12,
+        "one by one ms": f"{slow:.1f} ({slow_queries}q)",
+        "bulk ms": f"{fast:.1f} ({fast_queries}q)",
+        "speedup": f"{slow / fast:.1f}x",
+    }
+
+
+@scenario
+def trend_analytics(ctx):
+    """Trends over the seeded ten years: row fetch and compute, by backend."""
+    from . import trends
+
+    end = date.today()
+    fetch, _ = timed(lambda: trends.rows(ctx.user, None, end), ctx.repeat)
+    rows = trends.rows(ctx.user, None, end)
+    backends = [("python", None)]
+    if trends.np is not None:
+        backends.insert(0, ("numpy", trends.np))
+    for name, module in backends:
+        with patch.object(trends, "np", module):
+            compute, _ = timed(lambda: trends.trends(rows, None, end), ctx.repeat)
+        yield {
+            "backend": name,
+            "rollup rows": len(rows),
+            "fetch ms": f"{fetch:.1f}",
+            "compute ms": f"{compute:.1f}",
+        }
+
+
+@scenario
+def balance_forecast(ctx):
+    """Projected balance from every recurring template, by backend and horizon."""
+    from . import forecast
+
+    templates = forecast.recurring.templates(ctx.user.pk).count()
+    backends = [("python", None)]
+    if forecast.np is not None:
+        backends.insert(0, ("numpy", forecast.np))
+    for months, granularity in ((12, "monthly"), (60, "daily")):
+        for name, module in backends:
+            with patch.object(forecast, "np", module):
+                elapsed, queries = timed(
+                    lambda: forecast.forecast(ctx.user, months, granularity),
+                    ctx.repeat,
+                )
+            yield {
+                "horizon": f"{months} months {granularity}",
+                "backend": name,
+                "templates": templates,
+                "ms": f"{elapsed:.1f} ({queries}q)",
+            }
+
+
+@scenario
+def description_search(ctx):
+    """Description search, first page: LIKE scans vs the FTS5 index."""
+    from . import search
+
+    if not search.available(connection.alias):
+        return
+    for text in (
+        f"transaction {ctx.rows // 7}",
+        f"transaction {ctx.rows // 700}",
+        "bench",
+    ):
+        url = f"/api/transactions/?pagination=cursor&page_size=50&search={text}"
+        request = lambda: ctx.client.get(url)  # noqa: E731
+        with patch.object(search, "available", return_value=False):
+            slow, slow_queries = timed(request, ctx.repeat)
+        fast, fast_queries = timed(request, ctx.repeat)
+        yield {
+            "search": text,
+            "matches": search.matching(Transaction.objects.all(), text).count(),
+            "LIKE ms": f"{slow:.1f} ({slow_queries}q)",
+            "FTS5 ms": f"{fast:.1f} ({fast_queries}q)",
+            "speedup": f"{slow / fast:.1f}x",
+        }
+
+
+@scenario
+def conditional_get(ctx):
+    """App-open refresh of unchanged data: full response vs 304 revalidation."""
+    for url in (
+        "/api/transactions/?pagination=cursor&page_size=100",
+        "/api/categories/",
+        "/api/budgets/?include_status=true",
+    ):
+        etag = ctx.client.get(url)["ETag"]
+        full, full_queries = timed(lambda: ctx.client.get(url), ctx.repeat)
+        cached, cached_queries = timed(
+            lambda: ctx.client.get(url, HTTP_IF_NONE_MATCH=etag), ctx.repeat
+        )
+        yield {
+            "endpoint": url,
+            "200 ms": f"{full:.1f} ({full_queries}q)",
+            "304 ms": f"{cached:.2f} ({cached_queries}q)",
+            "speedup": f"{full / cached:.0f}x",
+        }
+
+
+@scenario
+def json_rendering(ctx):
+    """1000-row transaction pages: stdlib json vs orjson, by content coding."""
+    from fintrack import compression, fastjson
+
+    url = "/api/transactions/?pagination=cursor&page_size=1000"
+    data = ctx.client.get(url).data
+    renderer = fastjson.FastJSONRenderer()
+    backends = [("stdlib", None)]
+    if fastjson.orjson is not None:
+        backends.append(("orjson", fastjson.orjson))
+    codings = ["identity", "gzip"]
+    if compression.brotli is not None:
+        codings.append("br")
+    for name, module in backends:
+        with patch.object(fastjson, "orjson", module):
+            render, _ = timed(lambda: renderer.render(data), ctx.repeat)
+            for coding in codings:
+                request = lambda: ctx.client.get(  # noqa: E731
+                    url, HTTP_ACCEPT_ENCODING=coding
+                )
+                elapsed, _ = timed(request, ctx.repeat)
+                yield {
+                    "renderer": name,
+                    "encoding": coding,
+                    "render ms": f"{render:.1f}",
+                    "request ms": f"{elapsed:.1f}",
+                    "rows/s": f"{1000 / elapsed * 1000:,.0f}",
+                    "KiB": f"{len(request().content) / 1024:.0f}",
+                }
+
+
+@scenario
+def instrumentation_overhead(ctx):
+    """
+    Cost of the instrumentation middleware per request and per query, and
+    as a share of typical requests. Measured directly, as the difference is
+    well below the run-to-run noise of whole requests.
+    """
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from fintrack import instrumentation
+
+    def per_call(func, calls=20000):
+        func()
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(calls):
+                func()
+            timings.append((time.perf_counter() - start) / calls * 1e6)
+        return min(timings)
+
+    def view(request):
+        with instrumentation.timing("render"):
+            return HttpResponse()
+
+    request = RequestFactory().get("/api/transactions/")
+    middleware = instrumentation.InstrumentationMiddleware(view)
+    per_request = per_call(lambda: middleware(request)) - per_call(
+        lambda: view(request)
+    )
+
+    with connection.cursor() as cursor:
+        execute = lambda: cursor.execute("SELECT 1")  # noqa: E731
+        connection.execute_wrappers.remove(instrumentation._execute_wrapper)
+        bare = per_call(execute)
+        instrumentation._install(connection)
+        token = instrumentation._request_state.set(instrumentation.RequestState())
+        try:
+            per_query = per_call(execute) - bare
+        finally:
+            instrumentation._request_state.reset(token)
+
+    transaction_id = Transaction.objects.filter(user=ctx.user).values("id")[:1][0]
+    for url in (
+        f"/api/transactions/{transaction_id['id']}/",
+        "/api/transactions/",
+        "/api/transactions/?pagination=cursor&page_size=1000",
+        "/api/transactions/summary/",
+    ):
+        elapsed, queries = timed(lambda: ctx.client.get(url), ctx.repeat)
+        overhead = (per_request + queries * per_query) / 1000
+        yield {
+            "endpoint": url,
+            "request ms": f"{elapsed:.2f} ({queries}q)",
+            "per request us": f"{per_request:.1f}",
+            "per query us": f"{per_query:.1f}",
+            "overhead": f"{overhead / elapsed:.2%}",
+        }
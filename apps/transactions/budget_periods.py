@@ -0,0 +1,92 @@
+"""
+Budget period checks and lookups.
+
+A user's budgets for one category must not overlap (both ends inclusive).
+``overlap_errors`` checks any number of new periods against each other and
+the stored ones with one query and a sort-and-sweep per category, instead
+of an ``exists()`` query per budget.
+
+Because the periods in a category are disjoint, the only budget that can
+cover a day is the one with the latest start on or before it.
+``covering_budgets`` finds it with a single seek on the
+(user, category, start_date, end_date) index per category.
+"""
+
+from collections import defaultdict, namedtuple
+
+from django.db.models import OuterRef, Subquery
+
+from .models import Budget, Category
+
+# index: position in the submitted list; budget_id: a stored budget
+Period = namedtuple("Period", ["start", "end", "index", "budget_id"])
+
+
+def find_overlaps(periods):
+    """
+    Pairs of overlapping periods. Every period that overlaps any other one
+    is in at least one pair.
+    """
+    pairs = []
+    current = None  # The period seen so far that ends last
+    for period in sorted(periods, key=lambda p: (p.start, p.end)):
+        if current is not None and period.start <= current.end:
+            pairs.append((current, period))
+            if period.end <= current.end:
+                continue
+        current = period
+    return pairs
+
+
+def overlap_errors(user, items):
+    """
+    Error messages for each of ``items`` (dicts with ``category``,
+    ``start_date`` and ``end_date``), keyed by position, for those that
+    overlap another item or one of ``user``'s budgets.
+    """
+    by_category = defaultdict(list)
+    for index, item in enumerate(items):
+        by_category[item["category"].pk].append(
+            Period(item["start_date"], item["end_date"], index, None)
+        )
+    if not by_category:
+        return {}
+
+    existing = Budget.objects.filter(
+        user=user,
+        category_id__in=by_category,
+        start_date__lte=max(item["end_date"] for item in items),
+        end_date__gte=min(item["start_date"] for item in items),
+    ).values_list("category_id", "start_date", "end_date", "id")
+    for category_id, start, end, pk in existing:
+        by_category[category_id].append(Period(start, end, None, pk))
+
+    errors = defaultdict(list)
+    for periods in by_category.values():
+        for first, second in find_overlaps(periods):
+            for period, other in ((first, second), (second, first)):
+                if period.index is None:
+                    continue  # Stored budgets are not re-validated
+                if other.index is None:
+                    message = "A budget already exists for this date range."
+                else:
+                    message = f"Overlaps budget {other.index} in this request."
+                errors[period.index].append(message)
+    return errors
+
+
+def covering_budgets(user, day, category=None):
+    """
+    ``user``'s budgets whose period includes ``day``, at most one per
+    category, optionally only for ``category``.
+    """
+    latest = (
+        Budget.objects.filter(user=user, category=OuterRef("pk"), start_date__lte=day)
+        .order_by("-start_date")
+        .values("id")[:1]
+    )
+    categories = Category.objects.filter(user=user)
+    if category is not None:
+        categories = categories.filter(pk=category)
+    candidates = categories.annotate(budget_id=Subquery(latest)).values("budget_id")
+    return Budget.objects.filter(pk__in=candidates, end_date__gte=day)
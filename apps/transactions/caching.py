@@ -0,0 +1,131 @@
+"""
+Per-user versioned response cache for the analytics endpoints.
+
+Each user has a data version stored in the cache. Responses are cached
+under a key that includes that version and today's date, and any write to the user's
+transactions, budgets or categories bumps it, so invalidation is a single
+``incr`` no matter how many responses are cached: stale entries are simply
+never looked up again and expire on their own.
+
+Responses read from a replica are not stored: cached under the user's
+current data version, a lagging snapshot would be served for as long as
+the entry lives, long after the replica has caught up.
+
+Uses Django's default cache. With more than one worker process the cache
+must be shared (file-based, memcached, redis); see CACHES in settings.
+"""
+
+import functools
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from fintrack import routing
+
+KEY_PREFIX = "fintrack:analytics"
+RESPONSE_TIMEOUT = 60 * 60
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _version_key(user_id):
+    return f"{KEY_PREFIX}:version:{user_id}"
+
+
+def _new_version():
+    # Versions start from a clock value rather than 1, so a version key that
+    # is evicted and recreated can never match responses cached before.
+    return time.time_ns()
+
+
+def data_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:  # No version yet, so nothing cached to invalidate
+        pass
+
+
+def bump_version(*user_ids):
+    """Invalidate every cached analytics response of these users."""
+    for user_id in set(user_ids):
+        _bump(user_id)
+        # Bump again once the write is visible to other connections, in case
+        # a concurrent request cached a response computed before the commit.
+        transaction.on_commit(functools.partial(_bump, user_id))
+
+
+def _count(endpoint, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+
+def stats():
+    """Hit/miss counters per endpoint for this process."""
+    with _stats_lock:
+        return {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+
+
+def response_key(user_id, endpoint, query_params, view_kwargs):
+    params = sorted((key, sorted(query_params.getlist(key))) for key in query_params)
+    params.extend(sorted(view_kwargs.items()))
+    # Date ranges left out of the query default to ones ending today, so a
+    # response cached yesterday answers a different question
+    params.append(("today", timezone.now().date().isoformat()))
+    digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f"{KEY_PREFIX}:{user_id}:{data_version(user_id)}:{endpoint}:{digest}"
+
+
+def lookup(endpoint, key):
+    """The cached data under ``key``, or None; counted as a hit or miss."""
+    data = cache.get(key)
+    _count(endpoint, "misses" if data is None else "hits")
+    return data
+
+
+def store(key, data):
+    if routing.reading_from_replica():
+        return
+    cache.set(key, data, RESPONSE_TIMEOUT)
+
+
+def cached_response(endpoint):
+    """
+    Cache a view method's successful responses per user, endpoint, query
+    parameters and URL kwargs, until the user's data version changes.
+    """
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = response_key(request.user.pk, endpoint, request.query_params, kwargs)
+            data = lookup(endpoint, key)
+            if data is not None:
+                response = Response(data)
+                response["X-Cache"] = "HIT"
+                return response
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                store(key, response.data)
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
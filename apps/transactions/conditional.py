@@ -0,0 +1,114 @@
+"""
+Conditional GET for the list and detail endpoints.
+
+Each user has a version stamp per resource (``categories``,
+``transactions``, ``budgets``) in the cache: the time in nanoseconds of
+the last write to it, set by the write itself. A response's strong ETag
+is a hash of the stamps of the resources it is built from, the user and
+the requested URL and media type; its Last-Modified is the newest of those
+stamps. A request whose If-None-Match (or If-Modified-Since) still matches
+gets a 304 after a single cache lookup, before any query runs.
+
+Last-Modified has one-second resolution, so it is the newest stamp rounded
+up, and is only sent once that second is over: a later write then always
+moves it on, and cannot leave If-Modified-Since matching a stale copy.
+
+A response read from a replica may be older than the stamps, so it gets no
+validators. Revalidating it costs a full response, never a 304 for a stale
+body. Copies made from the primary still revalidate as usual.
+
+As with the analytics cache, the cache must be shared between worker
+processes. A stamp that is evicted is recreated from the clock, which only
+makes clients download the resource once more.
+"""
+
+import functools
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from fintrack import routing
+
+KEY_PREFIX = "fintrack:stamps"
+
+
+def _stamp_key(user_id, resource):
+    return f"{KEY_PREFIX}:{user_id}:{resource}"
+
+
+def stamps(user_id, resources):
+    """The version stamp of each of ``user_id``'s ``resources``."""
+    keys = [_stamp_key(user_id, resource) for resource in resources]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def _touch(user_id, resource):
+    key = _stamp_key(user_id, resource)
+    # Strictly increasing, even if two writes read the same clock value
+    cache.set(key, max(time.time_ns(), (cache.get(key) or 0) + 1), timeout=None)
+
+
+def touch(resource, *user_ids):
+    """Record a write to ``resource`` by each of ``user_ids``."""
+    for user_id in set(user_ids):
+        _touch(user_id, resource)
+        # Again once the write is visible to other connections, in case a
+        # concurrent request served the old rows under the new stamp
+        transaction.on_commit(functools.partial(_touch, user_id, resource))
+
+
+def validators(request, resources):
+    """(ETag, Last-Modified timestamp) of the response to ``request``."""
+    values = stamps(request.user.pk, resources)
+    key = repr(
+        (
+            request.user.pk,
+            values,
+            request.build_absolute_uri(),
+            request.accepted_media_type,
+        )
+    )
+    digest = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"', -(-max(values) // 1_000_000_000)
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified on ``list`` and ``retrieve`` responses, from the
+    stamps of ``etag_resources``; 304 when the client's copy is current.
+    """
+
+    etag_resources = ()
+
+    def get_etag_resources(self):
+        return self.etag_resources
+
+    def conditional(self, view_method, request, *args, **kwargs):
+        etag, last_modified = validators(request, self.get_etag_resources())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            if routing.reading_from_replica():
+                return response
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified <= time.time():
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
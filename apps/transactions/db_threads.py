@@ -0,0 +1,49 @@
+"""
+A bounded thread pool for running ORM calls from async views.
+
+Django's database backends are synchronous (its async ORM runs every query
+on one shared thread), so async views hand their queries to this pool
+instead. Each pool thread keeps its own persistent connection, which lets
+independent queries of one request run at the same time. At most
+``ASYNC_DB_THREADS`` queries run at once per process.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "ASYNC_DB_THREADS", 8),
+            thread_name_prefix="fintrack-db",
+        )
+    return _executor
+
+
+def _call(func, args, kwargs):
+    # Pool threads never see request_started/finished, which is where
+    # Django normally drops expired or broken connections
+    close_old_connections()
+    return func(*args, **kwargs)
+
+
+async def run(func, *args, **kwargs):
+    """Run ``func`` on the pool, in the caller's context (e.g. DB routing)."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor(), functools.partial(context.run, _call, func, args, kwargs)
+    )
+
+
+async def gather(*calls):
+    """Run several ``(func, *args)`` calls concurrently; results in order."""
+    return await asyncio.gather(*(run(*call) for call in calls))
@@ -0,0 +1,78 @@
+"""
+Streaming transaction export.
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` and encoded
+directly to CSV or NDJSON text, one chunk at a time, so an export never
+holds more than ``chunk_size`` rows in memory and the first bytes are sent
+as soon as the first chunk has been fetched.
+"""
+
+import csv
+import io
+
+from fintrack import fastjson
+
+EXPORT_FIELDS = [
+    "id",
+    "date",
+    "amount",
+    "description",
+    "transaction_type",
+    "category",
+    "category__name",
+    "is_recurring",
+    "recurring_type",
+    "is_auto_generated",
+    "source_transaction",
+    "created_at",
+    "updated_at",
+]
+
+# Column names as they appear in the API ("category__name" -> "category_name")
+EXPORT_COLUMNS = [field.replace("__", "_") for field in EXPORT_FIELDS]
+
+
+def format_value(value):
+    """Render a value the way the API does (ISO dates, decimals as text)."""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+    return str(value)
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(queryset, chunk_size=2000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([format_value(v) for v in row] for row in chunk)
+        yield buffer.getvalue()
+
+
+def stream_ndjson(queryset, chunk_size=2000):
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        yield b"".join(
+            fastjson.dumps(dict(zip(EXPORT_COLUMNS, map(format_value, row)))) + b"\n"
+            for row in chunk
+        )
@@ -0,0 +1,202 @@
+"""
+Cash-flow projection for ``transactions/forecast/``.
+
+Every recurring template (see ``recurring``) is expanded into its future
+occurrences up to the horizon, as parallel arrays of day ordinals and
+signed amounts in cents. Occurrences that are already due but not yet
+materialised count towards today's balance. The rest are summed per day
+and accumulated onto the current balance to give the projected balance for
+each day. The monthly series and the low points are read off the daily one.
+
+With NumPy installed, the expansion is arithmetic on arrays: per template
+an index range, turned into weekly day offsets or into months with the
+anchor's day clamped to the month's length, then ``bincount`` and
+``cumsum``. Without it the same results are computed in pure Python.
+"""
+
+from datetime import date
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db.models import Max
+from django.utils import timezone
+
+from . import recurring, rollups
+from .models import Transaction
+from .trends import EPOCH, EPOCH_MONTH, month_index
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure Python path gives identical results
+    np = None
+
+
+def templates(user, until):
+    """
+    (anchor, recurring_type, signed cents, first index, last index) for each
+    of ``user``'s recurring templates, where the first index is the first
+    occurrence not yet materialised and the last is the last one due by
+    ``until``.
+    """
+    rows = list(
+        recurring.templates(user.pk).values_list(
+            "id", "date", "recurring_type", "amount", "transaction_type"
+        )
+    )
+    generated = dict(
+        Transaction.objects.filter(source_transaction_id__in=[row[0] for row in rows])
+        .values("source_transaction_id")
+        .annotate(last=Max("date"))
+        .values_list("source_transaction_id", "last")
+        .order_by()
+    )
+    result = []
+    for pk, anchor, recurring_type, amount, transaction_type in rows:
+        first = recurring.next_index(anchor, recurring_type, generated.get(pk))
+        cents = int(amount * 100)
+        result.append(
+            (
+                anchor,
+                recurring_type,
+                -cents if transaction_type == "expense" else cents,
+                first,
+                recurring.last_index(anchor, recurring_type, until),
+            )
+        )
+    return result
+
+
+def _occurrences_numpy(templates):
+    """Day ordinals and signed cents of every occurrence, as arrays."""
+    days, amounts = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+    # Weekly occurrences step in days; monthly and yearly ones in months
+    for recurring_type, step in (("weekly", None), ("monthly", 1), ("yearly", 12)):
+        group = [t for t in templates if t[1] == recurring_type and t[4] >= t[3]]
+        if not group:
+            continue
+        anchor, _, cents, first, last = zip(*group)
+        count = np.array(last, np.int64) - np.array(first, np.int64) + 1
+        # Occurrence index of every occurrence: first, first + 1, ..., last
+        # for each template in turn
+        offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        index = np.repeat(np.array(first, np.int64), count) + offsets
+        if step is None:
+            ordinal = np.array([a.toordinal() for a in anchor], np.int64)
+            days.append(np.repeat(ordinal, count) + 7 * index)
+        else:
+            anchor_month = np.array([month_index(a) for a in anchor], np.int64)
+            month = np.repeat(anchor_month - EPOCH_MONTH, count) + step * index
+            month_start = month.astype("datetime64[M]").astype("datetime64[D]")
+            month_length = (month + 1).astype("datetime64[M]").astype(
+                "datetime64[D]"
+            ) - month_start
+            day = np.minimum(
+                np.repeat(np.array([a.day for a in anchor], np.int64), count),
+                month_length.astype(np.int64),
+            )
+            days.append(month_start.astype(np.int64) + EPOCH.toordinal() + day - 1)
+        amounts.append(np.repeat(np.array(cents, np.int64), count))
+    return np.concatenate(days), np.concatenate(amounts)
+
+
+def _daily_numpy(templates, today, days):
+    ordinal, cents = _occurrences_numpy(templates)
+    due = ordinal <= today.toordinal()
+    pending = int(cents[due].sum())
+    future = ~due
+    change = np.bincount(
+        ordinal[future] - today.toordinal() - 1,
+        weights=cents[future],
+        minlength=days,
+    )
+    change = np.rint(change).astype(np.int64)
+    return pending, change, np.cumsum(change)
+
+
+def _daily_python(templates, today, days):
+    pending = 0
+    change = [0] * days
+    for anchor, recurring_type, cents, first, last in templates:
+        for index in range(first, last + 1):
+            offset = (
+                recurring.occurrence(anchor, recurring_type, index) - today
+            ).days - 1
+            if offset < 0:
+                pending += cents
+            else:
+                change[offset] += cents
+    return pending, change, list(accumulate(change))
+
+
+def _low_points(change, totals, count):
+    """
+    Days (offsets) after which the balance next rises: its local minima,
+    lowest first.
+    """
+    if np is not None and isinstance(change, np.ndarray):
+        changed = np.flatnonzero(change)
+        steps = change[changed]
+        rises_next = np.append(steps[1:] > 0, True)
+        lows = changed[(steps < 0) & rises_next]
+        order = np.argsort(totals[lows], kind="stable")[:count]
+        return lows[order].tolist()
+    changed = [i for i, c in enumerate(change) if c]
+    lows = [
+        day
+        for i, day in enumerate(changed)
+        if change[day] < 0 and (i + 1 == len(changed) or change[changed[i + 1]] > 0)
+    ]
+    return sorted(lows, key=lambda day: totals[day])[:count]
+
+
+def _money(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def forecast(user, months=12, granularity="monthly", low_points=5, today=None):
+    """Projected balance for each day or month of the next ``months`` months."""
+    today = today or timezone.now().date()
+    end = recurring.occurrence(today, "monthly", months)
+    days = (end - today).days
+    daily = _daily_numpy if np is not None else _daily_python
+    pending, change, totals = daily(templates(user, end), today, days)
+    lows = _low_points(change, totals, low_points)
+    if np is not None:
+        change, totals = change.tolist(), totals.tolist()
+
+    opening = int(rollups.balance(user) * 100) + pending
+    balances = [_money(opening + total) for total in totals]
+    first = today.toordinal() + 1
+
+    def point(day):
+        return {"date": date.fromordinal(first + day), "balance": balances[day]}
+
+    if granularity == "daily":
+        series = [point(day) for day in range(days)]
+    else:
+        series = []
+        start = 0
+        for i in range(month_index(today), month_index(end) + 1):
+            year, month = divmod(i + 1, 12)
+            # Last day of the month, as an offset into the daily series
+            stop = min(date(year, month + 1, 1).toordinal() - first, days)
+            if stop <= start:
+                continue
+            series.append(
+                {
+                    "month": f"{i // 12:04d}-{i % 12 + 1:02d}",
+                    "balance": balances[stop - 1],
+                    "change": _money(sum(change[start:stop])),
+                }
+            )
+            start = stop
+
+    return {
+        "as_of": today,
+        "balance": _money(opening),
+        "end_date": end,
+        "granularity": granularity,
+        "series": series,
+        "minimum": point(balances.index(min(balances))) if balances else None,
+        "low_points": [point(day) for day in lows],
+    }
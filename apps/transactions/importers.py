@@ -0,0 +1,261 @@
+"""
+Bulk transaction import from CSV or NDJSON uploads.
+
+Rows are read lazily from the uploaded file and handled in batches: each
+batch is validated in Python with a single category lookup, then written
+with one bulk_create (plus the matching rollup updates) in its own database
+transaction. Memory use is bounded by the batch size, not the file size.
+"""
+
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from fintrack import fastjson
+
+from . import caching, conditional, rollups
+from .models import Category, Transaction, sanitize_description
+
+TRANSACTION_TYPES = {choice[0] for choice in Transaction.TRANSACTION_TYPE_CHOICES}
+RECURRING_TYPES = {choice[0] for choice in Transaction.RECURRING_CHOICES}
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"", "0", "false", "no", "n", "f"}
+
+
+class _DecodedLines:
+    """
+    An upload's lines decoded from UTF-8 one at a time, so that a line that
+    fails to decode only costs its own row.
+    """
+
+    def __init__(self, fileobj):
+        self.lines = iter(fileobj)
+        self.encoding = "utf-8-sig"  # Skip a byte order mark on the first line
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line, encoding = next(self.lines), self.encoding
+        self.encoding = "utf-8"
+        return line.decode(encoding)
+
+
+def read_csv(fileobj):
+    """
+    Yield a dict per CSV row, or the ValueError for a row that cannot be
+    read; the first line must be a header.
+    """
+    reader = csv.DictReader(_DecodedLines(fileobj))
+    try:
+        reader.fieldnames
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield ValueError(f"Unreadable header: {e}.")
+        return
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            row = ValueError(f"Malformed row: {e}.")
+        except UnicodeDecodeError:
+            row = ValueError("Row is not valid UTF-8.")
+        yield row
+
+
+def read_ndjson(fileobj):
+    """Yield a dict per non-blank line, or the ValueError for a bad line."""
+    for line in fileobj:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = fastjson.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("Each line must be a JSON object.")
+        except ValueError as e:
+            row = e
+        yield row
+
+
+class TransactionImporter:
+    batch_size = 1000
+    max_errors = 1000  # Errors reported in the response; all are counted
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or self.batch_size
+        self.today = timezone.now().date()
+        self.category_ids = set()
+        self.categories_by_name = {}
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = enumerate(rows, start=1)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+    def import_batch(self, batch):
+        self.load_categories(row for _, row in batch if isinstance(row, dict))
+
+        objs = []
+        for row_number, row in batch:
+            if isinstance(row, Exception):
+                self.add_error(row_number, {"non_field_errors": [str(row)]})
+                continue
+            obj, errors = self.build(row)
+            if errors:
+                self.add_error(row_number, errors)
+            else:
+                objs.append(obj)
+
+        if objs:
+            with transaction.atomic():
+                Transaction.objects.bulk_create(objs)
+                rollups.record_bulk_create(objs)
+                caching.bump_version(self.user.pk)
+                conditional.touch("transactions", self.user.pk)
+            self.created += len(objs)
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def load_categories(self, rows):
+        """Fetch the user's categories referenced by this batch in one query."""
+        ids, names = set(), set()
+        for row in rows:
+            category = row.get("category")
+            if category not in (None, ""):
+                try:
+                    ids.add(int(category))
+                except (TypeError, ValueError):
+                    pass
+            elif row.get("category_name"):
+                names.add(str(row["category_name"]).strip())
+        ids -= self.category_ids
+        names -= self.categories_by_name.keys()
+        if not ids and not names:
+            return
+
+        categories = Category.objects.filter(
+            Q(pk__in=ids) | Q(name__in=names), user=self.user
+        ).values_list("id", "name")
+        for pk, name in categories:
+            self.category_ids.add(pk)
+            self.categories_by_name[name] = pk
+
+    def build(self, row):
+        errors = {}
+
+        def error(field, message):
+            errors.setdefault(field, []).append(message)
+
+        # Category, by id or by name; either must belong to the user
+        category_id = None
+        category = row.get("category")
+        if category not in (None, ""):
+            try:
+                category_id = int(category)
+            except (TypeError, ValueError):
+                error("category", "A valid integer is required.")
+            else:
+                if category_id not in self.category_ids:
+                    error("category", "This category does not belong to you.")
+        elif row.get("category_name"):
+            category_id = self.categories_by_name.get(str(row["category_name"]).strip())
+            if category_id is None:
+                error("category_name", "Category not found.")
+        else:
+            error("category", "This field is required.")
+
+        amount = row.get("amount")
+        try:
+            amount = Decimal(str(amount).strip())
+            if not amount.is_finite():
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            error("amount", "A valid number is required.")
+        else:
+            if amount <= 0:
+                error("amount", "Amount must be greater than 0.")
+            elif amount > 1000000:
+                error("amount", "Amount cannot be greater than 1,000,000")
+            elif amount.as_tuple().exponent < -2:
+                error("amount", "Ensure that there are no more than 2 decimal places.")
+
+        description = row.get("description")
+        if not description:
+            error("description", "Description cannot be empty.")
+        else:
+            description = sanitize_description(str(description))
+            if len(description) < 3:
+                error("description", "Description must be at least 3 characters long.")
+            elif len(description) > 255:
+                error(
+                    "description", "Ensure this field has no more than 255 characters."
+                )
+            elif not description.isprintable():
+                error("description", "Description contains invalid characters.")
+
+        transaction_type = str(
+            row.get("transaction_type") or row.get("type") or ""
+        ).lower()
+        if transaction_type not in TRANSACTION_TYPES:
+            error("transaction_type", "Invalid transaction type.")
+
+        date = row.get("date")
+        try:
+            date = parse_date(str(date or ""))
+        except ValueError:
+            date = None
+        if date is None:
+            error("date", "Date has wrong format. Use YYYY-MM-DD.")
+        elif date > self.today:
+            error("date", "Transaction date cannot be in the future.")
+
+        is_recurring = row.get("is_recurring", False)
+        if not isinstance(is_recurring, bool):
+            flag = str(is_recurring).strip().lower()
+            if flag in TRUE_VALUES:
+                is_recurring = True
+            elif flag in FALSE_VALUES:
+                is_recurring = False
+            else:
+                error("is_recurring", "Must be a valid boolean.")
+
+        recurring_type = row.get("recurring_type") or "none"
+        if not isinstance(recurring_type, str) or recurring_type not in RECURRING_TYPES:
+            error("recurring_type", "Invalid recurring type.")
+
+        if errors:
+            return None, errors
+        return (
+            Transaction(
+                user=self.user,
+                category_id=category_id,
+                amount=amount,
+                description=description,
+                transaction_type=transaction_type,
+                date=date,
+                is_recurring=is_recurring,
+                recurring_type=recurring_type,
+            ),
+            None,
+        )
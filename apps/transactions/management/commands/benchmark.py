@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.views import APIView
+
+from apps.transactions.benchmarks import SCENARIOS, BenchmarkContext
+
+
+class Command(BaseCommand):
+    help = (
+        "Run performance benchmarks against a throwaway test database seeded "
+        "with one user's transactions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help=f"Scenarios to run (default: all). One of: {', '.join(SCENARIOS)}",
+        )
+        parser.add_argument(
+            "--rows", type=int, default=10000, help="Transactions to seed"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Timed runs per measurement"
+        )
+
+    def handle(self, *args, **options):
+        names = options["scenarios"] or list(SCENARIOS)
+        unknown = set(names) - SCENARIOS.keys()
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        # Rate limits would turn repeated requests into 429s
+        no_throttles = patch.object(APIView, "get_throttles", return_value=[])
+        no_throttles.start()
+        try:
+            self.stdout.write(f"Seeding {options['rows']} transactions...")
+            ctx = BenchmarkContext(options["rows"], options["repeat"])
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+                doc = SCENARIOS[name].__doc__
+                if doc:
+                    self.stdout.write(doc.strip())
+                self.print_table(list(SCENARIOS[name](ctx)))
+        finally:
+            no_throttles.stop()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def print_table(self, rows):
+        if not rows:
+            return
+        headers = list(rows[0])
+        widths = [
+            max(len(str(h)), *(len(str(row[h])) for row in rows)) for h in headers
+        ]
+        line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+        self.stdout.write(line)
+        self.stdout.write("  ".join("-" * w for w in widths))
+        for row in rows:
+            self.stdout.write(
+                "  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths))
+            )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.transactions import recurring
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the due occurrences of every recurring transaction. Safe to "
+        "run repeatedly, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--until",
+            help="Generate occurrences up to this past date (default: today)",
+        )
+        parser.add_argument("--user", type=int, help="Only this user id's templates")
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000, help="Templates per batch"
+        )
+
+    def handle(self, *args, **options):
+        until = None
+        if options["until"]:
+            until = parse_date(options["until"])
+            if until is None:
+                raise CommandError("--until must be a date in YYYY-MM-DD format.")
+            # Like any other transaction, an occurrence cannot be in the future
+            if until > timezone.now().date():
+                raise CommandError("--until cannot be in the future.")
+
+        created = recurring.materialize(
+            until=until, user_id=options["user"], chunk_size=options["chunk_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} transactions."))
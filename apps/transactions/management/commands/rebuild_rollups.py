@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.transactions import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily and monthly transaction rollups from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, help="Only rebuild rollups for this user id"
+        )
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(user_id=options["user"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup rows."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from apps.transactions import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the full-text index of transaction descriptions and the "
+        "triggers that keep it in sync, then index every transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not search.supported(connection):
+            raise CommandError(
+                "This database has no FTS5 support; searches use LIKE instead."
+            )
+        search.install(connection, rebuild=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {search.TABLE}_docsize")
+            count = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} transactions."))
@@ -0,0 +1,77 @@
+import os
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from fintrack.server import GunicornServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the application with gunicorn: preforked worker processes that "
+        "share Django and the URLconf, loaded once up front"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help=(
+                "Worker processes (default: one per CPU core with a shared "
+                "cache, otherwise one)"
+            ),
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Request threads per WSGI worker (default: 4)",
+        )
+        parser.add_argument(
+            "--max-requests",
+            type=int,
+            default=10000,
+            help="Requests a worker serves before it is replaced",
+        )
+        parser.add_argument(
+            "--max-requests-jitter",
+            type=int,
+            default=1000,
+            help="Random extra requests per worker, so restarts are staggered",
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Run the ASGI application under uvicorn workers",
+        )
+        parser.add_argument("--access-log", action="store_true")
+
+    def handle(self, *args, **options):
+        # Cached responses, their validators, data versions and replica pins
+        # must be seen by every worker, or one serves what another has
+        # invalidated
+        shared_cache = not isinstance(caches["default"], LocMemCache)
+        if options["workers"] is None:
+            options["workers"] = (os.cpu_count() or 1) if shared_cache else 1
+        if min(options["workers"], options["threads"], options["max_requests"]) < 1:
+            raise CommandError(
+                "--workers, --threads and --max-requests must be at least 1."
+            )
+        if options["workers"] > 1 and not shared_cache:
+            raise CommandError(
+                "Several workers need a cache they all share, or one serves "
+                "responses another has invalidated: set FINTRACK_CACHE_DIR."
+            )
+        GunicornServer(
+            host=options["host"],
+            port=options["port"],
+            workers=options["workers"],
+            threads=options["threads"],
+            max_requests=options["max_requests"],
+            max_requests_jitter=options["max_requests_jitter"],
+            asgi=options["asgi"],
+            access_log=options["access_log"],
+        ).run()
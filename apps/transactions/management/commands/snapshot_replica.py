@@ -0,0 +1,59 @@
+import os
+import sqlite3
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from fintrack.routing import replicas
+
+
+def _path(name):
+    """The file behind a database NAME, which may be a ``file:`` URI."""
+    name = str(name)
+    return unquote(urlsplit(name).path) if name.startswith("file:") else name
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over each SQLite read replica in "
+        "DATABASE_REPLICAS. Run it periodically (e.g. every minute from cron)."
+    )
+
+    def handle(self, *args, **options):
+        aliases = [
+            alias
+            for alias in replicas()
+            if settings.DATABASES[alias]["ENGINE"] == "django.db.backends.sqlite3"
+        ]
+        if not aliases:
+            raise CommandError("No SQLite replicas are configured.")
+
+        primary = connections["default"]
+        primary.ensure_connection()
+        for alias in aliases:
+            path = _path(settings.DATABASES[alias]["NAME"])
+            partial = f"{path}.partial"
+            target = sqlite3.connect(partial)
+            try:
+                # In one step: a stepwise backup starts over whenever another
+                # connection writes, so it might never finish on a busy
+                # primary. In WAL mode this does not block the writers.
+                primary.connection.backup(target, pages=-1)
+                # The copy comes out in the primary's WAL mode. In rollback
+                # mode it is a single file that can be swapped atomically.
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+            # Readers that already have the old file open keep a consistent
+            # view of it; new connections see the new snapshot.
+            os.replace(partial, path)
+            # A -wal file left by a snapshot taken in WAL mode would be
+            # replayed over the new one
+            for suffix in ("-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            self.stdout.write(self.style.SUCCESS(f"Snapshotted default to {alias}."))
@@ -0,0 +1,146 @@
+"""
+Read-optimised list rendering.
+
+A RowMapper turns rows fetched with ``values_list()`` (one joined query)
+into exactly the dicts a ModelSerializer would produce, without creating
+model instances or calling each field's ``to_representation``. The mapping
+is compiled once per serializer into a single list comprehension.
+"""
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.utils import timezone
+
+from fintrack import instrumentation
+
+
+def _format_decimal(value):
+    # Values come back from the database already quantized to the field's
+    # decimal_places, so this matches DecimalField(coerce_to_string=True).
+    return format(value, "f")
+
+
+def _format_datetime(value, tz):
+    value = value.astimezone(tz).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def _converter(field):
+    """
+    Return ``(template, needs_tz)`` for rendering ``field``: a Python
+    expression with ``{v}`` standing for the column value, or None when the
+    database value is already what the serializer would output.
+    """
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(
+            field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+        )
+        if coerce_to_string and not (field.localize or field.normalize_output):
+            return "fmt_decimal({v})", False
+    elif isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        if (
+            output_format.lower() == ISO_8601
+            and settings.USE_TZ
+            and not hasattr(field, "timezone")
+        ):
+            return "fmt_datetime({v}, tz)", True
+    elif isinstance(field, serializers.DateField):
+        output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+        if output_format.lower() == ISO_8601:
+            return "{v}.isoformat()", False
+    elif isinstance(
+        field,
+        (
+            serializers.PrimaryKeyRelatedField,
+            serializers.BooleanField,
+            serializers.IntegerField,
+            # String choices render as their own value
+            serializers.ChoiceField,
+        ),
+    ):
+        return None, False
+    elif type(field) is serializers.CharField:
+        return None, False  # Model CharFields are already str
+    return f"fields[{field.field_name!r}].to_representation({{v}})", False
+
+
+class RowMapper:
+    def __init__(self, serializer_class):
+        fields = serializer_class().fields
+        self.columns = []
+        items = []
+        namespace = {
+            "fields": fields,
+            "fmt_decimal": _format_decimal,
+            "fmt_datetime": _format_datetime,
+        }
+        self.needs_tz = False
+        for index, (name, field) in enumerate(
+            (name, field) for name, field in fields.items() if not field.write_only
+        ):
+            source = field.source.replace(".", "__")
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                source = f"{source}_id"
+            self.columns.append(source)
+
+            template, needs_tz = _converter(field)
+            self.needs_tz |= needs_tz
+            value = f"row[{index}]"
+            if template is not None:
+                code = template.format(v=value)
+                value = f"(None if {value} is None else {code})"
+            items.append(f"{name!r}: {value}")
+
+        code = (
+            "def map_rows(rows, tz):\n"
+            f"    return [{{{', '.join(items)}}} for row in rows]\n"
+        )
+        exec(code, namespace)
+        self._map_rows = namespace["map_rows"]
+
+    def values(self, queryset):
+        """The queryset's rows as named tuples of the mapped columns."""
+        return queryset.values_list(*self.columns, named=True)
+
+    def map(self, rows):
+        tz = timezone.get_current_timezone() if self.needs_tz else None
+        return self._map_rows(rows, tz)
+
+
+class RowMapperListMixin:
+    """
+    Serve ``list`` from a RowMapper built from ``serializer_class``.
+    Views return False from ``use_row_mapper`` to fall back to the
+    serializer, e.g. when the response needs annotations or method fields.
+    """
+
+    @classmethod
+    def get_row_mapper(cls):
+        if "_row_mapper" not in cls.__dict__:
+            cls._row_mapper = RowMapper(cls.serializer_class)
+        return cls._row_mapper
+
+    def use_row_mapper(self):
+        return True
+
+    def _serialize(self, items):
+        return self.get_serializer(items, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.use_row_mapper():
+            mapper = self.get_row_mapper()
+            rows, serialize = mapper.values(queryset), mapper.map
+        else:
+            rows, serialize = queryset, self._serialize
+        page = self.paginate_queryset(rows)
+        with instrumentation.timing("serialize"):
+            data = serialize(page if page is not None else rows)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,61 @@
+from django.db import migrations
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Compute the rollups of the transactions written before the rollup
+    tables existed, as ``rollups.rebuild`` does.
+    """
+    Transaction = apps.get_model("transactions", "Transaction")
+    db_alias = schema_editor.connection.alias
+    effective_recurring_type = Case(
+        When(is_recurring=True, then=F("recurring_type")),
+        default=Value("none"),
+    )
+    for model_name, period_field, period in (
+        ("DailyRollup", "date", F("date")),
+        ("MonthlyRollup", "month", TruncMonth("date")),
+    ):
+        model = apps.get_model("transactions", model_name)
+        model.objects.using(db_alias).all().delete()
+        rows = (
+            Transaction.objects.using(db_alias)
+            .annotate(period=period, effective_recurring_type=effective_recurring_type)
+            .values(
+                "user_id",
+                "category_id",
+                "transaction_type",
+                "effective_recurring_type",
+                "period",
+            )
+            .annotate(total=Sum("amount"), count=Count("id"))
+            .order_by()
+        )
+        model.objects.using(db_alias).bulk_create(
+            (
+                model(
+                    user_id=row["user_id"],
+                    category_id=row["category_id"],
+                    transaction_type=row["transaction_type"],
+                    recurring_type=row["effective_recurring_type"],
+                    total=row["total"],
+                    count=row["count"],
+                    **{period_field: row["period"]},
+                )
+                for row in rows.iterator(chunk_size=2000)
+            ),
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0006_recurring_occurrences"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
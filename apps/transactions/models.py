@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
@@ -8,6 +8,15 @@ import re
 
 User = get_user_model()
 
+# HTML tags, or any stray character that could start one
+UNSAFE_RE = re.compile(r"<[^>]+>|[<>{}[\]]")
+
+
+def sanitize_description(value):
+    # Remove HTML tags and potentially dangerous characters in one pass, then
+    # collapse runs of whitespace
+    return " ".join(UNSAFE_RE.sub("", value).split())
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -79,6 +88,16 @@ class Transaction(models.Model):
         max_length=10, choices=RECURRING_CHOICES, default="none"
     )
 
+    # Occurrences materialised from a recurring template
+    is_auto_generated = models.BooleanField(default=False)
+    source_transaction = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="generated_transactions",
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -88,34 +107,94 @@ class Transaction(models.Model):
     def clean(self):
         # Description sanitization
         if self.description:
-            # Remove HTML tags
-            self.description = re.sub(r"<[^>]+>", "", self.description)
-
-            # Remove potentially dangerous characters
-            self.description = re.sub(r"[<>{}[\]]", "", self.description)
-
-            # Remove multiple spaces
-            self.description = re.sub(r"\s+", " ", self.description).strip()
+            self.description = sanitize_description(self.description)
 
             # Truncate if too long
             if len(self.description) > 255:
                 self.description = self.description[:252] + "..."
 
             # Check for special characters
-            if not all(c.isprintable() for c in self.description):
+            if not self.description.isprintable():
                 raise ValidationError(_("Invalid characters in the description."))
 
         # Date cannot be in the future
         if self.date > timezone.now().date():
             raise ValidationError(_("Transaction date cannot be in the future."))
 
-        # Check if category belongs to user
-        if self.category.user != self.user:
+        # Check if category belongs to user, without fetching either
+        if self.category.user_id != self.user_id:
             raise ValidationError(_("This category does not belong to you."))
 
-    def save(self, *args, **kwargs):
-        self.full_clean()  # Run model validations
-        super().save(*args, **kwargs)
+    ROLLUP_FIELDS = [
+        "user_id",
+        "category_id",
+        "transaction_type",
+        "is_recurring",
+        "recurring_type",
+        "date",
+        "amount",
+    ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which rollup bucket the stored row counts towards, so an
+        # update can move its amount out of the old bucket.
+        if not instance.get_deferred_fields().intersection(cls.ROLLUP_FIELDS):
+            instance._rollup_state = instance.rollup_state()
+        return instance
+
+    def rollup_state(self):
+        return (
+            self.user_id,
+            self.category_id,
+            self.transaction_type,
+            self.recurring_type if self.is_recurring else "none",
+            self.date,
+            self.amount,
+        )
+
+    class Meta:
+        indexes = [
+            # Every query is scoped to one user and filters or sorts on date;
+            # the other columns cover the list filters.
+            models.Index(fields=["user", "date"], name="txn_user_date_idx"),
+            models.Index(
+                fields=["user", "transaction_type", "date"],
+                name="txn_user_type_date_idx",
+            ),
+            models.Index(
+                fields=["user", "recurring_type", "date"],
+                name="txn_user_recurring_date_idx",
+            ),
+            models.Index(
+                fields=["user", "category", "date"],
+                name="txn_user_category_date_idx",
+            ),
+            models.Index(fields=["user", "amount"], name="txn_user_amount_idx"),
+            # Recurring templates only, walked in id order by the materialiser
+            models.Index(
+                fields=["id"],
+                condition=models.Q(is_recurring=True, is_auto_generated=False),
+                name="txn_recurring_template_idx",
+            ),
+        ]
+        constraints = [
+            # One generated occurrence per template and date
+            models.UniqueConstraint(
+                fields=["source_transaction", "date"], name="txn_unique_occurrence"
+            ),
+        ]
+
+    def save(self, *args, validate=True, **kwargs):
+        # Data that has been through TransactionSerializer is already
+        # validated; it saves with validate=False to skip a second pass
+        if validate:
+            self.full_clean()  # Run model validations
+        # Rollups are updated from the post_save signal; keep both writes in
+        # the same database transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class Budget(models.Model):
@@ -155,6 +234,63 @@ class Budget(models.Model):
         if overlapping_budgets.exists():
             raise ValidationError(_("This date range already has a budget."))
 
-    def save(self, *args, **kwargs):
-        self.full_clean()  # Run model validations
+    class Meta:
+        indexes = [
+            # Overlap checks: user + category, then the period bounds
+            models.Index(
+                fields=["user", "category", "start_date", "end_date"],
+                name="budget_user_cat_period_idx",
+            ),
+        ]
+
+    def save(self, *args, validate=True, **kwargs):
+        # BudgetSerializer validates everything clean() does; it saves with
+        # validate=False to skip the second overlap query
+        if validate:
+            self.full_clean()  # Run model validations
         super().save(*args, **kwargs)
+
+
+class Rollup(models.Model):
+    """Pre-aggregated transaction totals for one user/category/type bucket."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    transaction_type = models.CharField(
+        max_length=10, choices=Transaction.TRANSACTION_TYPE_CHOICES
+    )
+    # "none" unless the transaction is flagged as recurring
+    recurring_type = models.CharField(
+        max_length=10, choices=Transaction.RECURRING_CHOICES, default="none"
+    )
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyRollup(Rollup):
+    date = models.DateField()
+
+    class Meta:
+        unique_together = [
+            "user",
+            "date",
+            "category",
+            "transaction_type",
+            "recurring_type",
+        ]
+
+
+class MonthlyRollup(Rollup):
+    month = models.DateField()  # First day of the month
+
+    class Meta:
+        unique_together = [
+            "user",
+            "month",
+            "category",
+            "transaction_type",
+            "recurring_type",
+        ]
@@ -0,0 +1,136 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class TransactionPagination(PageNumberPagination):
+    """
+    Page-number pagination by default. ``?pagination=cursor`` (or any
+    ``cursor`` parameter) switches to keyset pagination: each page is fetched
+    with a ``WHERE (key, id) > (last key, last id)`` range on the queryset's
+    two-column ordering, so page N costs the same as page 1 and no COUNT(*)
+    is run. In cursor mode clients can choose ``page_size`` up to
+    ``max_page_size``.
+    """
+
+    mode_query_param = "pagination"
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 5000
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_cursor_request(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.is_cursor_request(request)
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.page_query_param
+        )
+        page_size = self.get_page_size(request)
+        ordering = queryset.query.order_by
+        if len(ordering) != 2 or ordering[1].lstrip("-") != "id":
+            raise ValueError("Keyset pagination needs a (key, id) ordering.")
+        self.ordering = ordering
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is not None:
+            value, pk, reverse = cursor
+            queryset = queryset.filter(self.after(value, pk, reverse))
+        if reverse:
+            queryset = queryset.order_by(*(self.invert(f) for f in ordering))
+
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Moving backwards, there is always a next page: the one we came from
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None if not reverse else has_more
+        self.rows = rows
+        return rows
+
+    def get_page_size(self, request):
+        if not getattr(self, "use_cursor", False):
+            return self.page_size
+        return super().get_page_size(request)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def after(self, value, pk, reverse):
+        """Rows strictly after ``(value, pk)`` in the (possibly reversed) order."""
+        field = self.ordering[0]
+        descending = field.startswith("-") != reverse
+        name = field.lstrip("-")
+        op = "lt" if descending else "gt"
+        # Written as key >= value AND (key > value OR id > pk) rather than a
+        # plain OR so the index range starts at the cursor position.
+        return Q(**{f"{name}__{op}e": value}) & (
+            Q(**{f"{name}__{op}": value}) | Q(**{f"id__{op}": pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            key, value, pk, reverse = json.loads(
+                base64.urlsafe_b64decode(encoded.encode("ascii"))
+            )
+            if key != self.ordering[0]:
+                raise ValueError(key)
+            field = self.model._meta.get_field(key.lstrip("-"))
+            return field.to_python(value), int(pk), bool(reverse)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        key = self.ordering[0]
+        value = getattr(row, key.lstrip("-"))
+        # Rows may be model instances or named tuples from values_list()
+        payload = json.dumps([key, str(value), row.id, int(reverse)])
+        encoded = base64.urlsafe_b64encode(payload.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
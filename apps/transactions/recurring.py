@@ -0,0 +1,185 @@
+"""
+Materialisation of recurring transactions.
+
+A recurring template is a Transaction with ``is_recurring=True`` and a
+weekly, monthly or yearly ``recurring_type``; its own date is the first
+occurrence. ``materialize`` creates the missing occurrences up to a given
+day as ordinary transactions linked back through ``source_transaction`` and
+flagged ``is_auto_generated``.
+
+Templates are processed in id-ordered chunks. Per chunk there is one query
+for the templates, one for the last occurrence already generated from each
+of them and, when anything is due, one for due occurrences that already
+exist and one bulk insert; due dates are computed arithmetically from the
+template's date, so re-running is idempotent and cheap. Each chunk is one
+transaction that takes the write lock up front (BEGIN IMMEDIATE), so
+overlapping runs take turns, and the later one skips what the earlier one
+created.
+"""
+
+import calendar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import caching, conditional, rollups
+from .models import Transaction
+
+RECURRING_TYPES = ("weekly", "monthly", "yearly")
+
+# Average number of occurrences per month
+MONTHLY_FACTORS = {
+    "weekly": Decimal(52) / Decimal(12),
+    "monthly": Decimal(1),
+    "yearly": Decimal(1) / Decimal(12),
+}
+
+TEMPLATE_FIELDS = [
+    "id",
+    "user_id",
+    "category_id",
+    "amount",
+    "description",
+    "transaction_type",
+    "date",
+    "recurring_type",
+]
+
+
+def occurrence(anchor, recurring_type, index):
+    """
+    Date of occurrence ``index`` (0 is the template itself). Monthly and
+    yearly occurrences keep the anchor's day, clamped to the month's length.
+    """
+    if recurring_type == "weekly":
+        return anchor + timedelta(weeks=index)
+    if recurring_type == "monthly":
+        years, month = divmod(anchor.month - 1 + index, 12)
+        year, month = anchor.year + years, month + 1
+    else:
+        year, month = anchor.year + index, anchor.month
+    day = min(anchor.day, calendar.monthrange(year, month)[1])
+    return anchor.replace(year=year, month=month, day=day)
+
+
+def monthly_amount(amount, recurring_type):
+    """``amount`` per occurrence, normalised to an average month."""
+    return (amount * MONTHLY_FACTORS[recurring_type]).quantize(Decimal("0.01"))
+
+
+def last_index(anchor, recurring_type, until):
+    """Index of the last occurrence on or before ``until`` (-1 if none)."""
+    if until < anchor:
+        return -1
+    if recurring_type == "weekly":
+        return (until - anchor).days // 7
+    if recurring_type == "monthly":
+        index = (until.year - anchor.year) * 12 + until.month - anchor.month
+    else:
+        index = until.year - anchor.year
+    if occurrence(anchor, recurring_type, index) > until:
+        index -= 1
+    return index
+
+
+def next_index(anchor, recurring_type, last):
+    """
+    Index of the first occurrence after ``last``, the latest one generated
+    so far (None if there is none). Never 0: the template is occurrence 0,
+    even when its date has since been moved past the generated ones.
+    """
+    if last is None:
+        return 1
+    return max(last_index(anchor, recurring_type, last) + 1, 1)
+
+
+def templates(user_id=None):
+    queryset = Transaction.objects.filter(
+        is_recurring=True,
+        is_auto_generated=False,
+        recurring_type__in=RECURRING_TYPES,
+    )
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    return queryset
+
+
+def materialize(until=None, user_id=None, chunk_size=2000):
+    """Generate every occurrence due up to ``until`` (default today)."""
+    until = until or timezone.now().date()
+    queryset = templates(user_id).order_by("id").values_list(*TEMPLATE_FIELDS)
+
+    created = 0
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        created += _materialize_chunk(chunk, until)
+    return created
+
+
+def _not_generated(objs):
+    """
+    ``objs`` without the occurrences that already exist, such as those a
+    concurrent run created after the last generated dates were read.
+    """
+    existing = set(
+        Transaction.objects.filter(
+            source_transaction_id__in={obj.source_transaction_id for obj in objs},
+            date__gte=min(obj.date for obj in objs),
+        ).values_list("source_transaction_id", "date")
+    )
+    return [
+        obj for obj in objs if (obj.source_transaction_id, obj.date) not in existing
+    ]
+
+
+def _materialize_chunk(chunk, until):
+    with transaction.atomic():
+        generated = dict(
+            Transaction.objects.filter(source_transaction_id__in=[t[0] for t in chunk])
+            .values("source_transaction_id")
+            .annotate(last=Max("date"))
+            .values_list("source_transaction_id", "last")
+            .order_by()
+        )
+
+        objs = []
+        for (
+            template_id,
+            user_id,
+            category_id,
+            amount,
+            description,
+            transaction_type,
+            anchor,
+            recurring_type,
+        ) in chunk:
+            start = next_index(anchor, recurring_type, generated.get(template_id))
+            for index in range(start, last_index(anchor, recurring_type, until) + 1):
+                objs.append(
+                    Transaction(
+                        user_id=user_id,
+                        category_id=category_id,
+                        amount=amount,
+                        description=description,
+                        transaction_type=transaction_type,
+                        date=occurrence(anchor, recurring_type, index),
+                        is_auto_generated=True,
+                        source_transaction_id=template_id,
+                    )
+                )
+
+        if objs:
+            objs = _not_generated(objs)
+        if objs:
+            Transaction.objects.bulk_create(objs, batch_size=500)
+            rollups.record_bulk_create(objs)
+            caching.bump_version(*(obj.user_id for obj in objs))
+            conditional.touch("transactions", *(obj.user_id for obj in objs))
+    return len(objs)
@@ -0,0 +1,356 @@
+"""
+Incrementally maintained daily and monthly transaction totals.
+
+Every Transaction write moves its amount in or out of one DailyRollup and one
+MonthlyRollup row, keyed by (user, date/month, category, transaction_type,
+recurring_type). Reporting endpoints add up these rows instead of scanning
+the transactions table.
+"""
+
+import functools
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import TruncMonth
+
+from apps.users.models import User
+
+from . import caching, conditional, db_threads
+from .models import DailyRollup, MonthlyRollup, Transaction
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+ROLLUP_TABLES = ((DailyRollup, "date"), (MonthlyRollup, "month"))
+KEY_FIELDS = ("user_id", "category_id", "transaction_type", "recurring_type")
+
+
+def _upsert(model, period_field, buckets):
+    """
+    Add each ``(total, count)`` in ``buckets`` to its row, creating missing
+    rows, with one INSERT ... ON CONFLICT DO UPDATE executed for the batch.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    key_columns = ", ".join(qn(column) for column in (*KEY_FIELDS, period_field))
+    total, count = qn("total"), qn("count")
+    sql = (
+        f"INSERT INTO {table} ({key_columns}, {total}, {count}) "
+        f"VALUES (%s, %s, %s, %s, %s, %s, %s) "
+        f"ON CONFLICT ({key_columns}) DO UPDATE SET "
+        f"{total} = {table}.{total} + excluded.{total}, "
+        f"{count} = {table}.{count} + excluded.{count}"
+    )
+    total_field = model._meta.get_field("total")
+    params = [
+        (
+            *key,
+            connection.ops.adapt_datefield_value(period),
+            connection.ops.adapt_decimalfield_value(
+                bucket_total, total_field.max_digits, total_field.decimal_places
+            ),
+            bucket_count,
+        )
+        for (*key, period), (bucket_total, bucket_count) in buckets.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _bump(buckets):
+    """
+    Add ``(total, count)`` to the daily and monthly rows of each
+    ``(user_id, category_id, transaction_type, recurring_type, date)`` key.
+
+    Keys are first merged per table (the days of a month share one monthly
+    row), so a batch costs one upsert per table however many rows it holds.
+    """
+    for model, period_field in ROLLUP_TABLES:
+        merged = defaultdict(lambda: [Decimal("0"), 0])
+        for (*key, day), (total, count) in buckets.items():
+            period = month_start(day) if period_field == "month" else day
+            bucket = merged[(*key, period)]
+            bucket[0] += total
+            bucket[1] += count
+
+        increments = {key: value for key, value in merged.items() if value[1] > 0}
+        if increments:
+            _upsert(model, period_field, increments)
+        for (*key, period), (total, count) in merged.items():
+            if count >= 0:
+                continue
+            # Only ever take away from existing rows: a missing row means the
+            # user is being deleted and the rollups went first.
+            model.objects.filter(
+                **dict(zip(KEY_FIELDS, key)), **{period_field: period}
+            ).update(total=F("total") + total, count=F("count") + count)
+
+
+def apply(state, count):
+    """Add (count=1) or remove (count=-1) one transaction's rollup state."""
+    *key, amount = state
+    _bump({tuple(key): (Decimal(amount) * count, count)})
+
+
+def record_save(instance, created):
+    new_state = instance.rollup_state()
+    old_state = getattr(instance, "_rollup_state", None)
+    if not created and old_state is None:
+        # Loaded with deferred fields, so the previous bucket is unknown and
+        # the row has already been overwritten: rebuild this user's rollups.
+        rebuild(user_id=instance.user_id)
+    elif old_state != new_state:
+        if old_state is not None:
+            apply(old_state, -1)
+        apply(new_state, 1)
+    instance._rollup_state = new_state
+
+
+def record_delete(instance):
+    state = getattr(instance, "_rollup_state", None) or instance.rollup_state()
+    apply(state, -1)
+    instance._rollup_state = None
+
+
+def record_bulk_create(instances):
+    """Add rollups for rows written with bulk_create (which skips signals)."""
+    buckets = defaultdict(lambda: [Decimal("0"), 0])
+    for instance in instances:
+        state = instance.rollup_state()
+        bucket = buckets[state[:-1]]
+        bucket[0] += Decimal(state[-1])
+        bucket[1] += 1
+        instance._rollup_state = state
+    # A bucket holding several rows is bumped once with the combined total
+    _bump(buckets)
+
+
+def _effective_recurring_type():
+    return Case(
+        When(is_recurring=True, then=F("recurring_type")),
+        default=Value("none"),
+    )
+
+
+def rebuild(user_id=None):
+    """
+    Recompute rollups from the transactions table, and invalidate the
+    responses computed from the old ones. Returns rows written.
+    """
+    transactions = Transaction.objects.all()
+    if user_id is not None:
+        transactions = transactions.filter(user_id=user_id)
+        user_ids = [user_id]
+    else:
+        user_ids = User.objects.values_list("pk", flat=True)
+
+    with transaction.atomic():
+        user_ids = list(user_ids)
+        caching.bump_version(*user_ids)
+        conditional.touch("transactions", *user_ids)
+        for model in (DailyRollup, MonthlyRollup):
+            stale = model.objects.all()
+            if user_id is not None:
+                stale = stale.filter(user_id=user_id)
+            stale.delete()
+
+        written = 0
+        for model, period_field, period in (
+            (DailyRollup, "date", F("date")),
+            (MonthlyRollup, "month", TruncMonth("date")),
+        ):
+            rows = (
+                transactions.annotate(
+                    period=period,
+                    effective_recurring_type=_effective_recurring_type(),
+                )
+                .values(
+                    "user_id",
+                    "category_id",
+                    "transaction_type",
+                    "effective_recurring_type",
+                    "period",
+                )
+                .annotate(total=Sum("amount"), count=Count("id"))
+                .order_by()
+            )
+            objs = [
+                model(
+                    user_id=row["user_id"],
+                    category_id=row["category_id"],
+                    transaction_type=row["transaction_type"],
+                    recurring_type=row["effective_recurring_type"],
+                    total=row["total"],
+                    count=row["count"],
+                    **{period_field: row["period"]},
+                )
+                for row in rows.iterator(chunk_size=2000)
+            ]
+            model.objects.bulk_create(objs, batch_size=500)
+            written += len(objs)
+    return written
+
+
+def _range_filter(start_date, end_date):
+    """
+    Split [start_date, end_date] into whole months (read from MonthlyRollup)
+    and the partial months at either end (read from DailyRollup).
+    """
+    first_full = start_date if start_date.day == 1 else next_month(start_date)
+    after_end = end_date + timedelta(days=1)
+    last_full = month_start(after_end)  # exclusive
+
+    if first_full >= last_full:
+        return Q(date__range=[start_date, end_date]), None
+
+    daily = Q(date__gte=start_date, date__lt=first_full) | Q(
+        date__gte=last_full, date__lte=end_date
+    )
+    monthly = Q(month__gte=first_full, month__lt=last_full)
+    return daily, monthly
+
+
+def _totals_queries(user, start_date, end_date, group_by, filters):
+    """The (independent) daily and monthly queries behind ``totals``."""
+    if start_date is None and end_date is None:
+        daily_q, monthly_q = None, Q()
+    else:
+        daily_q, monthly_q = _range_filter(start_date, end_date)
+
+    queries = []
+    for model, q in ((DailyRollup, daily_q), (MonthlyRollup, monthly_q)):
+        if q is None:
+            continue
+        rows = model.objects.filter(q, user=user, **filters)
+        if group_by:
+            rows = (
+                rows.values(*group_by)
+                .annotate(total=Sum("total"), count=Sum("count"))
+                .order_by()
+            )
+            queries.append(functools.partial(list, rows))
+        else:
+            queries.append(
+                lambda rows=rows: [
+                    rows.aggregate(total=Sum("total"), count=Sum("count"))
+                ]
+            )
+    return queries
+
+
+def _merge_totals(group_by, row_lists):
+    result = defaultdict(lambda: {"total": Decimal("0"), "count": 0})
+    for rows in row_lists:
+        for row in rows:
+            bucket = result[tuple(row[field] for field in group_by)]
+            bucket["total"] += row["total"] or 0
+            bucket["count"] += row["count"] or 0
+    return result
+
+
+def totals(user, start_date, end_date, group_by=(), **filters):
+    """
+    Sum transaction amounts for a user between two dates (inclusive), or over
+    all time when both dates are None.
+
+    ``filters`` are applied to the rollup rows (e.g. transaction_type,
+    category_id). Returns a dict mapping each ``group_by`` value tuple to
+    ``{"total": Decimal, "count": int}``.
+    """
+    group_by = list(group_by)
+    queries = _totals_queries(user, start_date, end_date, group_by, filters)
+    return _merge_totals(group_by, [query() for query in queries])
+
+
+async def atotals(user, start_date, end_date, group_by=(), **filters):
+    """``totals`` for async views, running its queries concurrently."""
+    group_by = list(group_by)
+    queries = _totals_queries(user, start_date, end_date, group_by, filters)
+    return _merge_totals(
+        group_by, await db_threads.gather(*((query,) for query in queries))
+    )
+
+
+def balance(user):
+    """All-time income minus expenses for a user, in one query."""
+    row = MonthlyRollup.objects.filter(user=user).aggregate(
+        income=Sum("total", filter=Q(transaction_type="income")),
+        expense=Sum("total", filter=Q(transaction_type="expense")),
+    )
+    return (row["income"] or Decimal("0")) - (row["expense"] or Decimal("0"))
+
+
+def recurring_totals(user):
+    """
+    All-time recurring totals for a user in one query, one row per recurring
+    type, with income and expense summed side by side through conditional
+    aggregation: ``{recurring_type: {"count", "income", "expense"}}``.
+    """
+    rows = (
+        MonthlyRollup.objects.filter(
+            user=user, recurring_type__in=["weekly", "monthly", "yearly"]
+        )
+        .values("recurring_type")
+        .annotate(
+            count=Sum("count"),
+            income=Sum("total", filter=Q(transaction_type="income")),
+            expense=Sum("total", filter=Q(transaction_type="expense")),
+        )
+        .order_by()
+    )
+    return {
+        row["recurring_type"]: {
+            "count": row["count"] or 0,
+            "income": row["income"] or Decimal("0"),
+            "expense": row["expense"] or Decimal("0"),
+        }
+        for row in rows
+    }
+
+
+def annotate_budget_spending(budgets):
+    """
+    Annotate a Budget queryset with ``spent``: the expenses in the budget's
+    category and period. Computed as a correlated subquery over the daily
+    rollups, so any number of budgets costs a single query.
+    """
+    spent = (
+        DailyRollup.objects.filter(
+            user=OuterRef("user"),
+            category=OuterRef("category"),
+            transaction_type="expense",
+            date__gte=OuterRef("start_date"),
+            date__lte=OuterRef("end_date"),
+        )
+        .order_by()
+        .values("category")
+        .annotate(total=Sum("total"))
+        .values("total")
+    )
+    return budgets.annotate(
+        spent=Subquery(
+            spent, output_field=DecimalField(max_digits=16, decimal_places=2)
+        )
+    )
@@ -0,0 +1,197 @@
+"""
+Full-text search over transaction descriptions.
+
+On SQLite with FTS5, ``transactions_transaction_fts`` is an external-content
+FTS5 index of ``Transaction.description``: it stores only the index and
+reads descriptions from the transactions table by rowid. Triggers on that
+table keep it in sync with every write, including bulk_create() and
+queryset updates and deletes. ``install`` creates the index and triggers
+after each migrate, and indexes existing rows when the index is new. A
+migration that rebuilds the transactions table drops its triggers; the
+next ``install`` puts them back. ``manage.py rebuild_search_index``
+recreates the triggers and reindexes every row.
+
+A search matches transactions containing every word, the last one as a
+prefix, as a search box would while the user types ("weekly groc" finds
+"Weekly groceries"). Prefixes of up to three characters are indexed
+separately; a longer prefix merges the lists of every word it starts, so
+only the last word is one. On other backends, or without FTS5, each word
+is matched with ``icontains`` instead.
+
+Lookups go through the index, so their cost follows the number of
+matches rather than the size of the table. Given a user, the matches are
+joined to the transactions table on rowid and kept only if they are that
+user's, before any limit applies, so other users' rows never count
+against it. Up to ``MAX_IDS`` matching ids are read first and passed to
+the transactions query as a list, which SQLite fetches by primary key when
+it is short; given ``id IN (subquery)`` it cannot tell how selective the
+search is and walks all of the user's rows through the (user, date) index
+instead. More matches than that are left to the subquery, as that walk
+then fills a page quickly.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+TABLE = "transactions_transaction_fts"
+SOURCE = "transactions_transaction"
+MAX_TERMS = 10
+MAX_IDS = 500
+
+WORD_RE = re.compile(r"\w+")
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_insert AFTER INSERT ON {SOURCE} BEGIN
+        INSERT INTO {TABLE} (rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_delete AFTER DELETE ON {SOURCE} BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, description)
+        VALUES ('delete', old.id, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+    AFTER UPDATE OF description ON {SOURCE} BEGIN
+        INSERT INTO {TABLE} ({TABLE}, rowid, description)
+        VALUES ('delete', old.id, old.description);
+        INSERT INTO {TABLE} (rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+]
+
+# Aliases known to have the index
+_installed = set()
+
+
+def supported(connection):
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def _exists(cursor):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLE]
+    )
+    return cursor.fetchone() is not None
+
+
+def install(connection, rebuild=False):
+    """
+    Create the index and its triggers where missing. The index is filled
+    from the transactions table when it is new, or always with ``rebuild``.
+    Returns whether it was.
+    """
+    if not supported(connection):
+        return False
+    with connection.cursor() as cursor:
+        if rebuild:
+            for name in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {TABLE}_{name}")
+        rebuild = rebuild or not _exists(cursor)
+        # Prefix indexes make 2- and 3-character prefix queries as cheap as
+        # whole-word ones
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            f"description, content='{SOURCE}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        for statement in TRIGGERS:
+            cursor.execute(statement)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
+    _installed.add(connection.alias)
+    return rebuild
+
+
+def available(using):
+    if using not in _installed:
+        connection = connections[using]
+        if connection.vendor != "sqlite":
+            return False
+        with connection.cursor() as cursor:
+            if not _exists(cursor):
+                return False
+        _installed.add(using)
+    return True
+
+
+def terms(text):
+    return WORD_RE.findall(text)[:MAX_TERMS]
+
+
+def match_query(words):
+    """An FTS5 query matching every word, the last one as a prefix."""
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def _matches_sql(columns, user_id):
+    """SQL and params selecting ``columns`` of the matching index rows."""
+    sql = f"SELECT {columns} FROM {TABLE}"
+    if user_id is None:
+        return f"{sql} WHERE {TABLE} MATCH %s", []
+    # CROSS JOIN keeps the index as the outer loop; otherwise SQLite may
+    # run the MATCH once per transaction row
+    return (
+        f"{sql} CROSS JOIN {SOURCE} ON {SOURCE}.id = {TABLE}.rowid "
+        f"WHERE {TABLE} MATCH %s AND {SOURCE}.user_id = %s",
+        [user_id],
+    )
+
+
+def matching(queryset, text, user_id=None):
+    """
+    Transactions in ``queryset`` whose description matches ``text``. Pass
+    the ``user_id`` the queryset is limited to, so that the index lookup is
+    limited to it too.
+    """
+    words = terms(text)
+    if not words:
+        return queryset
+    if not available(queryset.db):
+        condition = Q()
+        for word in words:
+            condition &= Q(description__icontains=word)
+        return queryset.filter(condition)
+    sql, params = _matches_sql(f"{TABLE}.rowid", user_id)
+    params = [match_query(words), *params]
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"{sql} LIMIT {MAX_IDS + 1}", params)
+        ids = [row[0] for row in cursor.fetchall()]
+    if len(ids) <= MAX_IDS:
+        return queryset.filter(id__in=ids)
+    return queryset.filter(id__in=RawSQL(sql, params))
+
+
+def ranked(queryset, text, user_id=None):
+    """
+    Annotate ``search_rank``: the BM25 score of each description for
+    ``text``, lower is more relevant. Without the index all ranks are 0.
+    Returns None if more than ``MAX_IDS`` transactions (of ``user_id``, if
+    given) match: scoring costs as much per match as the lookup, so only
+    narrow searches are ranked.
+    """
+    words = terms(text)
+    if not words or not available(queryset.db):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    sql, params = _matches_sql(f"{TABLE}.rowid, {TABLE}.rank", user_id)
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"{sql} LIMIT {MAX_IDS + 1}", [match_query(words), *params])
+        ranks = cursor.fetchall()
+    if len(ranks) > MAX_IDS:
+        return None
+    return queryset.filter(id__in=[pk for pk, _ in ranks]).annotate(
+        search_rank=Case(
+            *[When(id=pk, then=Value(rank)) for pk, rank in ranks],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    )
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from django.utils import timezone
-from .models import Category, Transaction, Budget
-import re
+from . import budget_periods, caching, conditional
+from .models import Category, Transaction, Budget, sanitize_description
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -41,11 +41,15 @@ class TransactionSerializer(serializers.ModelSerializer):
             "category_name",
             "is_recurring",
             "recurring_type",
+            "is_auto_generated",
+            "source_transaction",
             "created_at",
             "updated_at",
         ]
         read_only_fields = [
             "id",
+            "is_auto_generated",
+            "source_transaction",
             "created_at",
             "updated_at",
             "category_name",
@@ -55,14 +59,7 @@ class TransactionSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError("Description cannot be empty.")
 
-        # Remove HTML tags
-        value = re.sub(r"<[^>]+>", "", value)
-
-        # Remove potentially dangerous characters
-        value = re.sub(r"[<>{}[\]]", "", value)
-
-        # Remove multiple spaces
-        value = re.sub(r"\s+", " ", value).strip()
+        value = sanitize_description(value)
 
         # Check minimum length
         if len(value) < 3:
@@ -71,7 +68,7 @@ class TransactionSerializer(serializers.ModelSerializer):
             )
 
         # Check for special characters
-        if not all(c.isprintable() for c in value):
+        if not value.isprintable():
             raise serializers.ValidationError(
                 "Description contains invalid characters."
             )
@@ -81,11 +78,20 @@ class TransactionSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Add user information
         validated_data["user"] = self.context["request"].user
-        return super().create(validated_data)
+        # Everything the model's full_clean() checks has been validated here
+        instance = Transaction(**validated_data)
+        instance.save(force_insert=True, validate=False)
+        return instance
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(validate=False)
+        return instance
 
     def validate_category(self, value):
         # Check if the category belongs to the user
-        if value.user != self.context["request"].user:
+        if value.user_id != self.context["request"].user.pk:
             raise serializers.ValidationError("This category does not belong to you.")
         return value
 
@@ -119,6 +125,23 @@ class TransactionSerializer(serializers.ModelSerializer):
         return value
 
 
+def budget_status(budget):
+    """Spending summary for a budget annotated by annotate_budget_spending."""
+    total_spent = budget.spent or 0
+    remaining = budget.amount - total_spent
+    percentage_used = (total_spent / budget.amount) * 100 if budget.amount > 0 else 0
+
+    return {
+        "budget_id": budget.id,
+        "category": budget.category.name,
+        "budget_amount": budget.amount,
+        "total_spent": total_spent,
+        "remaining": remaining,
+        "percentage_used": percentage_used,
+        "status": "warning" if percentage_used > 80 else "ok",
+    }
+
+
 class BudgetSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
 
@@ -139,11 +162,20 @@ class BudgetSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Add user information
         validated_data["user"] = self.context["request"].user
-        return super().create(validated_data)
+        # validate() has made the model's checks already
+        instance = Budget(**validated_data)
+        instance.save(force_insert=True, validate=False)
+        return instance
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(validate=False)
+        return instance
 
     def validate_category(self, value):
         # Check if the category belongs to the user
-        if value.user != self.context["request"].user:
+        if value.user_id != self.context["request"].user.pk:
             raise serializers.ValidationError("This category does not belong to you.")
         return value
 
@@ -153,15 +185,20 @@ class BudgetSerializer(serializers.ModelSerializer):
         return value
 
     def validate(self, data):
-        if data["end_date"] <= data["start_date"]:
+        # Partial updates are checked against the stored values
+        start_date, end_date, category = (
+            data[name] if name in data else getattr(self.instance, name)
+            for name in ("start_date", "end_date", "category")
+        )
+        if end_date <= start_date:
             raise serializers.ValidationError("End date must be after start date.")
 
         # Check for overlapping budgets
         overlapping_budgets = Budget.objects.filter(
             user=self.context["request"].user,
-            category=data["category"],
-            start_date__lte=data["end_date"],
-            end_date__gte=data["start_date"],
+            category=category,
+            start_date__lte=end_date,
+            end_date__gte=start_date,
         ).exclude(pk=self.instance.pk if self.instance else None)
 
         if overlapping_budgets.exists():
@@ -170,3 +207,71 @@ class BudgetSerializer(serializers.ModelSerializer):
             )
 
         return data
+
+
+class BudgetBulkListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        user = self.context["request"].user
+
+        # Category ownership for every item in one query
+        categories = Category.objects.filter(user=user).in_bulk(
+            {item["category"] for item in items}
+        )
+        errors = [{} for _ in items]
+        for item, item_errors in zip(items, errors):
+            item["category"] = categories.get(item["category"])
+            if item["category"] is None:
+                item_errors["category"] = ["This category does not belong to you."]
+
+        if not any(errors):
+            # Overlaps among the items and with stored budgets in one query
+            overlaps = budget_periods.overlap_errors(user, items)
+            for index, messages in overlaps.items():
+                errors[index]["non_field_errors"] = messages
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        user = self.context["request"].user
+        budgets = Budget.objects.bulk_create(
+            [Budget(user=user, **item) for item in validated_data]
+        )
+        caching.bump_version(user.pk)
+        conditional.touch("budgets", user.pk)
+        return budgets
+
+
+class BudgetBulkSerializer(serializers.ModelSerializer):
+    """
+    One budget in a bulk create. Category ownership and overlaps are checked
+    for the whole list at once by BudgetBulkListSerializer.
+    """
+
+    category = serializers.IntegerField()
+
+    class Meta:
+        model = Budget
+        fields = ["amount", "start_date", "end_date", "category"]
+        list_serializer_class = BudgetBulkListSerializer
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Budget amount must be greater than 0.")
+        return value
+
+    def validate(self, data):
+        if data["end_date"] <= data["start_date"]:
+            raise serializers.ValidationError("End date must be after start date.")
+        return data
+
+
+class BudgetWithStatusSerializer(BudgetSerializer):
+    status = serializers.SerializerMethodField()
+
+    class Meta(BudgetSerializer.Meta):
+        fields = BudgetSerializer.Meta.fields + ["status"]
+
+    def get_status(self, obj):
+        return budget_status(obj)
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, conditional, rollups
+from .models import Budget, Category, Transaction
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:  # Fixture loading; run rebuild_rollups afterwards
+        return
+    rollups.record_save(instance, created)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.record_delete(instance)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_analytics_cache(sender, instance, **kwargs):
+    caching.bump_version(instance.user_id)
+
+
+STAMPED_RESOURCES = {
+    Transaction: "transactions",
+    Budget: "budgets",
+    Category: "categories",
+}
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def touch_version_stamp(sender, instance, **kwargs):
+    conditional.touch(STAMPED_RESOURCES[sender], instance.user_id)
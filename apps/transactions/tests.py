@@ -1,3 +1,2262 @@
-from django.test import TestCase
+import calendar
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.request import urlopen
 
-# Create your tests here.
+from django.apps import apps as global_apps
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Sum
+from django.db.utils import load_backend
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.users import throttling
+from fintrack import compression, fastjson, health, instrumentation, routing
+from apps.users.models import User
+from apps.users.tokens import RefreshToken
+from . import (
+    async_views,
+    caching,
+    conditional,
+    db_threads,
+    forecast,
+    rollups,
+    search,
+    trends,
+)
+from .budget_periods import Period, find_overlaps
+from .importers import TransactionImporter
+from .management.commands import serve as serve_command
+from .models import (
+    Budget,
+    Category,
+    DailyRollup,
+    MonthlyRollup,
+    Transaction,
+    sanitize_description,
+)
+from .recurring import last_index, materialize, occurrence
+from .views import BudgetViewSet, TransactionViewSet
+
+
+def _file_connection(path):
+    """A connection to the SQLite file ``path`` using the project settings."""
+    settings_dict = {**connections.settings["default"], "NAME": path}
+    wrapper = load_backend(settings_dict["ENGINE"]).DatabaseWrapper(
+        settings_dict, alias="concurrency"
+    )
+    connections["concurrency"] = wrapper
+    return wrapper
+
+
+def _concurrent_writer(path, worker, writes, errors):
+    wrapper = _file_connection(path)
+    for _ in range(writes):
+        try:
+            # Read then write in one transaction: with a deferred BEGIN this
+            # is what fails with "database is locked" under contention
+            with transaction.atomic(using="concurrency"):
+                with wrapper.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM writes WHERE worker = %s", [worker]
+                    )
+                    (count,) = cursor.fetchone()
+                    cursor.execute(
+                        "INSERT INTO writes (worker, seq) VALUES (%s, %s)",
+                        [worker, count],
+                    )
+        except Exception as e:
+            errors.put(repr(e))
+    wrapper.close()
+
+
+class FinTrackFixtures:
+    @classmethod
+    def create_fixtures(cls):
+        cls.user = User.objects.create_user(
+            email="owner@example.com", username="owner", password="s3cret-pass"
+        )
+        cls.other = User.objects.create_user(
+            email="other@example.com", username="other", password="s3cret-pass"
+        )
+        cls.food = Category.objects.create(name="Food", user=cls.user)
+        cls.salary = Category.objects.create(name="Salary", user=cls.user)
+        Category.objects.create(name="Food", user=cls.other)
+
+        start = date(2024, 1, 1)
+        for i in range(60):
+            Transaction.objects.create(
+                user=cls.user,
+                category=cls.food if i % 3 else cls.salary,
+                amount=Decimal("10.00") + i,
+                description=f"Transaction {i}",
+                transaction_type="expense" if i % 3 else "income",
+                date=start + timedelta(days=i * 5),
+                is_recurring=i % 10 == 0,
+                recurring_type="monthly" if i % 10 == 0 else "none",
+            )
+        cls.budget = Budget.objects.create(
+            user=cls.user,
+            category=cls.food,
+            amount=Decimal("500.00"),
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 3, 31),
+        )
+
+    def setUp(self):
+        cache.clear()  # Analytics responses
+        throttling.store.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class FinTrackTestCase(FinTrackFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite syntax")
+class QueryPlanTests(FinTrackTestCase):
+    """
+    Every query an endpoint issues must be answered through an index, and
+    ordered result sets must come out of the index already sorted.
+    """
+
+    APP_TABLES = (
+        Category._meta.db_table,
+        Transaction._meta.db_table,
+        Budget._meta.db_table,
+        "transactions_dailyrollup",
+        "transactions_monthlyrollup",
+    )
+    FULL_SCAN = re.compile(r"\bSCAN (\w+)(?! USING (?:COVERING )?INDEX)")
+    SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+    def assertNoFullScans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format="json")
+            if response.streaming:
+                b"".join(response.streaming_content)  # Runs the queries
+        self.assertLess(response.status_code, 400)
+
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if not sql.lstrip().upper().startswith("SELECT"):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                match = self.FULL_SCAN.search(step)
+                if match and match.group(1) in self.APP_TABLES:
+                    self.fail(f"Full table scan in {url}: {step}\n{sql}")
+                if self.SORT in step and "COUNT(*)" not in sql:
+                    self.fail(f"Unindexed sort in {url}: {step}\n{sql}")
+
+    def test_transaction_list(self):
+        self.assertNoFullScans("get", "/api/transactions/")
+
+    def test_transaction_list_filters(self):
+        for params in [
+            "type=expense",
+            "recurring_type=monthly",
+            "category=Food",
+            "start_date=2024-02-01&end_date=2024-05-01",
+            "type=income&start_date=2024-02-01",
+            "sort_by=date",
+            "sort_by=-amount",
+            "pagination=cursor&page_size=20",
+            "pagination=cursor&sort_by=amount",
+            "search=transac",
+        ]:
+            with self.subTest(params=params):
+                self.assertNoFullScans("get", f"/api/transactions/?{params}")
+
+    def test_transaction_cursor_page(self):
+        first = self.client.get("/api/transactions/?pagination=cursor").json()
+        self.assertNoFullScans("get", first["next"])
+
+    def test_transaction_export(self):
+        self.assertNoFullScans("get", "/api/transactions/export/?type=expense")
+
+    def test_transaction_detail(self):
+        transaction = Transaction.objects.filter(user=self.user).first()
+        self.assertNoFullScans("get", f"/api/transactions/{transaction.pk}/")
+
+    def test_summary(self):
+        self.assertNoFullScans(
+            "get",
+            "/api/transactions/summary/?start_date=2024-01-10&end_date=2024-06-20",
+        )
+
+    def test_recurring_summary(self):
+        self.assertNoFullScans("get", "/api/transactions/recurring_summary/")
+
+    def test_budget_status(self):
+        self.assertNoFullScans("get", f"/api/budgets/{self.budget.pk}/status/")
+
+    def test_budget_create_overlap_checks(self):
+        self.assertNoFullScans(
+            "post",
+            "/api/budgets/",
+            {
+                "category": self.food.pk,
+                "amount": "200.00",
+                "start_date": "2024-04-01",
+                "end_date": "2024-04-30",
+            },
+        )
+
+    def test_budget_status_list(self):
+        self.assertNoFullScans("get", "/api/budgets/status/")
+
+    def test_category_list(self):
+        self.assertNoFullScans("get", "/api/categories/")
+
+
+class KeysetPaginationTests(FinTrackTestCase):
+    def walk(self, url, link="next"):
+        pages = []
+        while url:
+            body = self.client.get(url).json()
+            pages.append([row["id"] for row in body["results"]])
+            url = body[link]
+        return pages
+
+    def test_walks_every_row_once_in_order(self):
+        for sort_by, ordering in TransactionViewSet.SORT_KEYS.items():
+            with self.subTest(sort_by=sort_by):
+                expected = list(
+                    Transaction.objects.filter(user=self.user)
+                    .order_by(*ordering)
+                    .values_list("id", flat=True)
+                )
+                pages = self.walk(
+                    f"/api/transactions/?pagination=cursor&page_size=7"
+                    f"&sort_by={sort_by}"
+                )
+                self.assertEqual(sum(pages, []), expected)
+                self.assertTrue(all(len(page) == 7 for page in pages[:-1]))
+
+    def test_previous_links_walk_back(self):
+        url = "/api/transactions/?pagination=cursor&page_size=9&sort_by=amount"
+        forward = self.walk(url)
+        last = self.client.get(url).json()
+        while last["next"]:
+            last_url, last = last["next"], self.client.get(last["next"]).json()
+        backward = self.walk(last_url, link="previous")
+        self.assertEqual(backward, forward[::-1])
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/transactions/?pagination=cursor&page_size=1000")
+        self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+
+    def test_rejects_unknown_sort_key_and_bad_cursor(self):
+        response = self.client.get("/api/transactions/?sort_by=description")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/transactions/?cursor=bm9wZQ")
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_unchanged(self):
+        body = self.client.get("/api/transactions/?page=2&page_size=50").json()
+        self.assertEqual(body["count"], 60)
+        self.assertEqual(len(body["results"]), 10)
+
+
+class ImportTests(FinTrackTestCase):
+    def upload(self, name, content, **extra):
+        if isinstance(content, str):
+            content = content.encode()
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(
+            "/api/transactions/import/", {"file": upload, **extra}, format="multipart"
+        )
+
+    def test_csv_import_reports_row_errors(self):
+        other_food = Category.objects.get(user=self.other)
+        content = (
+            "date,amount,description,transaction_type,category,category_name\n"
+            f"2024-05-01,12.50,<b>Coffee</b>  shop,expense,{self.food.pk},\n"
+            "2024-05-02,3000,Pay day,INCOME,,Salary\n"
+            f"2024-05-03,-1,Refund,expense,{self.food.pk},\n"
+            f"2024-05-04,5,Not mine,expense,{other_food.pk},\n"
+            "2999-01-01,5,Future,expense,,Food\n"
+        )
+        before = Transaction.objects.count()
+        response = self.upload("statement.csv", content)
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (2, 3))
+        self.assertEqual([e["row"] for e in body["errors"]], [3, 4, 5])
+        self.assertIn("amount", body["errors"][0]["errors"])
+        self.assertIn("category", body["errors"][1]["errors"])
+        self.assertIn("date", body["errors"][2]["errors"])
+        self.assertEqual(Transaction.objects.count(), before + 2)
+        coffee = Transaction.objects.get(date=date(2024, 5, 1))
+        self.assertEqual(coffee.description, "Coffee shop")
+
+        summary = self.client.get(
+            "/api/transactions/summary/?start_date=2024-05-01&end_date=2024-05-02"
+        ).json()
+        self.assertEqual(Decimal(str(summary["total_income"])), Decimal("3000"))
+
+    def test_unreadable_csv_rows_are_row_errors(self):
+        header = b"date,amount,description,transaction_type,category\n"
+        good = f"2024-05-01,12.50,Coffee shop,expense,{self.food.pk}\n".encode()
+        response = self.upload(
+            "statement.csv",
+            header + b"2024-05-02,1\x00,Nul byte,expense,1\n" + good + b"\xff\xfe,1\n",
+        )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (1, 2))
+        self.assertEqual([e["row"] for e in body["errors"]], [1, 3])
+
+        response = self.upload("statement.csv", b"\xff\xfe\x00date")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["failed"], 1)
+
+    def test_ndjson_values_of_the_wrong_type_are_row_errors(self):
+        row = {
+            "date": "2024-05-01",
+            "amount": "1.00",
+            "description": "Odd values",
+            "type": "expense",
+            "category": self.food.pk,
+        }
+        lines = [
+            {**row, "recurring_type": ["monthly"]},
+            {**row, "recurring_type": {"monthly": True}},
+            {**row, "category": [self.food.pk], "transaction_type": ["expense"]},
+        ]
+        response = self.upload(
+            "rows.ndjson", "\n".join(json.dumps(line) for line in lines)
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = [e["errors"] for e in response.json()["errors"]]
+        self.assertIn("recurring_type", errors[0])
+        self.assertIn("recurring_type", errors[1])
+        self.assertIn("category", errors[2])
+
+    def test_ndjson_import_in_batches(self):
+        lines = [
+            json.dumps(
+                {
+                    "date": "2023-01-01",
+                    "amount": "1.00",
+                    "description": f"Row {i}",
+                    "type": "expense",
+                    "category": self.food.pk,
+                }
+            )
+            for i in range(25)
+        ]
+        lines.insert(3, "{not json")
+        with patch.object(TransactionImporter, "batch_size", 10):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.upload("rows.ndjson", "\n".join(lines))
+
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (25, 1))
+        self.assertEqual(body["errors"][0]["row"], 4)
+        category_lookups = [
+            q for q in ctx.captured_queries if "transactions_category" in q["sql"]
+        ]
+        self.assertEqual(len(category_lookups), 1)
+
+    def test_batch_rollups_are_one_upsert_per_table(self):
+        lines = [
+            json.dumps(
+                {
+                    "date": str(date(2023, 1, 1) + timedelta(days=i)),
+                    "amount": "1.00",
+                    "description": f"Row {i}",
+                    "type": "expense",
+                    "category": self.food.pk,
+                }
+            )
+            for i in range(90)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.upload("rows.ndjson", "\n".join(lines))
+        self.assertEqual(response.json()["created"], 90)
+        rollup_writes = [
+            q["sql"] for q in ctx.captured_queries if "rollup" in q["sql"].lower()
+        ]
+        self.assertEqual(len(rollup_writes), 2)
+
+        monthly = MonthlyRollup.objects.get(
+            user=self.user, category=self.food, month=date(2023, 2, 1)
+        )
+        self.assertEqual((monthly.total, monthly.count), (Decimal("28.00"), 28))
+        self.assertEqual(
+            DailyRollup.objects.filter(user=self.user, date__year=2023).count(), 90
+        )
+
+    def test_requires_file(self):
+        response = self.client.post("/api/transactions/import/", {})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(FinTrackTestCase):
+    def export(self, params=""):
+        response = self.client.get(f"/api/transactions/export/?{params}")
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export_uses_list_filters(self):
+        response, content = self.export("type=income&sort_by=amount")
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+        rows = list(csv.DictReader(io.StringIO(content)))
+        expected = Transaction.objects.filter(
+            user=self.user, transaction_type="income"
+        ).order_by("amount", "id")
+        self.assertEqual([int(row["id"]) for row in rows], [t.pk for t in expected])
+        self.assertEqual(rows[0]["category_name"], "Salary")
+        self.assertEqual(rows[0]["amount"], "10.00")
+
+    def test_ndjson_export_matches_serializer(self):
+        _, content = self.export("file_format=ndjson&sort_by=date")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 60)
+
+        api = self.client.get("/api/transactions/?sort_by=date").json()["results"]
+        for exported, listed in zip(rows, api):
+            self.assertEqual(exported, listed)
+
+    def test_unknown_format(self):
+        response = self.client.get("/api/transactions/export/?file_format=xml")
+        self.assertEqual(response.status_code, 400)
+
+
+class RowMapperTests(FinTrackTestCase):
+    def assertSameAsSerializer(self, viewset, url):
+        fast = self.client.get(url)
+        with patch.object(viewset, "use_row_mapper", return_value=False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_transaction_list_is_byte_identical(self):
+        for params in [
+            "",
+            "page_size=1000&page=2",
+            "type=income&sort_by=amount",
+            "pagination=cursor&page_size=25",
+        ]:
+            with self.subTest(params=params):
+                self.assertSameAsSerializer(
+                    TransactionViewSet, f"/api/transactions/?{params}"
+                )
+
+    def test_budget_list_is_byte_identical(self):
+        self.assertSameAsSerializer(BudgetViewSet, "/api/budgets/")
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for page_size in (10, 60):
+            with self.subTest(page_size=page_size):
+                # One query for the page, joined with category; no per-row
+                # category lookups
+                with self.assertNumQueries(1):
+                    self.client.get(
+                        f"/api/transactions/?pagination=cursor&page_size={page_size}"
+                    )
+
+
+class RecurringMaterializationTests(FinTrackTestCase):
+    def make_template(self, anchor, recurring_type, amount="20.00"):
+        return Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal(amount),
+            description=f"Subscription {recurring_type}",
+            transaction_type="expense",
+            date=anchor,
+            is_recurring=True,
+            recurring_type=recurring_type,
+        )
+
+    def test_occurrence_dates(self):
+        jan31 = date(2023, 1, 31)
+        self.assertEqual(
+            [occurrence(jan31, "monthly", i) for i in range(4)],
+            [jan31, date(2023, 2, 28), date(2023, 3, 31), date(2023, 4, 30)],
+        )
+        leap = date(2024, 2, 29)
+        self.assertEqual(occurrence(leap, "yearly", 1), date(2025, 2, 28))
+        self.assertEqual(occurrence(leap, "yearly", 4), date(2028, 2, 29))
+        self.assertEqual(last_index(jan31, "monthly", date(2023, 3, 30)), 1)
+        self.assertEqual(last_index(jan31, "weekly", date(2023, 1, 30)), -1)
+
+    def test_materialize_is_idempotent(self):
+        template = self.make_template(date(2023, 1, 31), "monthly")
+        weekly = self.make_template(date(2023, 1, 2), "weekly", "5.00")
+
+        created = materialize(until=date(2023, 6, 30))
+        self.assertEqual(created, 5 + 25)
+        self.assertEqual(materialize(until=date(2023, 6, 30)), 0)
+        self.assertEqual(materialize(until=date(2023, 7, 31)), 1 + 5)
+
+        generated = template.generated_transactions.order_by("date")
+        self.assertEqual(generated.first().date, date(2023, 2, 28))
+        self.assertEqual(generated.last().date, date(2023, 7, 31))
+        self.assertTrue(all(t.is_auto_generated for t in generated))
+        self.assertFalse(any(t.is_recurring for t in generated))
+        self.assertEqual(weekly.generated_transactions.count(), 30)
+
+        # Generated rows count towards the rollups and can be filtered
+        summary = self.client.get(
+            "/api/transactions/summary/?start_date=2023-02-01&end_date=2023-02-28"
+        ).json()
+        self.assertEqual(Decimal(str(summary["total_expense"])), Decimal("40.00"))
+        body = self.client.get(
+            "/api/transactions/?is_auto_generated=true&page_size=100"
+        ).json()
+        self.assertEqual(body["count"], 36)
+
+    def test_occurrences_created_by_an_overlapping_run_are_skipped(self):
+        template = self.make_template(date(2023, 1, 31), "monthly")
+        self.assertEqual(materialize(until=date(2023, 4, 30)), 3)
+        expense = DailyRollup.objects.get(user=self.user, date=date(2023, 3, 31))
+
+        # As if another run had inserted them after this one read the last
+        # generated dates
+        with patch("apps.transactions.recurring.next_index", return_value=1):
+            self.assertEqual(materialize(until=date(2023, 5, 31)), 1)
+        self.assertEqual(template.generated_transactions.count(), 4)
+        expense.refresh_from_db()
+        self.assertEqual((expense.total, expense.count), (Decimal("20.00"), 1))
+
+    def test_stopped_templates_are_skipped(self):
+        template = self.make_template(date(2023, 1, 1), "yearly")
+        template.is_recurring = False
+        template.save()
+        materialize(until=date(2025, 1, 1))
+        self.assertFalse(template.generated_transactions.exists())
+
+    def test_template_moved_past_its_occurrences(self):
+        template = self.make_template(date(2023, 1, 10), "monthly")
+        materialize(until=date(2023, 3, 31))  # Feb 10 and Mar 10
+        template.date = date(2023, 5, 20)
+        template.save()
+
+        self.assertEqual(materialize(until=date(2023, 6, 30)), 1)
+        self.assertEqual(
+            list(
+                template.generated_transactions.order_by("date").values_list(
+                    "date", flat=True
+                )
+            ),
+            [date(2023, 2, 10), date(2023, 3, 10), date(2023, 6, 20)],
+        )
+
+    def test_until_cannot_be_in_the_future(self):
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        with self.assertRaisesMessage(CommandError, "future"):
+            call_command("materialize_recurring", until=tomorrow.isoformat())
+
+
+class BudgetStatusTests(FinTrackTestCase):
+    def add_budgets(self, count):
+        category = Category.objects.create(name=f"Bills {count}", user=self.user)
+        for i in range(count):
+            Budget.objects.create(
+                user=self.user,
+                category=category,
+                amount=Decimal("100.00"),
+                start_date=date(2020, 1, 1) + timedelta(days=10 * i),
+                end_date=date(2020, 1, 9) + timedelta(days=10 * i),
+            )
+
+    def test_status_list_matches_detail(self):
+        detail = self.client.get(f"/api/budgets/{self.budget.pk}/status/").json()
+        statuses = self.client.get("/api/budgets/status/").json()
+
+        self.assertEqual(statuses, [detail])
+        expected = sum(
+            t.amount
+            for t in Transaction.objects.filter(
+                user=self.user,
+                category=self.food,
+                transaction_type="expense",
+                date__range=[self.budget.start_date, self.budget.end_date],
+            )
+        )
+        self.assertEqual(Decimal(str(detail["total_spent"])), expected)
+
+    def test_status_list_query_count_is_constant(self):
+        self.add_budgets(3)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get("/api/budgets/status/")
+        self.add_budgets(30)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get("/api/budgets/status/")
+
+        self.assertEqual(len(response.json()), 34)
+        self.assertEqual(len(few), len(many))
+
+    def test_list_include_status(self):
+        self.add_budgets(5)
+        with self.assertNumQueries(2):  # COUNT(*) for pagination + page
+            response = self.client.get("/api/budgets/?include_status=true")
+        results = response.json()["results"]
+        self.assertEqual(len(results), 6)
+        for budget in results:
+            self.assertEqual(budget["status"]["budget_id"], budget["id"])
+
+        plain = self.client.get("/api/budgets/").json()["results"]
+        self.assertNotIn("status", plain[0])
+
+
+class TransactionWriteTests(FinTrackTestCase):
+    payload = {
+        "amount": "12.50",
+        "description": "Lunch <b>out</b>  {with}   team",
+        "transaction_type": "expense",
+        "date": "2024-01-05",
+    }
+
+    def test_create_queries(self):
+        # Category lookup, savepoint, insert, two rollup updates (the day
+        # already has rollup rows), release: no user fetch for the ownership
+        # check and no model re-validation
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                "/api/transactions/",
+                {**self.payload, "date": "2024-01-06", "category": self.food.pk},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["description"], "Lunch out with team")
+        self.assertTrue(Transaction.objects.filter(pk=response.json()["id"]).exists())
+
+    def test_create_rejects_other_users_category(self):
+        category = Category.objects.get(user=self.other)
+        response = self.client.post(
+            "/api/transactions/",
+            {**self.payload, "category": category.pk},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("category", response.json())
+
+    def test_update_skips_full_clean(self):
+        obj = Transaction.objects.filter(user=self.user).first()
+        with patch.object(Transaction, "full_clean") as full_clean:
+            response = self.client.patch(
+                f"/api/transactions/{obj.pk}/",
+                {"description": "Renamed <i>entry</i>"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        full_clean.assert_not_called()
+        obj.refresh_from_db()
+        self.assertEqual(obj.description, "Renamed entry")
+
+    def test_model_save_still_validates(self):
+        category = Category.objects.get(user=self.other)
+        with self.assertRaises(ValidationError):
+            Transaction(
+                user=self.user,
+                category=category,
+                amount=Decimal("1.00"),
+                description="Not mine",
+                transaction_type="expense",
+                date=date(2024, 1, 1),
+            ).save()
+
+    def test_sanitize_description(self):
+        cases = {
+            "  plain text ": "plain text",
+            "a <script>alert(1)</script> b": "a alert(1) b",
+            "x > y and {z} [w]": "x y and z w",
+            "tab\tand\nnewline": "tab and newline",
+            "<unclosed tag": "unclosed tag",
+        }
+        for value, expected in cases.items():
+            self.assertEqual(sanitize_description(value), expected)
+
+
+class RollupTests(FinTrackTestCase):
+    def expected(self, period):
+        """Rollup rows computed from the transactions table."""
+        rows = defaultdict(lambda: [Decimal("0"), 0])
+        for t in Transaction.objects.all():
+            *key, day, amount = t.rollup_state()
+            bucket = rows[(*key, period(day))]
+            bucket[0] += amount
+            bucket[1] += 1
+        return {key: tuple(value) for key, value in rows.items()}
+
+    def stored(self, model, period_field):
+        rows = {}
+        for row in model.objects.all():
+            key = (
+                row.user_id,
+                row.category_id,
+                row.transaction_type,
+                row.recurring_type,
+                getattr(row, period_field),
+            )
+            # Buckets emptied by updates and deletes stay behind, at zero
+            if row.count or row.total:
+                rows[key] = (row.total, row.count)
+        return rows
+
+    def assertRollupsMatch(self):
+        self.assertEqual(self.stored(DailyRollup, "date"), self.expected(lambda d: d))
+        self.assertEqual(
+            self.stored(MonthlyRollup, "month"), self.expected(rollups.month_start)
+        )
+
+    def test_rollups_follow_writes(self):
+        self.assertRollupsMatch()
+        response = self.client.post(
+            "/api/transactions/",
+            {
+                "amount": "12.50",
+                "description": "Lunch",
+                "transaction_type": "expense",
+                "date": "2024-01-31",
+                "category": self.food.pk,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertRollupsMatch()
+
+        url = f"/api/transactions/{response.json()['id']}/"
+        for change in (
+            {"amount": "99.99"},
+            {"date": "2024-02-01"},  # Into the next month
+            {"transaction_type": "income"},
+            {"category": self.salary.pk},
+            {"is_recurring": True, "recurring_type": "weekly"},
+        ):
+            response = self.client.patch(url, change, format="json")
+            self.assertEqual(response.status_code, 200, change)
+            self.assertRollupsMatch()
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertRollupsMatch()
+
+    def test_rebuild_reproduces_rollups(self):
+        daily = self.stored(DailyRollup, "date")
+        monthly = self.stored(MonthlyRollup, "month")
+        DailyRollup.objects.update(total=0, count=0)
+        MonthlyRollup.objects.filter(user=self.user).delete()
+
+        call_command("rebuild_rollups", stdout=io.StringIO())
+        self.assertEqual(self.stored(DailyRollup, "date"), daily)
+        self.assertEqual(self.stored(MonthlyRollup, "month"), monthly)
+
+    def test_migration_backfills_existing_transactions(self):
+        backfill = importlib.import_module(
+            "apps.transactions.migrations.0007_backfill_rollups"
+        )
+        DailyRollup.objects.all().delete()
+        MonthlyRollup.objects.all().delete()
+
+        backfill.backfill_rollups(global_apps, SimpleNamespace(connection=connection))
+        self.assertRollupsMatch()
+
+    def test_summary_across_month_boundaries(self):
+        start, end = date(2024, 1, 17), date(2024, 4, 9)
+        summary = self.client.get(
+            f"/api/transactions/summary/?start_date={start}&end_date={end}"
+        ).json()
+        in_range = Transaction.objects.filter(user=self.user, date__range=[start, end])
+        for transaction_type in ("income", "expense"):
+            expected = in_range.filter(transaction_type=transaction_type).aggregate(
+                total=Sum("amount")
+            )["total"]
+            self.assertEqual(
+                Decimal(str(summary[f"total_{transaction_type}"])), expected
+            )
+
+
+class BudgetPeriodTests(FinTrackTestCase):
+    def monthly(self, category, year, months=12):
+        return [
+            {
+                "category": category.pk,
+                "amount": "100.00",
+                "start_date": date(year, month, 1).isoformat(),
+                "end_date": (
+                    date(year, month, calendar.monthrange(year, month)[1])
+                ).isoformat(),
+            }
+            for month in range(1, months + 1)
+        ]
+
+    def test_find_overlaps(self):
+        periods = [
+            Period(date(2024, 1, 1), date(2024, 1, 31), 0, None),
+            Period(date(2024, 1, 5), date(2024, 1, 10), 1, None),
+            Period(date(2024, 1, 31), date(2024, 2, 5), 2, None),
+            Period(date(2024, 2, 6), date(2024, 2, 10), 3, None),
+        ]
+        overlapping = {
+            period.index for pair in find_overlaps(periods) for period in pair
+        }
+        self.assertEqual(overlapping, {0, 1, 2})
+
+    def test_bulk_create(self):
+        categories = [
+            Category.objects.create(name=f"Bulk {i}", user=self.user) for i in range(5)
+        ]
+        payload = [item for c in categories for item in self.monthly(c, 2025)]
+        # Savepoint, categories, existing periods, insert, release
+        with self.assertNumQueries(5):
+            response = self.client.post("/api/budgets/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 60)
+        self.assertEqual(response.json()[0]["category_name"], "Bulk 0")
+        self.assertEqual(Budget.objects.filter(category__in=categories).count(), 60)
+
+    def test_bulk_create_rejects_overlaps(self):
+        payload = self.monthly(self.salary, 2025, months=3)
+        payload[2]["start_date"] = "2025-02-20"
+        payload.append(
+            {
+                "category": self.food.pk,
+                "amount": "50.00",
+                "start_date": "2024-03-01",
+                "end_date": "2024-04-30",
+            }
+        )
+        response = self.client.post("/api/budgets/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertEqual(
+            errors[1], {"non_field_errors": ["Overlaps budget 2 in this request."]}
+        )
+        self.assertEqual(
+            errors[2], {"non_field_errors": ["Overlaps budget 1 in this request."]}
+        )
+        self.assertEqual(
+            errors[3],
+            {"non_field_errors": ["A budget already exists for this date range."]},
+        )
+        self.assertFalse(Budget.objects.filter(category=self.salary).exists())
+
+    def test_bulk_create_rejects_other_users_category(self):
+        payload = self.monthly(Category.objects.get(user=self.other), 2025, months=2)
+        response = self.client.post("/api/budgets/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("category", response.json()[0])
+
+    def test_single_create_checks_overlap_once(self):
+        payload = self.monthly(self.salary, 2025, months=1)[0]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/api/budgets/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        overlap_checks = [
+            q for q in ctx.captured_queries if 'FROM "transactions_budget"' in q["sql"]
+        ]
+        self.assertEqual(len(overlap_checks), 1)
+
+        response = self.client.post("/api/budgets/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_partial_update_checks_stored_dates(self):
+        response = self.client.patch(
+            f"/api/budgets/{self.budget.pk}/", {"end_date": "2023-12-31"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(
+            f"/api/budgets/{self.budget.pk}/", {"amount": "600.00"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_covering(self):
+        self.client.post(
+            "/api/budgets/bulk/", self.monthly(self.salary, 2024), format="json"
+        )
+        response = self.client.get("/api/budgets/covering/?date=2024-02-10")
+        self.assertEqual(
+            [(b["category"], b["budget_amount"]) for b in response.json()],
+            [("Food", 500), ("Salary", 100)],
+        )
+        self.assertEqual(
+            response.json()[0],
+            self.client.get(f"/api/budgets/{self.budget.pk}/status/").json(),
+        )
+        response = self.client.get(
+            f"/api/budgets/covering/?date=2024-05-10&category={self.food.pk}"
+        )
+        self.assertEqual(response.json(), [])
+        self.assertEqual(
+            len(self.client.get("/api/budgets/covering/?date=2024-05-10").json()), 1
+        )
+
+
+class RecurringSummaryTests(FinTrackTestCase):
+    def test_single_query_and_normalised_impact(self):
+        for recurring_type, transaction_type, amount in (
+            ("weekly", "expense", "12.00"),
+            ("yearly", "expense", "1200.00"),
+            ("yearly", "income", "240.00"),
+        ):
+            Transaction.objects.create(
+                user=self.user,
+                category=self.food,
+                amount=Decimal(amount),
+                description=f"{recurring_type} {transaction_type}",
+                transaction_type=transaction_type,
+                date=date(2024, 5, 1),
+                is_recurring=True,
+                recurring_type=recurring_type,
+            )
+        monthly = Transaction.objects.filter(user=self.user, recurring_type="monthly")
+        monthly_expense = sum(
+            t.amount for t in monthly if t.transaction_type == "expense"
+        )
+        monthly_income = sum(
+            t.amount for t in monthly if t.transaction_type == "income"
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/transactions/recurring_summary/")
+        data = response.json()
+
+        self.assertEqual(
+            data["recurring_by_type"],
+            {"weekly": 1, "monthly": monthly.count(), "yearly": 2},
+        )
+        self.assertEqual(data["total_recurring"], monthly.count() + 3)
+        self.assertEqual(
+            Decimal(str(data["expense_total"])), monthly_expense + 12 + 1200
+        )
+        self.assertEqual(Decimal(str(data["income_total"])), monthly_income + 240)
+        # 12 * 52 / 12 weekly + (1200 - 240) / 12 yearly
+        self.assertEqual(
+            Decimal(str(data["monthly_impact"])),
+            Decimal("52.00") + monthly_expense - monthly_income + Decimal("80.00"),
+        )
+
+
+class TrendsTests(FinTrackTestCase):
+    url = "/api/transactions/trends/?start_date=2024-01-01&end_date=2024-12-31"
+
+    def test_series_match_transactions(self):
+        with self.assertNumQueries(2):  # Rollup rows, category names
+            data = self.client.get(self.url).json()
+        self.assertEqual(len(data["monthly"]), 12)
+        self.assertEqual(data["weekly"][0]["week"], "2024-01-01")  # A Monday
+
+        transactions = Transaction.objects.filter(user=self.user, date__year=2024)
+        for month in data["monthly"]:
+            year, number = map(int, month["month"].split("-"))
+            for transaction_type in ("income", "expense"):
+                expected = sum(
+                    t.amount
+                    for t in transactions
+                    if t.date.month == number and t.transaction_type == transaction_type
+                )
+                self.assertEqual(Decimal(str(month[transaction_type])), expected)
+        expense = [Decimal(str(m["expense"])) for m in data["monthly"]]
+        self.assertIsNone(data["monthly"][1]["expense_avg"])
+        self.assertEqual(
+            Decimal(str(data["monthly"][5]["expense_avg"])),
+            (sum(expense[3:6]) / 3).quantize(Decimal("0.01")),
+        )
+        self.assertTrue(all(m["expense_yoy"] is None for m in data["monthly"]))
+
+        self.assertEqual(
+            sum(Decimal(str(w["net"])) for w in data["weekly"]),
+            sum(Decimal(str(m["net"])) for m in data["monthly"]),
+        )
+        shares = {c["category"]: c["expense_share"] for c in data["categories"]}
+        self.assertEqual(shares, {"Food": 100, "Salary": 0})
+
+    def test_amounts_and_shares_are_decimals(self):
+        rows = trends.rows(self.user)
+        data = trends.trends(rows, date(2024, 1, 1), date(2024, 12, 31))
+        month = data["monthly"][5]
+        weeks = data["weekly"]
+        values = [month[key] for key in ("income", "expense", "net", "expense_avg")]
+        values += [weeks[0]["income"], weeks[0]["net"]]
+        for category in data["categories"]:
+            values += [category["expense"], category["income_share"]]
+            values.append(category["expense_share"])
+        for value in values:
+            self.assertIsInstance(value, Decimal)
+            self.assertEqual(value.as_tuple().exponent, -2)
+
+    def test_year_over_year(self):
+        data = self.client.get(
+            "/api/transactions/trends/?start_date=2024-01-01&end_date=2025-12-31"
+            "&window=12"
+        ).json()
+        january = data["monthly"][0]
+        next_january = data["monthly"][12]
+        self.assertEqual(
+            Decimal(str(next_january["expense_yoy"])),
+            Decimal(str(next_january["expense"])) - Decimal(str(january["expense"])),
+        )
+        self.assertIsNone(data["monthly"][10]["expense_avg"])
+        self.assertIsNotNone(data["monthly"][11]["expense_avg"])
+
+    def test_defaults_to_whole_history(self):
+        data = self.client.get("/api/transactions/trends/").json()
+        self.assertEqual(data["start_date"], "2024-01-01")
+        self.assertEqual(data["monthly"][0]["month"], "2024-01")
+
+    def test_invalid_window(self):
+        response = self.client.get("/api/transactions/trends/?window=0")
+        self.assertEqual(response.status_code, 400)
+
+    def test_span_is_capped(self):
+        response = self.client.get("/api/transactions/trends/?start_date=0001-01-01")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start_date", response.json())
+
+        response = self.client.get(
+            "/api/transactions/trends/?start_date=2015-01-01&end_date=2024-12-31"
+        )
+        self.assertEqual(len(response.json()["monthly"]), 120)
+
+        # Without a start date, history older than the cap is left out
+        Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal("1.00"),
+            description="Ancient",
+            transaction_type="expense",
+            date=date(1, 1, 1),
+        )
+        data = self.client.get("/api/transactions/trends/?end_date=2024-12-31").json()
+        self.assertEqual(data["start_date"], "2024-01-01")
+
+    @skipUnless(trends.np is not None, "NumPy is not installed")
+    def test_numpy_and_python_paths_agree(self):
+        rows = trends.rows(self.user)
+        start, end = date(2023, 6, 1), date(2025, 3, 31)
+        vectorised = trends.trends(rows, start, end)
+        with patch.object(trends, "np", None):
+            self.assertEqual(trends.trends(rows, start, end), vectorised)
+
+
+class ForecastTests(FinTrackTestCase):
+    today = date(2024, 12, 15)
+
+    def test_projection_matches_materialized_balance(self):
+        daily = forecast.forecast(self.user, 6, "daily", today=self.today)
+        self.assertEqual(len(daily["series"]), (daily["end_date"] - self.today).days)
+
+        materialize(until=self.today)
+        self.assertEqual(daily["balance"], rollups.balance(self.user))
+        again = forecast.forecast(self.user, 6, "daily", today=self.today)
+        self.assertEqual(again["series"], daily["series"])
+
+        materialize(until=daily["end_date"])
+        self.assertEqual(daily["series"][-1]["balance"], rollups.balance(self.user))
+
+    def test_amounts_are_exact(self):
+        monthly = forecast.forecast(self.user, 6, "monthly", today=self.today)
+        amounts = [monthly["balance"], monthly["minimum"]["balance"]]
+        for month in monthly["series"]:
+            amounts += [month["balance"], month["change"]]
+        for amount in amounts:
+            self.assertIsInstance(amount, Decimal)
+            self.assertEqual(amount.as_tuple().exponent, -2)
+
+    def test_today_is_the_current_utc_date(self):
+        # Late on the 15th in UTC is already the 16th in some time zones
+        now = datetime(2024, 12, 15, 23, 30, tzinfo=dt_timezone.utc)
+        with patch("django.utils.timezone.now", return_value=now):
+            result = forecast.forecast(self.user, 1)
+        self.assertEqual(result["as_of"], self.today)
+
+    def test_monthly_series(self):
+        daily = forecast.forecast(self.user, 6, "daily", today=self.today)
+        monthly = forecast.forecast(self.user, 6, "monthly", today=self.today)
+        self.assertEqual(
+            [m["month"] for m in monthly["series"]],
+            [
+                "2024-12",
+                "2025-01",
+                "2025-02",
+                "2025-03",
+                "2025-04",
+                "2025-05",
+                "2025-06",
+            ],
+        )
+        self.assertEqual(
+            monthly["series"][-1]["balance"], daily["series"][-1]["balance"]
+        )
+        self.assertEqual(
+            sum(m["change"] for m in monthly["series"]),
+            daily["series"][-1]["balance"] - daily["balance"],
+        )
+
+    def test_low_points(self):
+        result = forecast.forecast(self.user, 24, "daily", today=self.today)
+        balances = [point["balance"] for point in result["series"]]
+        self.assertEqual(result["minimum"]["balance"], min(balances))
+        lows = result["low_points"]
+        self.assertEqual(len(lows), 5)
+        self.assertEqual(lows[0], result["minimum"])
+        self.assertEqual(lows, sorted(lows, key=lambda p: p["balance"]))
+
+    def test_endpoint(self):
+        response = self.client.get("/api/transactions/forecast/?months=3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["series"]), 4)
+        for query in ("months=0", "months=121", "granularity=weekly"):
+            response = self.client.get(f"/api/transactions/forecast/?{query}")
+            self.assertEqual(response.status_code, 400)
+
+    @skipUnless(forecast.np is not None, "NumPy is not installed")
+    def test_numpy_and_python_paths_agree(self):
+        Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal("7.25"),
+            description="Leap day subscription",
+            transaction_type="expense",
+            date=date(2024, 2, 29),
+            is_recurring=True,
+            recurring_type="yearly",
+        )
+        Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal("3.10"),
+            description="Weekly groceries",
+            transaction_type="expense",
+            date=date(2024, 1, 31),
+            is_recurring=True,
+            recurring_type="weekly",
+        )
+        for granularity in ("daily", "monthly"):
+            vectorised = forecast.forecast(self.user, 60, granularity, today=self.today)
+            with patch.object(forecast, "np", None):
+                self.assertEqual(
+                    forecast.forecast(self.user, 60, granularity, today=self.today),
+                    vectorised,
+                )
+
+
+class SearchTests(FinTrackTestCase):
+    def find(self, text, **params):
+        if "sort_by" not in params:
+            params.update(pagination="cursor", page_size=100)
+        response = self.client.get("/api/transactions/", {"search": text, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row["description"] for row in response.json()["results"]]
+
+    def test_every_word_matches_the_last_as_a_prefix(self):
+        self.assertEqual(len(self.find("transac")), 60)
+        self.assertEqual(self.find("transaction 42"), ["Transaction 42"])
+        self.assertEqual(len(self.find("transaction 4")), 11)  # 4 and 40 to 49
+        self.assertEqual(self.find("trans 42"), [])
+        self.assertEqual(self.find("groceries"), [])
+        # FTS5 query syntax in the input is treated as plain words
+        self.assertEqual(self.find('"42" OR NEAR('), [])
+        self.assertEqual(len(self.find("Transaction*")), 60)
+
+    def test_only_own_transactions(self):
+        Transaction.objects.create(
+            user=self.other,
+            category=Category.objects.get(user=self.other),
+            amount=Decimal("5.00"),
+            description="Transaction elsewhere",
+            transaction_type="expense",
+            date=date(2024, 1, 1),
+        )
+        self.assertEqual(self.find("elsewhere"), [])
+
+    def test_index_follows_writes(self):
+        transaction = Transaction.objects.get(description="Transaction 7")
+        transaction.description = "Café au lait"
+        transaction.save()
+        self.assertEqual(self.find("cafe"), ["Café au lait"])
+        self.assertEqual(self.find("transaction 7"), [])
+
+        Transaction.objects.filter(pk=transaction.pk).update(description="Bakery")
+        self.assertEqual(self.find("bak"), ["Bakery"])
+        self.assertEqual(self.find("cafe"), [])
+
+        transaction.delete()
+        self.assertEqual(self.find("bak"), [])
+
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=self.user,
+                category=self.food,
+                amount=Decimal("1.00"),
+                description=f"Imported row {i}",
+                transaction_type="expense",
+                date=date(2024, 6, 1),
+            )
+            for i in range(3)
+        )
+        self.assertEqual(len(self.find("imported")), 3)
+
+    def test_sort_by_relevance(self):
+        Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal("2.00"),
+            description="Coffee coffee coffee",
+            transaction_type="expense",
+            date=date(2024, 1, 2),
+        )
+        Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal("2.00"),
+            description="Coffee with a long list of other words in it",
+            transaction_type="expense",
+            date=date(2024, 1, 3),
+        )
+        self.assertEqual(
+            self.find("coffee", sort_by="relevance")[0], "Coffee coffee coffee"
+        )
+        for params in (
+            {"sort_by": "relevance"},
+            {"search": "coffee", "sort_by": "relevance", "pagination": "cursor"},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get("/api/transactions/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_many_matches(self):
+        with patch.object(search, "MAX_IDS", 5):
+            # Matched through a subquery rather than a list of ids
+            self.assertEqual(len(self.find("transac")), 60)
+            response = self.client.get(
+                "/api/transactions/", {"search": "transac", "sort_by": "relevance"}
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_limits_count_only_the_users_matches(self):
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=self.other,
+                category=Category.objects.get(user=self.other),
+                amount=Decimal("3.00"),
+                description="Coffee",
+                transaction_type="expense",
+                date=date(2024, 1, 1),
+            )
+            for _ in range(10)
+        )
+        Transaction.objects.create(
+            user=self.user,
+            category=self.food,
+            amount=Decimal("3.00"),
+            description="Coffee",
+            transaction_type="expense",
+            date=date(2024, 1, 1),
+        )
+        with patch.object(search, "MAX_IDS", 5):
+            self.assertEqual(self.find("coffee"), ["Coffee"])
+            self.assertEqual(self.find("coffee", sort_by="relevance"), ["Coffee"])
+            self.client.force_authenticate(self.other)
+            # Over the limit: matched through the subquery, not ranked
+            self.assertEqual(len(self.find("coffee")), 10)
+            response = self.client.get(
+                "/api/transactions/", {"search": "coffee", "sort_by": "relevance"}
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_like_fallback_without_index(self):
+        with patch.object(search, "available", return_value=False):
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(len(self.find("transac")), 60)
+                self.assertEqual(self.find("transaction 42"), ["Transaction 42"])
+                self.assertEqual(
+                    self.find("transaction 42", sort_by="relevance"), ["Transaction 42"]
+                )
+        self.assertFalse(any(search.TABLE in q["sql"] for q in ctx.captured_queries))
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser(
+            email="admin@example.com", username="admin", password="s3cret-pass"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            "/admin/transactions/transaction/", {"q": "transaction 42"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_count, 1)
+        response = self.client.get("/admin/transactions/transaction/", {"q": "other@"})
+        self.assertEqual(response.context["cl"].result_count, 0)
+        response = self.client.get("/admin/transactions/transaction/", {"q": "owner@"})
+        self.assertEqual(response.context["cl"].result_count, 60)
+
+    def test_rebuild_command(self):
+        if not search.supported(connection):
+            self.skipTest("SQLite without FTS5")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.TABLE} ({search.TABLE}) VALUES ('delete-all')"
+            )
+        self.assertEqual(self.find("transac"), [])
+        stdout = io.StringIO()
+        call_command("rebuild_search_index", stdout=stdout)
+        self.assertIn("Indexed 60 transactions", stdout.getvalue())
+        self.assertEqual(len(self.find("transac")), 60)
+
+
+class AnalyticsCacheTests(FinTrackTestCase):
+    def test_hit_after_miss(self):
+        for url in (
+            "/api/transactions/summary/?start_date=2024-01-01",
+            "/api/transactions/recurring_summary/",
+            f"/api/budgets/{self.budget.pk}/status/",
+            "/api/budgets/status/",
+        ):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first["X-Cache"], "MISS")
+            self.assertEqual(second["X-Cache"], "HIT")
+            self.assertEqual(first.json(), second.json())
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get("/api/transactions/summary/?start_date=2024-01-01")
+        response = self.client.get("/api/transactions/summary/?start_date=2024-02-01")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_writes_invalidate(self):
+        url = "/api/transactions/summary/?start_date=2024-01-01&end_date=2024-12-31"
+        before = self.client.get(url).json()
+        self.client.post(
+            "/api/transactions/",
+            {
+                "category": self.food.pk,
+                "amount": "25.00",
+                "description": "Groceries",
+                "transaction_type": "expense",
+                "date": "2024-06-01",
+            },
+        )
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(
+            Decimal(str(response.json()["total_expense"])),
+            Decimal(str(before["total_expense"])) + 25,
+        )
+
+        self.client.get(url)
+        TransactionImporter(self.user).run(
+            [
+                {
+                    "category": self.food.pk,
+                    "amount": "5",
+                    "description": "Imported",
+                    "transaction_type": "expense",
+                    "date": "2024-06-02",
+                }
+            ]
+        )
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_entries_do_not_outlive_the_day(self):
+        # The range ends today by default
+        url = "/api/transactions/summary/?start_date=2024-01-01"
+        midnight = datetime(2024, 6, 1, tzinfo=dt_timezone.utc)
+        with patch("django.utils.timezone.now", return_value=midnight):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        with patch(
+            "django.utils.timezone.now", return_value=midnight + timedelta(days=1)
+        ):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["end_date"], "2024-06-02")
+
+    def test_rebuilding_rollups_invalidates(self):
+        url = "/api/transactions/summary/?start_date=2024-01-01&end_date=2024-12-31"
+        self.client.get(url)
+        call_command("rebuild_rollups", stdout=io.StringIO())
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+        self.client.get(url)
+        call_command("rebuild_rollups", user=self.user.pk, stdout=io.StringIO())
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_users_do_not_share_entries(self):
+        url = "/api/transactions/summary/?start_date=2024-01-01&end_date=2024-12-31"
+        self.client.get(url)
+        self.client.force_authenticate(self.other)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["total_expense"], 0)
+
+        # Another user's writes leave this user's entries alone
+        Category.objects.create(name="Rent", user=self.other)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+    def test_stats_are_staff_only(self):
+        self.assertEqual(
+            self.client.get("/api/analytics/cache-stats/").status_code, 403
+        )
+        staff = User.objects.create_user(
+            email="staff@example.com",
+            username="staff",
+            password="s3cret-pass",
+            is_staff=True,
+        )
+        self.client.force_authenticate(staff)
+        response = self.client.get("/api/analytics/cache-stats/")
+        self.assertEqual(response.status_code, 200)
+
+
+class ConditionalGetTests(FinTrackTestCase):
+    resources = ("categories", "transactions", "budgets")
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def set_stamps(self, offset):
+        """Date every stamp of the user ``offset`` seconds from now."""
+        stamp = time.time_ns() + int(offset * 1_000_000_000)
+        for resource in self.resources:
+            cache.set(conditional._stamp_key(self.user.pk, resource), stamp)
+
+    def test_not_modified_without_queries(self):
+        self.set_stamps(-2)
+        transaction = Transaction.objects.filter(user=self.user).first()
+        for url in (
+            "/api/transactions/",
+            "/api/transactions/?pagination=cursor&page_size=20",
+            f"/api/transactions/{transaction.pk}/",
+            "/api/categories/",
+            "/api/budgets/?include_status=true",
+            f"/api/budgets/{self.budget.pk}/",
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response["ETag"].startswith('"'))
+                with self.assertNumQueries(0):
+                    again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again["ETag"], response["ETag"])
+                self.assertEqual(again.content, b"")
+
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_representations_have_their_own_etags(self):
+        etags = {
+            self.client.get(url)["ETag"]
+            for url in (
+                "/api/transactions/",
+                "/api/transactions/?page=2",
+                "/api/transactions/?type=income",
+                "/api/budgets/",
+                "/api/budgets/?include_status=true",
+            )
+        }
+        self.assertEqual(len(etags), 5)
+        url = "/api/categories/"
+        etag = self.client.get(url)["ETag"]
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_writes_change_the_etags_of_what_they_affect(self):
+        urls = [
+            "/api/transactions/",
+            "/api/categories/",
+            "/api/budgets/",
+            "/api/budgets/?include_status=true",
+        ]
+
+        def changed(write):
+            before = {url: self.client.get(url) for url in urls}
+            write()
+            return [
+                url
+                for url, response in before.items()
+                if self.revalidate(url, response).status_code == 200
+            ]
+
+        transaction = Transaction.objects.filter(user=self.user).first()
+        self.assertEqual(
+            changed(
+                lambda: self.client.patch(
+                    f"/api/transactions/{transaction.pk}/",
+                    {"description": "Edited"},
+                    format="json",
+                )
+            ),
+            ["/api/transactions/", "/api/budgets/?include_status=true"],
+        )
+        self.assertEqual(
+            changed(lambda: materialize(until=date(2025, 6, 1))),
+            ["/api/transactions/", "/api/budgets/?include_status=true"],
+        )
+        self.assertEqual(
+            changed(
+                lambda: self.client.patch(
+                    f"/api/budgets/{self.budget.pk}/",
+                    {"amount": "450.00"},
+                    format="json",
+                )
+            ),
+            ["/api/budgets/", "/api/budgets/?include_status=true"],
+        )
+        self.assertEqual(
+            changed(
+                lambda: self.client.patch(
+                    f"/api/categories/{self.food.pk}/", {"name": "Groceries"}
+                )
+            ),
+            urls,
+        )
+        # Other users' writes change nothing
+        self.assertEqual(
+            changed(lambda: Category.objects.create(name="Rent", user=self.other)),
+            [],
+        )
+
+    def test_last_modified_only_once_its_second_is_over(self):
+        url = "/api/categories/"
+        # A write in the current second could still be followed by another
+        # one with the same rounded time
+        self.set_stamps(2)
+        response = self.client.get(url)
+        self.assertIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+        self.set_stamps(-2)
+        response = self.client.get(url)
+        self.client.post(url, {"name": "Travel"})
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_object_is_not_reported_unmodified(self):
+        url = f"/api/budgets/{self.budget.pk}/"
+        response = self.client.get(url)
+        self.budget.delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 404)
+
+
+class AsyncAnalyticsTests(FinTrackFixtures, TransactionTestCase):
+    # The async views query from pool threads, which only see committed rows
+
+    def setUp(self):
+        self.create_fixtures()
+        super().setUp()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_same_responses_as_the_sync_views(self):
+        for path in (
+            "transactions/summary/?start_date=2024-01-15&end_date=2024-08-20",
+            "transactions/summary/",
+            "transactions/recurring_summary/",
+            "budgets/status/",
+            f"budgets/{self.budget.pk}/status/",
+        ):
+            sync = self.client.get(f"/api/{path}")
+            cache.clear()
+            response = self.client.get(f"/api/async/{path}")
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(response["X-Cache"], "MISS")
+            self.assertEqual(response.content, sync.content, path)
+            self.assertEqual(self.client.get(f"/api/async/{path}")["X-Cache"], "HIT")
+
+    def test_errors(self):
+        response = self.client.get("/api/async/transactions/summary/?start_date=x")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start_date", response.json())
+
+        other = Budget.objects.create(
+            user=self.other,
+            category=Category.objects.get(user=self.other),
+            amount=Decimal("10.00"),
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 1, 31),
+        )
+        response = self.client.get(f"/api/async/budgets/{other.pk}/status/")
+        self.assertEqual(response.status_code, 404)
+        sync = self.client.get(f"/api/budgets/{other.pk}/status/")
+        self.assertEqual(response.json(), sync.json())
+
+        self.assertEqual(
+            self.client.post("/api/async/transactions/summary/").status_code, 405
+        )
+        self.client.credentials()
+        response = self.client.get("/api/async/transactions/summary/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+
+    @override_settings(DATABASE_REPLICAS=["default"])  # See ReplicaRoutingTests
+    def test_replica_responses_are_not_cached(self):
+        url = "/api/async/transactions/summary/"
+        before = routing.stats()["replica_reads"]
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertGreater(routing.stats()["replica_reads"], before)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+    def test_summary_queries_run_on_the_pool(self):
+        threads = []
+        call = db_threads._call
+
+        def record(func, args, kwargs):
+            threads.append(threading.current_thread().name)
+            return call(func, args, kwargs)
+
+        with patch.object(db_threads, "_call", record):
+            self.client.get(
+                "/api/async/transactions/summary/"
+                "?start_date=2024-01-15&end_date=2024-08-20"
+            )
+        # Authentication, throttling and the cache lookup, the daily and
+        # monthly rollup queries together, then storing the response
+        self.assertEqual(len(threads), 4)
+        self.assertTrue(all(name.startswith("fintrack-db") for name in threads))
+
+    def test_throttle_and_cache_stay_off_the_event_loop(self):
+        threads = {}
+
+        def recording(name, func):
+            def wrapper(*args, **kwargs):
+                threads[name] = threading.current_thread().name
+                return func(*args, **kwargs)
+
+            return wrapper
+
+        with (
+            patch.object(
+                async_views,
+                "_check_throttles",
+                recording("throttle", async_views._check_throttles),
+            ),
+            patch.object(caching, "lookup", recording("lookup", caching.lookup)),
+            patch.object(caching, "store", recording("store", caching.store)),
+        ):
+            response = self.client.get("/api/async/transactions/summary/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(threads), {"throttle", "lookup", "store"})
+        self.assertTrue(
+            all(name.startswith("fintrack-db") for name in threads.values())
+        )
+
+    @override_settings(DEBUG=True)  # Server-Timing for everyone
+    def test_pool_queries_are_instrumented(self):
+        response = self.client.get(
+            "/api/async/transactions/summary/"
+            "?start_date=2024-01-15&end_date=2024-08-20"
+        )
+        self.assertEqual(response["X-Cache"], "MISS")
+        queries = int(_server_timing(response)["db"]["desc"].split()[0][1:])
+        # At least the daily and monthly rollup queries, run on the pool
+        self.assertGreaterEqual(queries, 2)
+
+
+# The test database has no separate replica, so "default" stands in for
+# one; the routing decisions are what is being checked.
+@override_settings(DATABASE_REPLICAS=["default"])
+class ReplicaRoutingTests(FinTrackTestCase):
+    def routed(self, method, url, data=None):
+        before = routing.stats()
+        response = getattr(self.client, method)(url, data)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        after = routing.stats()
+        return response, {key: after[key] - before[key] for key in after}
+
+    def test_safe_analytics_and_list_requests_read_from_replicas(self):
+        for url in (
+            "/api/transactions/",
+            "/api/transactions/summary/",
+            "/api/transactions/recurring_summary/",
+            "/api/transactions/export/",
+            "/api/budgets/status/",
+            "/api/categories/",
+        ):
+            _, counts = self.routed("get", url)
+            self.assertGreater(counts["replica_reads"], 0, url)
+            self.assertEqual(counts["writes"], 0, url)
+
+    def test_other_requests_use_the_primary(self):
+        _, counts = self.routed("get", f"/api/budgets/{self.budget.pk}/")
+        self.assertEqual(counts["replica_reads"], 0)
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            _, counts = self.routed("get", "/api/transactions/summary/")
+        self.assertEqual(counts["replica_reads"], 0)
+
+    def test_replica_responses_have_no_validators(self):
+        # The replica may lag behind the stamps the validators come from
+        response, counts = self.routed("get", "/api/categories/")
+        self.assertGreater(counts["replica_reads"], 0)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            etag = self.client.get("/api/categories/")["ETag"]
+        # A copy from the primary still revalidates
+        response = self.client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_replica_responses_are_not_cached(self):
+        # Stored under the current data version, a lagging snapshot would
+        # outlive the lag for as long as the entry does
+        url = "/api/transactions/summary/"
+        response, counts = self.routed("get", url)
+        self.assertGreater(counts["replica_reads"], 0)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+    def test_writers_are_pinned_to_the_primary(self):
+        response, counts = self.routed("post", "/api/categories/", {"name": "Travel"})
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(counts["writes"], 0)
+        self.assertEqual(counts["replica_reads"], 0)
+
+        response, counts = self.routed("get", "/api/categories/")
+        self.assertIn("Travel", [c["name"] for c in response.json()["results"]])
+        self.assertEqual(counts["replica_reads"], 0)
+        self.assertEqual(counts["pinned_requests"], 1)
+
+        # Other users are unaffected
+        self.client.force_authenticate(self.other)
+        _, counts = self.routed("get", "/api/categories/")
+        self.assertGreater(counts["replica_reads"], 0)
+
+    def test_serve_needs_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, "FINTRACK_CACHE_DIR"):
+            call_command("serve", "--workers=2")
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite snapshots")
+class SnapshotReplicaTests(TransactionTestCase):
+    # Outside a test transaction, which would hold locks the backup waits on
+    def test_snapshots_replace_stale_wal_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/replica.sqlite3"
+            # Left over by a snapshot written in WAL mode
+            for suffix in ("-wal", "-shm"):
+                with open(path + suffix, "wb") as f:
+                    f.write(b"stale")
+            databases = {
+                **settings.DATABASES,
+                "snapshot": {
+                    **settings.DATABASES["default"],
+                    "NAME": f"file:{path}?mode=ro",
+                },
+            }
+            with override_settings(DATABASES=databases, DATABASE_REPLICAS=["snapshot"]):
+                call_command("snapshot_replica", stdout=io.StringIO())
+
+            self.assertFalse(os.path.exists(f"{path}-wal"))
+            self.assertFalse(os.path.exists(f"{path}-shm"))
+            replica = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                mode = replica.execute("PRAGMA journal_mode").fetchone()[0]
+                self.assertEqual(mode, "delete")
+                replica.execute("SELECT COUNT(*) FROM transactions_transaction")
+            finally:
+                replica.close()
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite locking behaviour")
+class SQLiteConcurrencyTests(SimpleTestCase):
+    WORKERS = 8
+    WRITES = 50
+
+    def test_parallel_writers_never_hit_lock_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/concurrency.sqlite3"
+            wrapper = _file_connection(path)
+            with wrapper.cursor() as cursor:
+                self.assertEqual(
+                    cursor.execute("PRAGMA journal_mode").fetchone(), ("wal",)
+                )
+                cursor.execute(
+                    "CREATE TABLE writes (id INTEGER PRIMARY KEY, worker INT, seq INT)"
+                )
+            wrapper.close()
+
+            context = multiprocessing.get_context("fork")
+            errors = context.Queue()
+            workers = [
+                context.Process(
+                    target=_concurrent_writer, args=(path, i, self.WRITES, errors)
+                )
+                for i in range(self.WORKERS)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+            failures = []
+            while not errors.empty():
+                failures.append(errors.get())
+            self.assertEqual(failures, [])
+
+            wrapper = _file_connection(path)
+            with wrapper.cursor() as cursor:
+                cursor.execute(
+                    "SELECT COUNT(*), COUNT(DISTINCT worker || '-' || seq) FROM writes"
+                )
+                self.assertEqual(
+                    cursor.fetchone(),
+                    (self.WORKERS * self.WRITES, self.WORKERS * self.WRITES),
+                )
+            wrapper.close()
+
+
+class FastJSONTests(SimpleTestCase):
+    payload = {
+        "amount": Decimal("12.50"),
+        "day": date(2024, 2, 29),
+        "utc": datetime(2024, 1, 1, 12, 30, 5, 123456, tzinfo=dt_timezone.utc),
+        "offset": datetime(2024, 1, 1, 12, 30, tzinfo=dt_timezone(timedelta(hours=-5))),
+        "naive": datetime(2024, 1, 1, 12, 30),
+        "duration": timedelta(hours=1, seconds=3),
+        "uuid": uuid.UUID(int=1),
+        "lazy": gettext_lazy("Invalid cursor"),
+        "text": "Café \u2028 ok",
+        "int_keys": {1: "one", 2: [None, True, 1.5]},
+        "huge": 2**70,
+    }
+
+    def test_same_output_as_drf(self):
+        expected = JSONRenderer().render(self.payload)
+        self.assertEqual(fastjson.FastJSONRenderer().render(self.payload), expected)
+        with patch.object(fastjson, "orjson", None):
+            self.assertEqual(fastjson.FastJSONRenderer().render(self.payload), expected)
+        self.assertEqual(
+            fastjson.FastJSONRenderer().render(
+                self.payload, "application/json; indent=2"
+            ),
+            JSONRenderer().render(self.payload, "application/json; indent=2"),
+        )
+
+    def test_decimals_as_drf_writes_them(self):
+        renderer = fastjson.FastJSONRenderer()
+        for value in ("9.9E-5", "-2.5E-7", "1E+16", "0.0001", "1234.50", "0"):
+            payload = {"value": Decimal(value), "list": [Decimal(value)]}
+            expected = JSONRenderer().render(payload)
+            with self.subTest(value=value):
+                self.assertEqual(renderer.render(payload), expected)
+                self.assertEqual(fastjson.dumps(payload), expected)
+
+        for value in ("NaN", "-Infinity"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                renderer.render({"value": Decimal(value)})
+
+    @skipUnless(fastjson.orjson, "orjson is not installed")
+    def test_floats_as_orjson_writes_them(self):
+        # Where the output still differs from DRF's
+        renderer = fastjson.FastJSONRenderer()
+        self.assertEqual(renderer.render([9.9e-05, 1e16]), b"[0.000099,1e16]")
+        self.assertEqual(JSONRenderer().render([9.9e-05, 1e16]), b"[9.9e-05,1e+16]")
+        self.assertEqual(renderer.render([math.inf]), b"[null]")
+        with self.assertRaises(ValueError):
+            JSONRenderer().render([math.inf])
+
+    def test_parser(self):
+        parser = fastjson.FastJSONParser()
+        self.assertEqual(
+            parser.parse(io.BytesIO('{"a": [1, "é"]}'.encode())), {"a": [1, "é"]}
+        )
+        for body in (b"{", b"", b"NaN"):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                parser.parse(io.BytesIO(body))
+
+
+class CompressionTests(FinTrackTestCase):
+    url = "/api/transactions/?pagination=cursor&page_size=50"
+
+    def test_large_responses_are_gzipped(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertLess(len(response.content), len(plain.content) / 4)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # The ETag is weakened but still revalidates
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_compressed(self):
+        for url, accept in (
+            ("/api/categories/", "gzip"),  # Below COMPRESSION_MIN_SIZE
+            (self.url, "gzip;q=0, identity"),
+            (self.url, ""),
+        ):
+            with self.subTest(url=url, accept=accept):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING=accept)
+                self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_export(self):
+        url = "/api/transactions/export/?file_format=ndjson"
+        plain = b"".join(self.client.get(url).streaming_content)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+        self.assertEqual(len(plain.splitlines()), 60)
+
+    def test_negotiation(self):
+        cases = [
+            ("gzip, br", "br", "gzip"),
+            ("br;q=0.5, gzip", "gzip", "gzip"),
+            ("br", "br", None),
+            ("*", "br", "gzip"),
+            ("*;q=0, gzip", "gzip", "gzip"),
+            ("identity", None, None),
+            ("gzip;q=0", None, None),
+            ("", None, None),
+        ]
+        for header, with_brotli, without_brotli in cases:
+            with self.subTest(header=header):
+                with patch.object(compression, "brotli", object()):
+                    self.assertEqual(compression.choose_coding(header), with_brotli)
+                with patch.object(compression, "brotli", None):
+                    self.assertEqual(compression.choose_coding(header), without_brotli)
+
+    @skipUnless(compression.brotli is not None, "brotli is not installed")
+    def test_brotli(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(response.content), plain.content)
+
+
+def _server_timing(response):
+    """Server-Timing entries of ``response``: name -> {"dur": ..., "desc": ...}."""
+    entries = {}
+    for entry in response["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        entries[name] = dict(param.split("=", 1) for param in params)
+    return entries
+
+
+def _metric(name, **labels):
+    """The value of the ``/metrics`` sample ``name`` with ``labels``, or 0."""
+    selector = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    for line in instrumentation.exposition().splitlines():
+        if line.startswith(f"{name}{{{selector}}} "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+class InstrumentationTests(FinTrackTestCase):
+    url = "/api/transactions/?pagination=cursor&page_size=50"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user(
+            email="staff@example.com",
+            username="staff",
+            password="s3cret-pass",
+            is_staff=True,
+        )
+
+    @override_settings(DEBUG=True)
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        timing = _server_timing(response)
+        self.assertEqual(timing["db"]["desc"], f'"{len(queries)} queries"')
+        self.assertEqual(set(timing), {"db", "serialize", "render", "app", "total"})
+        total = float(timing["total"]["dur"])
+        for name in ("db", "serialize", "render", "app"):
+            self.assertLessEqual(float(timing[name]["dur"]), total)
+
+        # Serializers as well as row mappers, and analytics responses
+        with patch.object(TransactionViewSet, "use_row_mapper", return_value=False):
+            response = self.client.get(self.url)
+        self.assertIn("serialize", _server_timing(response))
+        response = self.client.get("/api/budgets/status/")
+        self.assertIn("serialize", _server_timing(response))
+
+    def test_timings_leave_out_the_queries_they_ran(self):
+        def slow_query(*args):
+            time.sleep(0.05)
+
+        state = instrumentation.RequestState()
+        token = instrumentation._request_state.set(state)
+        try:
+            with instrumentation.timing("serialize"):
+                # A lazy load, say: already in db
+                instrumentation._execute_wrapper(slow_query, "SELECT 1", (), False, {})
+        finally:
+            instrumentation._request_state.reset(token)
+        self.assertGreaterEqual(state.sql_time, 0.05)
+        self.assertLess(state.timings["serialize"], 0.01)
+
+    def test_server_timing_is_for_staff_who_ask(self):
+        self.assertFalse(self.client.get(self.url).has_header("Server-Timing"))
+        response = self.client.get(self.url, HTTP_X_SERVER_TIMING="1")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        self.client.force_authenticate(self.staff)
+        self.assertFalse(self.client.get(self.url).has_header("Server-Timing"))
+        response = self.client.get(self.url, HTTP_X_SERVER_TIMING="1")
+        self.assertIn("total", _server_timing(response))
+
+    def test_metrics(self):
+        labels = {"route": "transaction-list", "method": "GET"}
+        requests = _metric("fintrack_requests_total", **labels, status=200)
+        count = _metric("fintrack_request_duration_seconds_count", **labels)
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        # Staff can read them from their session
+        self.client.force_login(self.staff)
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn("# TYPE fintrack_request_duration_seconds histogram", text)
+        self.assertIn('fintrack_db_routing_total{decision="writes"}', text)
+        self.assertEqual(
+            _metric("fintrack_requests_total", **labels, status=200), requests + 2
+        )
+        self.assertEqual(
+            _metric("fintrack_request_duration_seconds_count", **labels), count + 2
+        )
+        self.assertEqual(
+            _metric("fintrack_request_duration_seconds_bucket", **labels, le="+Inf"),
+            count + 2,
+        )
+
+    def test_metrics_are_closed_by_default(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN="metrics-token")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get(
+            "/metrics", HTTP_AUTHORIZATION="Bearer metrics-token"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_n_plus_one(self):
+        labels = {"route": "transaction-list", "method": "GET"}
+        before = _metric("fintrack_n_plus_one_total", **labels)
+        with self.assertNoLogs("fintrack.instrumentation"):
+            self.client.get("/api/transactions/")
+
+        # Serializing category_name without select_related queries per row
+        with patch.object(
+            TransactionViewSet, "use_row_mapper", return_value=False
+        ), patch.object(
+            TransactionViewSet,
+            "get_queryset",
+            lambda view: Transaction.objects.filter(user=view.request.user).order_by(
+                "-date"
+            ),
+        ), self.assertLogs(
+            "fintrack.instrumentation", "WARNING"
+        ) as logs:
+            self.client.get("/api/transactions/")
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("10 runs of SELECT", logs.output[0])
+        self.assertIn("transactions_category", logs.output[0])
+        self.assertEqual(_metric("fintrack_n_plus_one_total", **labels), before + 1)
+
+    def test_memory(self):
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        with override_settings(INSTRUMENTATION_TRACE_MEMORY=True, DEBUG=True):
+            response = APIClient()
+            response.force_authenticate(self.user)
+            timing = _server_timing(response.get(self.url))
+        self.assertRegex(timing["mem"]["desc"], r'^"Peak \d+ KiB"$')
+
+    @override_settings(INSTRUMENTATION_ENABLED=False, DEBUG=True)
+    def test_disabled(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertFalse(client.get(self.url).has_header("Server-Timing"))
+
+
+class HealthTests(FinTrackTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(health, "_migrated", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_live(self):
+        response = self.client.get("/health/live/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok"})
+
+    def test_ready(self):
+        response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ready"})
+
+    def test_not_ready_with_unapplied_migrations(self):
+        with patch(
+            "django.db.migrations.executor.MigrationExecutor.migration_plan",
+            return_value=[("migration", False)],
+        ):
+            response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["status"], "unavailable")
+
+    def test_migrations_are_checked_until_applied(self):
+        self.client.get("/health/ready/")
+        with patch(
+            "django.db.migrations.executor.MigrationExecutor.migration_plan"
+        ) as migration_plan, self.assertNumQueries(1):
+            response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 200)
+        migration_plan.assert_not_called()
+
+    def test_database_errors_are_not_disclosed(self):
+        with patch(
+            "django.db.migrations.executor.MigrationExecutor.migration_plan",
+            side_effect=DatabaseError("no such table: secret_table"),
+        ), self.assertLogs("fintrack.health", "ERROR"):
+            response = self.client.get("/health/ready/")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(
+            response.json(),
+            {"status": "unavailable", "error": "Database unavailable."},
+        )
+
+    def test_no_authentication_needed(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer invalid")
+        self.assertEqual(self.client.get("/health/live/").status_code, 200)
+
+
+class ServeTests(SimpleTestCase):
+    def serve(self, *args):
+        """Run ``manage.py serve`` on a free port; yields the base URL."""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "serve",
+                "--host=127.0.0.1",
+                "--port=0",
+                "--workers=2",
+                *args,
+            ],
+            stderr=subprocess.PIPE,
+            text=True,
+            env={**os.environ, "FINTRACK_CACHE_DIR": cache_dir},
+        )
+        try:
+            for line in process.stderr:
+                match = re.search(r"Listening at: (http://127\.0\.0\.1:\d+)", line)
+                if match:
+                    break
+            yield match.group(1)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            process.stderr.close()
+        self.assertEqual(process.returncode, 0)
+
+    def test_one_worker_without_a_shared_cache(self):
+        with patch.object(serve_command, "GunicornServer") as server:
+            call_command("serve")
+        self.assertEqual(server.call_args.kwargs["workers"], 1)
+        with self.assertRaisesMessage(CommandError, "FINTRACK_CACHE_DIR"):
+            call_command("serve", "--workers=2")
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                }
+            }
+        ), patch.object(serve_command, "GunicornServer") as server:
+            call_command("serve")
+        self.assertEqual(server.call_args.kwargs["workers"], os.cpu_count() or 1)
+
+    def test_workers_are_recycled(self):
+        for url in self.serve("--max-requests=1", "--max-requests-jitter=0"):
+            # Each worker exits after one request, so these need respawns. A
+            # connection accepted by a worker on its way out is reset, as
+            # clients of any recycling server see now and then: retry those
+            for _ in range(5):
+                for attempt in range(3):
+                    try:
+                        with urlopen(f"{url}/health/live/", timeout=10) as r:
+                            self.assertEqual(r.status, 200)
+                        break
+                    except ConnectionError:
+                        if attempt == 2:
+                            raise
+
+    @skipUnless(importlib.util.find_spec("uvicorn_worker"), "uvicorn-worker missing")
+    def test_asgi_workers(self):
+        for url in self.serve("--asgi"):
+            with urlopen(f"{url}/health/live/", timeout=10) as r:
+                self.assertEqual(r.status, 200)
@@ -0,0 +1,238 @@
+"""
+Time-series analytics for ``transactions/trends/``.
+
+A user's daily rollup rows in the requested range are read once and
+bucketed into monthly and weekly income/expense series and per-category
+totals, from which rolling averages, year-over-year changes and category
+shares are derived. All arithmetic is on integer cents, so results are
+exact; amounts, averages and shares are returned as two-place Decimals.
+
+With NumPy installed the rows are turned into columnar arrays and every
+step is vectorised (``bincount`` for buckets, cumulative sums for rolling
+windows, shifted differences for year-over-year). Without it the same
+results are computed in pure Python.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Case, CharField, FloatField, IntegerField, When
+from django.db.models.functions import Cast
+
+from .models import Category, DailyRollup
+
+try:
+    import numpy as np
+except ImportError:  # Optional: the pure Python path gives identical results
+    np = None
+
+EPOCH = date(1970, 1, 1)
+EPOCH_MONTH = EPOCH.year * 12  # month_index(EPOCH)
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def week_index(day):
+    # date.fromordinal(1) is a Monday, so weeks run Monday to Sunday
+    return (day.toordinal() - 1) // 7
+
+
+def rows(user, start_date=None, end_date=None):
+    """
+    (ISO date, category_id, is_expense, total) per rollup row, by date. The
+    columns are cast in SQL so that no per-row date or Decimal objects are
+    built.
+    """
+    queryset = DailyRollup.objects.filter(user=user)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return list(
+        queryset.order_by("date").values_list(
+            Cast("date", CharField()),
+            "category_id",
+            Case(
+                When(transaction_type="expense", then=1),
+                default=0,
+                output_field=IntegerField(),
+            ),
+            Cast("total", FloatField()),
+        )
+    )
+
+
+COLUMNS = [
+    ("day", "datetime64[D]"),
+    ("category", "int64"),
+    ("is_expense", "bool"),
+    ("total", "float64"),
+]
+
+
+def _buckets_numpy(rows, first_month, months, first_week, weeks):
+    # All four columns in one conversion, parsing the ISO dates in C
+    table = np.array(rows, dtype=COLUMNS)
+    days, is_expense = table["day"], table["is_expense"]
+    cents = np.rint(table["total"] * 100)
+
+    month = days.astype("datetime64[M]").astype(np.int64) + EPOCH_MONTH - first_month
+    week = (days.astype(np.int64) + EPOCH.toordinal() - 1) // 7 - first_week
+    income = np.where(is_expense, 0, cents)
+    expense = np.where(is_expense, cents, 0)
+    category_ids, category = np.unique(table["category"], return_inverse=True)
+
+    def bucket(index, weights, size):
+        sums = np.bincount(index, weights=weights, minlength=size)
+        return np.rint(sums).astype(np.int64)
+
+    return {
+        "monthly": (bucket(month, income, months), bucket(month, expense, months)),
+        "weekly": (bucket(week, income, weeks), bucket(week, expense, weeks)),
+        "categories": dict(
+            zip(
+                category_ids.tolist(),
+                zip(
+                    bucket(category, income, len(category_ids)).tolist(),
+                    bucket(category, expense, len(category_ids)).tolist(),
+                ),
+            )
+        ),
+    }
+
+
+def _buckets_python(rows, first_month, months, first_week, weeks):
+    monthly = ([0] * months, [0] * months)
+    weekly = ([0] * weeks, [0] * weeks)
+    categories = {}
+    for day, category_id, is_expense, total in rows:
+        day = date.fromisoformat(day)
+        cents = round(total * 100)
+        column = 1 if is_expense else 0
+        monthly[column][month_index(day) - first_month] += cents
+        weekly[column][week_index(day) - first_week] += cents
+        category = categories.setdefault(category_id, [0, 0])
+        category[column] += cents
+    return {
+        "monthly": monthly,
+        "weekly": weekly,
+        "categories": {pk: tuple(sums) for pk, sums in categories.items()},
+    }
+
+
+def _rolling_sums(series, window):
+    """Sum of each ``window`` consecutive values, ending at each position."""
+    if np is not None and isinstance(series, np.ndarray):
+        cumulative = np.concatenate(([0], np.cumsum(series)))
+        sums = (cumulative[window:] - cumulative[:-window]).tolist()
+    else:
+        sums = [
+            sum(series[i - window + 1 : i + 1]) for i in range(window - 1, len(series))
+        ]
+    return [None] * min(window - 1, len(series)) + sums
+
+
+def _year_over_year(series):
+    """Change from the same month a year earlier."""
+    if np is not None and isinstance(series, np.ndarray):
+        changes = (series[12:] - series[:-12]).tolist()
+    else:
+        changes = [series[i] - series[i - 12] for i in range(12, len(series))]
+    return [None] * min(12, len(series)) + changes
+
+
+CENT = Decimal("0.01")
+
+
+def _amount(cents):
+    return None if cents is None else Decimal(cents).scaleb(-2)
+
+
+def _average(total, window):
+    return None if total is None else (Decimal(total) / (100 * window)).quantize(CENT)
+
+
+def _share(part, whole):
+    """``part`` as a percentage of ``whole``, to two places."""
+    if not whole:
+        return Decimal("0.00")
+    return (Decimal(100 * part) / whole).quantize(CENT)
+
+
+def trends(rows, start_date, end_date, window=3):
+    """
+    Trend analytics for rollup ``rows`` between ``start_date`` and
+    ``end_date`` (the first row's date if None).
+    """
+    if start_date is None:
+        start_date = date.fromisoformat(rows[0][0]) if rows else end_date
+    first_month = month_index(start_date)
+    months = max(month_index(end_date) - first_month + 1, 0)
+    first_week = week_index(start_date)
+    weeks = max(week_index(end_date) - first_week + 1, 0)
+
+    bucket = _buckets_numpy if rows and np is not None else _buckets_python
+    buckets = bucket(rows, first_month, months, first_week, weeks)
+
+    income, expense = buckets["monthly"]
+    income_avg = _rolling_sums(income, window)
+    expense_avg = _rolling_sums(expense, window)
+    income_yoy = _year_over_year(income)
+    expense_yoy = _year_over_year(expense)
+    income, expense = list(map(int, income)), list(map(int, expense))
+    monthly = []
+    for i in range(months):
+        year, month = divmod(first_month + i, 12)
+        monthly.append(
+            {
+                "month": f"{year:04d}-{month + 1:02d}",
+                "income": _amount(income[i]),
+                "expense": _amount(expense[i]),
+                "net": _amount(income[i] - expense[i]),
+                "income_avg": _average(income_avg[i], window),
+                "expense_avg": _average(expense_avg[i], window),
+                "income_yoy": _amount(income_yoy[i]),
+                "expense_yoy": _amount(expense_yoy[i]),
+            }
+        )
+
+    weekly_income, weekly_expense = (list(map(int, s)) for s in buckets["weekly"])
+    weekly = [
+        {
+            "week": date.fromordinal((first_week + i) * 7 + 1),
+            "income": _amount(weekly_income[i]),
+            "expense": _amount(weekly_expense[i]),
+            "net": _amount(weekly_income[i] - weekly_expense[i]),
+        }
+        for i in range(weeks)
+    ]
+
+    totals = buckets["categories"]
+    total_income = sum(income for income, _ in totals.values())
+    total_expense = sum(expense for _, expense in totals.values())
+    names = dict(Category.objects.filter(pk__in=totals).values_list("id", "name"))
+    categories = sorted(
+        (
+            {
+                "category_id": pk,
+                "category": names.get(pk),
+                "income": _amount(income),
+                "expense": _amount(expense),
+                "income_share": _share(income, total_income),
+                "expense_share": _share(expense, total_expense),
+            }
+            for pk, (income, expense) in totals.items()
+        ),
+        key=lambda c: (-c["expense"], -c["income"], c["category_id"]),
+    )
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "window": window,
+        "monthly": monthly,
+        "weekly": weekly,
+        "categories": categories,
+    }
@@ -1,12 +1,38 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, TransactionViewSet, BudgetViewSet
+from . import async_views
+from .views import (
+    CategoryViewSet,
+    TransactionViewSet,
+    BudgetViewSet,
+    AnalyticsCacheStatsView,
+    DatabaseRoutingStatsView,
+)
 
 router = DefaultRouter()
 router.register(r"categories", CategoryViewSet, basename="category")
 router.register(r"transactions", TransactionViewSet, basename="transaction")
 router.register(r"budgets", BudgetViewSet, basename="budget")
 
+# Async versions of the analytics endpoints, for ASGI deployments
+async_urlpatterns = [
+    path("transactions/summary/", async_views.summary),
+    path("transactions/recurring_summary/", async_views.recurring_summary),
+    path("budgets/status/", async_views.budget_status_list),
+    path("budgets/<int:pk>/status/", async_views.budget_status_detail),
+]
+
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/", include(async_urlpatterns)),
+    path(
+        "analytics/cache-stats/",
+        AnalyticsCacheStatsView.as_view(),
+        name="analytics-cache-stats",
+    ),
+    path(
+        "db/routing-stats/",
+        DatabaseRoutingStatsView.as_view(),
+        name="db-routing-stats",
+    ),
 ]
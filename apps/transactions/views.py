@@ -1,30 +1,155 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, views
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from django.db.models import Sum
-from datetime import datetime, timedelta
+from rest_framework.exceptions import ValidationError
+from datetime import date, datetime, timedelta
+from decimal import Decimal
 import calendar
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from fintrack import instrumentation, routing
+from fintrack.routing import ReplicaReadMixin
 from .models import Category, Transaction, Budget
-from .serializers import CategorySerializer, TransactionSerializer, BudgetSerializer
+from .exporters import stream_csv, stream_ndjson
+from .importers import TransactionImporter, read_csv, read_ndjson
+from .conditional import ConditionalGetMixin
+from .mappers import RowMapperListMixin
+from .pagination import TransactionPagination
+from . import budget_periods, caching, forecast, recurring, rollups, search, trends
+from .serializers import (
+    CategorySerializer,
+    TransactionSerializer,
+    BudgetBulkSerializer,
+    BudgetSerializer,
+    BudgetWithStatusSerializer,
+    budget_status,
+)
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+def parse_date_param(value, name):
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Date has wrong format. Use YYYY-MM-DD."})
+    return parsed
+
+
+def summary_range(query_params):
+    """The summary's date range: this month to date unless given."""
+    start_date = query_params.get("start_date", timezone.now().replace(day=1).date())
+    end_date = query_params.get("end_date", timezone.now().date())
+    return (
+        parse_date_param(start_date, "start_date"),
+        parse_date_param(end_date, "end_date"),
+    )
+
+
+def summary_data(start_date, end_date, totals):
+    """
+    Build the summary response from rollup ``totals`` grouped by
+    (transaction_type, category__name).
+    """
+    income = {"total": None}
+    expense = {"total": None}
+    expenses_by_category = []
+    for (transaction_type, category_name), bucket in sorted(totals.items()):
+        if not bucket["count"]:
+            continue
+        total = income if transaction_type == "income" else expense
+        total["total"] = (total["total"] or 0) + bucket["total"]
+        if transaction_type == "expense":
+            expenses_by_category.append(
+                {"category__name": category_name, "total": bucket["total"]}
+            )
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_income": income["total"] or 0,
+        "total_expense": expense["total"] or 0,
+        "balance": (income["total"] or 0) - (expense["total"] or 0),
+        "expenses_by_category": expenses_by_category,
+    }
+
+
+def recurring_summary_data(totals):
+    """Build the recurring summary response from ``rollups.recurring_totals``."""
+    recurring_count = {}
+    income_total = expense_total = monthly_impact = Decimal("0")
+    for rec_type in recurring.RECURRING_TYPES:
+        bucket = totals.get(rec_type)
+        recurring_count[rec_type] = bucket["count"] if bucket else 0
+        if bucket is None:
+            continue
+        income_total += bucket["income"]
+        expense_total += bucket["expense"]
+        # Net monthly outflow: expenses minus income, each normalised
+        # from its own recurrence to an average month
+        monthly_impact += recurring.monthly_amount(
+            bucket["expense"] - bucket["income"], rec_type
+        )
+
+    return {
+        "total_recurring": sum(recurring_count.values()),
+        "recurring_by_type": recurring_count,
+        "income_total": income_total,
+        "expense_total": expense_total,
+        "monthly_impact": monthly_impact,
+    }
+
+
+class CategoryViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ("list",)
+    etag_resources = ("categories",)
 
     def get_queryset(self):
         # Only user's own categories
         return Category.objects.filter(user=self.request.user)
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(
+    ReplicaReadMixin, ConditionalGetMixin, RowMapperListMixin, viewsets.ModelViewSet
+):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionPagination
+    replica_actions = (
+        "list",
+        "summary",
+        "recurring_summary",
+        "trends",
+        "forecast",
+        "export",
+    )
+    forecast_max_months = 120
+    # Each month and week of the span is a bucket built on every request
+    trends_max_months = 120
+    # Rows include their category's name
+    etag_resources = ("transactions", "categories")
+
+    # Allowed sort_by values. Each is backed by a (user, key) index and
+    # tie-broken on id, which keyset pagination needs for a unique position.
+    SORT_KEYS = {
+        "date": ("date", "id"),
+        "-date": ("-date", "-id"),
+        "amount": ("amount", "id"),
+        "-amount": ("-amount", "-id"),
+    }
 
     def get_queryset(self):
         # Only user's own transactions
-        queryset = Transaction.objects.filter(user=self.request.user)
+        queryset = Transaction.objects.filter(user=self.request.user).select_related(
+            "category"
+        )
 
         # Filter options
         category = self.request.query_params.get("category", None)
@@ -44,128 +169,273 @@ class TransactionViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(date__lte=end_date)
         if recurring_type:
             queryset = queryset.filter(recurring_type=recurring_type)
+        if is_auto_generated:
+            queryset = queryset.filter(
+                is_auto_generated=is_auto_generated.lower() in ("1", "true", "yes")
+            )
+
+        # Full-text search on the description
+        text = self.request.query_params.get("search", "")
+        if text:
+            queryset = search.matching(queryset, text, self.request.user.pk)
 
         # Sorting
         sort_by = self.request.query_params.get("sort_by", "-date")
-        return queryset.order_by(sort_by)
+        if sort_by == "relevance":
+            if not text:
+                raise ValidationError({"sort_by": "Sorting by relevance needs search."})
+            if self.paginator is not None and self.paginator.is_cursor_request(
+                self.request
+            ):
+                raise ValidationError(
+                    {"sort_by": "Relevance cannot be used with cursor pagination."}
+                )
+            ranked = search.ranked(queryset, text, self.request.user.pk)
+            if ranked is None:
+                raise ValidationError(
+                    {"sort_by": "Too many matches to sort by relevance."}
+                )
+            return ranked.order_by("search_rank", "-id")
+        if sort_by not in self.SORT_KEYS:
+            raise ValidationError(
+                {
+                    "sort_by": "Choose one of: "
+                    f"{', '.join([*self.SORT_KEYS, 'relevance'])}."
+                }
+            )
+        return queryset.order_by(*self.SORT_KEYS[sort_by])
 
     @action(detail=False, methods=["get"])
+    @caching.cached_response("summary")
     def summary(self, request):
         """Transaction summary for a specific date range"""
-        start_date = request.query_params.get(
-            "start_date", timezone.now().replace(day=1).date()
+        start_date, end_date = summary_range(request.query_params)
+        totals = rollups.totals(
+            request.user,
+            start_date,
+            end_date,
+            group_by=["transaction_type", "category__name"],
         )
-        end_date = request.query_params.get("end_date", timezone.now().date())
-
-        # Calculate income and expense totals
-        income = Transaction.objects.filter(
-            user=request.user,
-            transaction_type="income",
-            date__range=[start_date, end_date],
-        ).aggregate(total=Sum("amount"))
-
-        expense = Transaction.objects.filter(
-            user=request.user,
-            transaction_type="expense",
-            date__range=[start_date, end_date],
-        ).aggregate(total=Sum("amount"))
-
-        # Expense report by category
-        expenses_by_category = (
-            Transaction.objects.filter(
-                user=request.user,
-                transaction_type="expense",
-                date__range=[start_date, end_date],
-            )
-            .values("category__name")
-            .annotate(total=Sum("amount"))
+        with instrumentation.timing("serialize"):
+            data = summary_data(start_date, end_date, totals)
+        return Response(data)
+
+    @action(detail=False, methods=["get"])
+    @caching.cached_response("recurring_summary")
+    def recurring_summary(self, request):
+        """Summary of recurring transactions"""
+        totals = rollups.recurring_totals(request.user)
+        with instrumentation.timing("serialize"):
+            data = recurring_summary_data(totals)
+        return Response(data)
+
+    @action(detail=False, methods=["get"])
+    @caching.cached_response("trends")
+    def trends(self, request):
+        """Monthly and weekly series, rolling averages, year-over-year changes
+        and category shares"""
+        params = request.query_params
+        start_date = params.get("start_date")
+        if start_date is not None:
+            start_date = parse_date_param(start_date, "start_date")
+        end_date = parse_date_param(
+            params.get("end_date", timezone.now().date()), "end_date"
         )
+        window = params.get("window", "3")
+        if not window.isdigit() or not 1 <= int(window) <= 24:
+            raise ValidationError({"window": "Must be a number of months, 1 to 24."})
+
+        first_month = trends.month_index(end_date) - self.trends_max_months + 1
+        if start_date is None:
+            # From the first transaction, but no further back than the cap
+            year, month = divmod(max(first_month, 12), 12)
+            rows = trends.rows(request.user, date(year, month + 1, 1), end_date)
+        elif trends.month_index(start_date) < first_month:
+            raise ValidationError(
+                {"start_date": f"Trends cover at most {self.trends_max_months} months."}
+            )
+        else:
+            rows = trends.rows(request.user, start_date, end_date)
+        return Response(trends.trends(rows, start_date, end_date, int(window)))
+
+    @action(detail=False, methods=["get"])
+    @caching.cached_response("forecast")
+    def forecast(self, request):
+        """Projected balance from the recurring transactions"""
+        params = request.query_params
+        months = params.get("months", "12")
+        if not months.isdigit() or not 1 <= int(months) <= self.forecast_max_months:
+            raise ValidationError(
+                {"months": f"Must be 1 to {self.forecast_max_months}."}
+            )
+        granularity = params.get("granularity", "monthly")
+        if granularity not in ("daily", "monthly"):
+            raise ValidationError({"granularity": "Must be 'daily' or 'monthly'."})
+        return Response(forecast.forecast(request.user, int(months), granularity))
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_transactions(self, request):
+        """Import transactions from an uploaded CSV or NDJSON file"""
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "Upload a CSV or NDJSON file."})
+
+        file_format = request.data.get("file_format", "")
+        if not file_format:
+            is_ndjson = upload.name.endswith((".ndjson", ".jsonl")) or (
+                upload.content_type in ("application/x-ndjson", "application/jsonl")
+            )
+            file_format = "ndjson" if is_ndjson else "csv"
+        readers = {"csv": read_csv, "ndjson": read_ndjson}
+        if file_format not in readers:
+            raise ValidationError({"file_format": "Must be 'csv' or 'ndjson'."})
+
+        result = TransactionImporter(request.user).run(readers[file_format](upload))
         return Response(
-            {
-                "start_date": start_date,
-                "end_date": end_date,
-                "total_income": income["total"] or 0,
-                "total_expense": expense["total"] or 0,
-                "balance": (income["total"] or 0) - (expense["total"] or 0),
-                "expenses_by_category": expenses_by_category,
-            }
+            result,
+            status=(
+                status.HTTP_201_CREATED
+                if result["created"]
+                else status.HTTP_400_BAD_REQUEST
+            ),
         )
 
     @action(detail=False, methods=["get"])
-    def recurring_summary(self, request):
-        """Summary of recurring transactions"""
-        recurring_transactions = Transaction.objects.filter(
-            user=request.user,
-            is_recurring=True,
-            recurring_type__in=["weekly", "monthly", "yearly"],
-        ).order_by("recurring_type", "date")
-
-        # Count of transactions by recurring type
-        recurring_count = {}
-        for rec_type in ["weekly", "monthly", "yearly"]:
-            count = recurring_transactions.filter(recurring_type=rec_type).count()
-            recurring_count[rec_type] = count
-
-        # Total amount by type (income/expense)
-        income_total = recurring_transactions.filter(
-            transaction_type="income"
-        ).aggregate(total=Sum("amount"))
-
-        expense_total = recurring_transactions.filter(
-            transaction_type="expense"
-        ).aggregate(total=Sum("amount"))
+    def export(self, request):
+        """Stream the filtered transactions as CSV or NDJSON"""
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format == "csv":
+            stream, content_type = stream_csv, "text/csv"
+        elif file_format == "ndjson":
+            stream, content_type = stream_ndjson, "application/x-ndjson"
+        else:
+            raise ValidationError({"file_format": "Must be 'csv' or 'ndjson'."})
 
-        return Response(
-            {
-                "total_recurring": recurring_transactions.count(),
-                "recurring_by_type": recurring_count,
-                "income_total": income_total["total"] or 0,
-                "expense_total": expense_total["total"] or 0,
-                "monthly_impact": expense_total["total"]
-                or 0 - (income_total["total"] or 0),
-            }
+        # Rows are read after the view returns; fix the database now, while
+        # this request's routing decision still applies
+        queryset = self.get_queryset()
+        response = StreamingHttpResponse(
+            stream(queryset.using(queryset.db)), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="transactions.{file_format}"'
         )
+        return response
 
     def perform_create(self, serializer):
         transaction = serializer.save(user=self.request.user)
 
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class BudgetViewSet(
+    ReplicaReadMixin, ConditionalGetMixin, RowMapperListMixin, viewsets.ModelViewSet
+):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ("list", "status", "status_list", "covering")
+    bulk_max_budgets = 1000
+    etag_resources = ("budgets", "categories")
 
     def get_queryset(self):
         # Only user's own budgets
-        return Budget.objects.filter(user=self.request.user)
+        queryset = Budget.objects.filter(user=self.request.user).select_related(
+            "category"
+        )
+
+        if self.action in ("status", "status_list") or self.include_status():
+            # Spending for every budget in the same query
+            queryset = rollups.annotate_budget_spending(queryset)
+        return queryset
+
+    def include_status(self):
+        return self.action == "list" and self.request.query_params.get(
+            "include_status", ""
+        ).lower() in ("1", "true", "yes")
+
+    def use_row_mapper(self):
+        return not self.include_status()
+
+    def get_etag_resources(self):
+        if self.include_status():
+            # Spending comes from the transactions
+            return (*self.etag_resources, "transactions")
+        return self.etag_resources
+
+    def get_serializer_class(self):
+        if self.include_status():
+            return BudgetWithStatusSerializer
+        return super().get_serializer_class()
 
     @action(detail=True, methods=["get"])
+    @caching.cached_response("budget_status")
     def status(self, request, pk=None):
         """Check budget status"""
         budget = self.get_object()
+        with instrumentation.timing("serialize"):
+            data = budget_status(budget)
+        return Response(data)
 
-        # Calculate expenses in budget category
-        expenses = Transaction.objects.filter(
-            user=request.user,
-            category=budget.category,
-            transaction_type="expense",
-            date__range=[budget.start_date, budget.end_date],
-        ).aggregate(total=Sum("amount"))
-
-        total_spent = expenses["total"] or 0
-        remaining = budget.amount - total_spent
-        percentage_used = (
-            (total_spent / budget.amount) * 100 if budget.amount > 0 else 0
-        )
+    @action(detail=False, methods=["get"], url_path="status", url_name="status-list")
+    @caching.cached_response("budget_status_list")
+    def status_list(self, request):
+        """Status of all of the user's budgets"""
+        budgets = self.get_queryset().order_by("id")
+        with instrumentation.timing("serialize"):
+            data = [budget_status(budget) for budget in budgets]
+        return Response(data)
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Create a list of budgets, all or none"""
+        serializer = BudgetBulkSerializer(
+            data=request.data,
+            many=True,
+            max_length=self.bulk_max_budgets,
+            context=self.get_serializer_context(),
+        )
+        # BEGIN IMMEDIATE: no other write can add an overlapping budget
+        # between the check and the insert
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            budgets = serializer.save()
         return Response(
-            {
-                "budget_id": budget.id,
-                "category": budget.category.name,
-                "budget_amount": budget.amount,
-                "total_spent": total_spent,
-                "remaining": remaining,
-                "percentage_used": percentage_used,
-                "status": "warning" if percentage_used > 80 else "ok",
-            }
+            BudgetSerializer(budgets, many=True).data, status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=False, methods=["get"])
+    def covering(self, request):
+        """Status of the budgets whose period includes a date (default today)"""
+        day = parse_date_param(
+            request.query_params.get("date", timezone.now().date()), "date"
+        )
+        category = request.query_params.get("category")
+        if category is not None and not category.isdigit():
+            raise ValidationError({"category": "A valid integer is required."})
+        budgets = rollups.annotate_budget_spending(
+            budget_periods.covering_budgets(request.user, day, category)
+            .select_related("category")
+            .order_by("category_id")
         )
+        with instrumentation.timing("serialize"):
+            data = [budget_status(budget) for budget in budgets]
+        return Response(data)
+
+
+class AnalyticsCacheStatsView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Analytics response cache hit/miss counters for this process"""
+        return Response(caching.stats())
+
+
+class DatabaseRoutingStatsView(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Primary/replica read and write counts for this process"""
+        return Response(routing.stats())
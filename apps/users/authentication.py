@@ -0,0 +1,108 @@
+"""
+JWT authentication without a users-table query per request.
+
+Tokens issued by this app carry the user's id, email, username and
+is_active (see tokens.USER_CLAIMS). While an access token is younger than
+``STATELESS_USER_WINDOW`` the request user is built from those claims alone.
+Older tokens are checked against a small per-process cache of real users
+that is refreshed every ``STATELESS_USER_WINDOW``, so a deactivated user is
+locked out within that window without each request hitting the database.
+Refreshing a token copies the claims from the stored user again, so they
+are never older than the refresh itself.
+
+The claims user is a read-only ``ClaimsUser`` with only those fields set:
+it works for filtering and foreign keys, and reads ``is_staff`` from the
+user cache when a permission check asks for it. Load the user from the
+database before changing it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser
+from .tokens import USER_CLAIMS
+
+
+def _window():
+    return getattr(settings, "STATELESS_USER_WINDOW", timedelta(minutes=5))
+
+
+class UserCache:
+    """
+    Bounded LRU cache of users that expire ``ttl`` seconds after loading
+    (by default ``STATELESS_USER_WINDOW``).
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._users.move_to_end(user_id)
+                return entry[1]
+
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is not None:
+            with self._lock:
+                ttl = self.ttl or _window().total_seconds()
+                self._users[user_id] = (now + ttl, user)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.maxsize:
+                    self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+
+
+user_cache = UserCache(maxsize=getattr(settings, "STATELESS_USER_CACHE_SIZE", 10000))
+
+
+def claims_user(validated_token):
+    """A ``User`` built from the token's claims, without a query."""
+    user = ClaimsUser(
+        **{api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]},
+        **{claim: validated_token[claim] for claim in USER_CLAIMS},
+    )
+    # Resolved from the stored user on first use, not the field default
+    del user._is_staff
+    user._state.adding = False
+    user._state.db = ClaimsUser.objects.db
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            # Issued before the claims were added
+            return super().get_user(validated_token)
+
+        issued_at = datetime.fromtimestamp(validated_token["iat"], tz=timezone.utc)
+        if datetime.now(timezone.utc) - issued_at < _window():
+            user = claims_user(validated_token)
+        else:
+            user = user_cache.get(validated_token[api_settings.USER_ID_CLAIM])
+            if user is None:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
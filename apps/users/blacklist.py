@@ -0,0 +1,134 @@
+"""
+In-memory Bloom filter of blacklisted refresh token JTIs.
+
+Checking a refresh token against the blacklist normally costs a query. The
+filter answers "definitely not blacklisted" for almost every valid token
+without one; only JTIs it may contain (blacklisted ones plus roughly
+``error_rate`` of the rest) are confirmed against the database.
+
+The filter is loaded on first use, updated in-process whenever a token is
+blacklisted, and picks up rows written by other processes by reading recent
+blacklist rows at most once every ``TOKEN_BLACKLIST_SYNC_INTERVAL``. That
+interval is how long a token blacklisted by another worker may still be
+accepted here.
+
+Rows are read by ``blacklisted_at`` rather than by id: ids are allocated
+when a row is inserted but become visible when its transaction commits, so
+a row with a lower id than one already read can still appear. Each sync
+reads back to ``TOKEN_BLACKLIST_SYNC_OVERLAP`` before the previous one
+started, which covers transactions that commit that much later than they
+stamped the row, and clock differences between hosts.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class BlacklistFilter:
+    min_capacity = 1024
+
+    def __init__(self, error_rate=0.001):
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._bloom = None
+            # Rows blacklisted at or after this are read by the next sync
+            self._since = None
+            self._synced_at = 0.0
+
+    @property
+    def sync_interval(self):
+        interval = getattr(
+            settings, "TOKEN_BLACKLIST_SYNC_INTERVAL", timedelta(seconds=1)
+        )
+        return interval.total_seconds()
+
+    @property
+    def sync_overlap(self):
+        return getattr(settings, "TOKEN_BLACKLIST_SYNC_OVERLAP", timedelta(minutes=1))
+
+    def might_contain(self, jti):
+        """False only if ``jti`` is certainly not blacklisted."""
+        self.sync()
+        return jti in self._bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._add(jti)
+
+    def sync(self):
+        now = time.monotonic()
+        if self._bloom is not None and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if self._bloom is None:
+                self._load()
+            else:
+                since = timezone.now() - self.sync_overlap
+                for jti in BlacklistedToken.objects.filter(
+                    blacklisted_at__gte=self._since
+                ).values_list("token__jti", flat=True):
+                    self._add(jti)
+                self._since = since
+            self._synced_at = now
+
+    def _add(self, jti):
+        # Rows in the overlap are read again; count each token once
+        if jti in self._bloom:
+            return
+        if self._bloom.count >= self._bloom.capacity:
+            # Grown past its sizing; rebuild larger from the database
+            self._load()
+        self._bloom.add(jti)
+
+    def _load(self):
+        since = timezone.now() - self.sync_overlap
+        jtis = list(BlacklistedToken.objects.values_list("token__jti", flat=True))
+        self._bloom = BloomFilter(
+            max(self.min_capacity, 2 * len(jtis)), self.error_rate
+        )
+        for jti in jtis:
+            self._bloom.add(jti)
+        self._since = since
+
+
+blacklist_filter = BlacklistFilter()
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted refresh tokens in small "
+        "batches, each in its own short transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Tokens deleted per transaction (default 1000)",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Seconds to sleep between batches so writers can get in",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lt=now).order_by("id")
+        deleted = blacklisted = 0
+        while True:
+            ids = list(expired.values_list("id", flat=True)[: options["chunk_size"]])
+            if not ids:
+                break
+            # Each batch commits on its own, so the SQLite write lock is
+            # only held for one batch at a time
+            _, counts = OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += counts.get(OutstandingToken._meta.label, 0)
+            blacklisted += counts.get(BlacklistedToken._meta.label, 0)
+            time.sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} expired tokens ({blacklisted} blacklisted)."
+            )
+        )
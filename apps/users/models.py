@@ -10,3 +10,34 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+
+class ClaimsUser(User):
+    """
+    A request user built from access token claims (see
+    authentication.claims_user). Only the claimed fields are set, so it
+    cannot be saved or deleted; ``is_staff`` is not a claim and is read from
+    the stored user, through the per-process user cache.
+    """
+
+    class Meta:
+        proxy = True
+
+    @property
+    def is_staff(self):
+        if "_is_staff" not in self.__dict__:
+            from .authentication import user_cache
+
+            stored = user_cache.get(self.pk)
+            self._is_staff = stored is not None and stored.is_staff
+        return self._is_staff
+
+    @is_staff.setter
+    def is_staff(self, value):
+        self._is_staff = value
+
+    def save(self, *args, **kwargs):
+        raise TypeError("Users built from token claims are read-only.")
+
+    def delete(self, *args, **kwargs):
+        raise TypeError("Users built from token claims are read-only.")
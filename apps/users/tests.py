@@ -1,3 +1,315 @@
-from django.test import TestCase
+import io
+import multiprocessing
+import os
+import tempfile
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from . import throttling
+from .authentication import claims_user, user_cache
+from .blacklist import BloomFilter, blacklist_filter
+from .throttling import SlidingWindowStore
+from .models import User
+from .tokens import RefreshToken
+
+
+class StatelessAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="owner@example.com", username="owner", password="s3cret-pass"
+        )
+
+    def setUp(self):
+        throttling.store.clear()
+        user_cache.invalidate()
+        self.client = APIClient()
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        table = User._meta.db_table
+        return response, [q for q in ctx.captured_queries if table in q["sql"]]
+
+    def test_login_tokens_carry_user_claims(self):
+        response = self.client.post(
+            "/api/users/login/",
+            {"email": "owner@example.com", "password": "s3cret-pass"},
+        )
+        self.authenticate(response.json()["access"])
+
+        response, queries = self.user_queries("/api/categories/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_register_tokens_carry_user_claims(self):
+        response = self.client.post(
+            "/api/users/register/",
+            {
+                "email": "new@example.com",
+                "username": "newcomer",
+                "password": "An0ther-pass",
+                "password2": "An0ther-pass",
+            },
+        )
+        self.authenticate(response.json()["tokens"]["access"])
+
+        response, queries = self.user_queries("/api/categories/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_old_tokens_use_the_user_cache(self):
+        token = RefreshToken.for_user(self.user).access_token
+        token.set_iat(at_time=token.current_time - timedelta(minutes=10))
+        self.authenticate(token)
+        _, first = self.user_queries("/api/categories/")
+        _, second = self.user_queries("/api/categories/")
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user_cache.invalidate(self.user.pk)  # As if the window had passed
+        response = self.client.get("/api/categories/")
+        self.assertEqual(response.status_code, 401)
+
+    def test_tokens_without_claims_still_work(self):
+        token = RefreshToken.for_user(self.user).access_token
+        del token["email"]
+        self.authenticate(token)
+        response, queries = self.user_queries("/api/categories/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+    def test_staff_status_is_read_from_the_stored_user(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertNotIn("is_staff", token)
+        self.authenticate(token)
+        self.assertEqual(self.client.get("/api/db/routing-stats/").status_code, 200)
+        # Regular endpoints never look it up
+        _, queries = self.user_queries("/api/categories/")
+        self.assertEqual(queries, [])
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        user_cache.invalidate(self.user.pk)  # As if the window had passed
+        self.assertEqual(self.client.get("/api/db/routing-stats/").status_code, 403)
+
+    def test_refresh_reissues_claims(self):
+        refresh = RefreshToken.for_user(self.user)
+        User.objects.filter(pk=self.user.pk).update(username="renamed")
+        response = self.client.post(
+            "/api/users/token/refresh/", {"refresh": str(refresh)}
+        )
+        self.assertEqual(response.status_code, 200)
+        for token in (
+            RefreshToken(response.json()["refresh"]),
+            RefreshToken(response.json()["refresh"]).access_token,
+        ):
+            self.assertEqual(token["username"], "renamed")
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(
+            "/api/users/token/refresh/", {"refresh": response.json()["refresh"]}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_claims_user_is_read_only(self):
+        user = claims_user(RefreshToken.for_user(self.user).access_token)
+        with self.assertRaises(TypeError):
+            user.save()
+        with self.assertRaises(TypeError):
+            user.delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, "owner")
+
+    def test_profile_update_saves_the_stored_user(self):
+        self.authenticate(RefreshToken.for_user(self.user).access_token)
+        response = self.client.patch("/api/users/profile/", {"username": "renamed"})
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, "renamed")
+        self.assertTrue(self.user.check_password("s3cret-pass"))
+
+
+class TokenBlacklistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="owner@example.com", username="owner", password="s3cret-pass"
+        )
+
+    def setUp(self):
+        throttling.store.clear()
+        blacklist_filter.reset()
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post("/api/users/token/refresh/", {"refresh": str(token)})
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        added = [uuid.uuid4().hex for _ in range(1000)]
+        for jti in added:
+            bloom.add(jti)
+        self.assertTrue(all(jti in bloom for jti in added))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_valid_refresh_skips_blacklist_query(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist_filter.sync()
+        table = BlacklistedToken._meta.db_table
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        # Rotation still writes the old token to the blacklist, but the
+        # membership check (an EXISTS query joined on jti) is skipped
+        checks = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith(f'SELECT 1 AS "a" FROM "{table}"')
+        ]
+        self.assertEqual(checks, [])
+
+    def test_rotated_and_logged_out_tokens_are_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        rotated = self.refresh(token).json()["refresh"]
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+        self.client.force_authenticate(self.user)
+        self.client.post("/api/users/logout/", {"refresh": rotated})
+        self.assertEqual(self.refresh(rotated).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=timedelta(0))
+    def test_picks_up_blacklist_rows_from_other_processes(self):
+        token = RefreshToken.for_user(self.user)
+        blacklist_filter.sync()
+        # bulk_create sends no signals, like a write from another worker
+        outstanding = OutstandingToken.objects.get(jti=token["jti"])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=timedelta(0))
+    def test_picks_up_rows_committed_out_of_id_order(self):
+        first, second = (RefreshToken.for_user(self.user) for _ in range(2))
+        outstanding = {
+            token.jti: token
+            for token in OutstandingToken.objects.filter(
+                jti__in=[first["jti"], second["jti"]]
+            )
+        }
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(id=10, token=outstanding[first["jti"]])]
+        )
+        blacklist_filter.sync()
+        # A lower id, stamped before the last sync but committed after it
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(id=5, token=outstanding[second["jti"]])]
+        )
+        BlacklistedToken.objects.filter(id=5).update(
+            blacklisted_at=timezone.now() - timedelta(seconds=30)
+        )
+        self.assertEqual(self.refresh(second).status_code, 401)
+
+    def test_prune_tokens(self):
+        now = timezone.now()
+        tokens = OutstandingToken.objects.bulk_create(
+            OutstandingToken(
+                user=self.user,
+                jti=uuid.uuid4().hex,
+                token="",
+                expires_at=now + timedelta(days=1 if i % 2 else -1),
+            )
+            for i in range(10)
+        )
+        BlacklistedToken.objects.bulk_create(
+            BlacklistedToken(token=token) for token in tokens[:4]
+        )
+
+        call_command("prune_tokens", chunk_size=2, pause=0, stdout=io.StringIO())
+
+        self.assertEqual(OutstandingToken.objects.filter(expires_at__lt=now).count(), 0)
+        self.assertEqual(OutstandingToken.objects.count(), 5)
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+
+def _hit_store(path, count):
+    store = SlidingWindowStore(path, slots=64)
+    for _ in range(count):
+        store.hit("client", 1000, 86400)
+
+
+class ThrottleTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.store = SlidingWindowStore(f"{self.dir.name}/throttle.bin", slots=64)
+
+    def test_sliding_window(self):
+        hits = [self.store.hit("client", 10, 60, now=600 + i) for i in range(11)]
+        self.assertTrue(all(allowed for allowed, _ in hits[:10]))
+        self.assertEqual(hits[10][0], False)
+        self.assertEqual(hits[10][1], 60 - 10)
+
+        # Halfway through the next window, half of the previous one counts
+        self.assertEqual(self.store.hit("client", 10, 60, now=690)[0], True)
+        self.assertEqual(
+            [self.store.hit("client", 10, 60, now=690)[0] for _ in range(5)],
+            [True, True, True, True, False],
+        )
+        # Other clients are counted separately
+        self.assertTrue(self.store.hit("other", 10, 60, now=690)[0])
+
+    def test_shared_store_follows_the_path_setting(self):
+        # The test runner moved it off the file a server would be using
+        self.assertNotEqual(
+            settings.THROTTLE_STORE_PATH, settings.BASE_DIR / "data" / "throttle.bin"
+        )
+        path = f"{self.dir.name}/other.bin"
+        with override_settings(THROTTLE_STORE_PATH=path):
+            self.assertTrue(throttling.store.hit("client", 10, 60)[0])
+        self.assertTrue(os.path.exists(path))
+
+    def test_full_probe_range_evicts_the_oldest_slot(self):
+        store = SlidingWindowStore(f"{self.dir.name}/small.bin", slots=4)
+        for i in range(10):
+            self.assertTrue(store.hit(f"client-{i}", 1, 60, now=600 + i)[0])
+
+    def test_counts_are_shared_between_processes(self):
+        path = f"{self.dir.name}/shared.bin"
+        processes = [
+            multiprocessing.get_context("fork").Process(
+                target=_hit_store, args=(path, 50)
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        store = SlidingWindowStore(path, slots=64)
+        self.assertEqual(store.hit("client", 200, 86400)[0], False)
+        self.assertEqual(store.hit("client", 201, 86400)[0], True)
+
+    def test_anonymous_requests_are_throttled(self):
+        throttling.store.clear()
+        client = APIClient()
+        statuses = [client.post("/api/users/login/", {}).status_code for _ in range(6)]
+        self.assertEqual(statuses, [400] * 5 + [429])
@@ -0,0 +1,195 @@
+"""
+Sliding-window rate limiting shared by every worker process on a host.
+
+DRF's throttles keep a list of request timestamps per client in the default
+cache, which is local to each process, so N workers allow N times the rate,
+and every check rewrites the list. Here each client has one fixed-size
+record in a memory-mapped file: the request counts of the current and
+previous fixed windows. The sliding-window estimate is
+
+    previous * (1 - elapsed / duration) + current
+
+so a check is a hash, a bounded probe and a couple of struct reads/writes
+under a file lock, whatever the rate.
+
+Records are stored in an open-addressed table of ``THROTTLE_STORE_SLOTS``
+slots. When every slot in a key's probe range is in use, the least recently
+used one is taken over, which can only make a limit more lenient.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+# key hash, window number, previous window count, current window count
+SLOT = struct.Struct("<QQII")
+PROBES = 8
+
+
+def key_hash(key):
+    # Python's hash() is salted per process; this has to agree across them
+    return (
+        int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        or 1
+    )
+
+
+class SlidingWindowStore:
+    def __init__(self, path=None, slots=None):
+        self.path = path
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._file = None
+        self._map = None
+        self._pid = None
+
+    def _open(self):
+        path = Path(
+            self.path
+            or getattr(settings, "THROTTLE_STORE_PATH", None)
+            or Path(settings.BASE_DIR) / "data" / "throttle.bin"
+        )
+        if self._map is not None:
+            self._map.close()
+            os.close(self._file)
+        self.slots = self.slots or getattr(settings, "THROTTLE_STORE_SLOTS", 65536)
+        size = self.slots * SLOT.size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size != size:
+            os.ftruncate(fd, size)
+        self._file = fd
+        self._map = mmap.mmap(fd, size)
+        self._pid = os.getpid()
+
+    def _acquire(self):
+        self._lock.acquire()
+        # A forked worker needs its own file description, or its flock()
+        # would be shared with the parent's instead of excluding it
+        if self._pid != os.getpid():
+            self._open()
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+
+    def _release(self):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def hit(self, key, limit, duration, now=None):
+        """
+        Count a request for ``key`` if it is within ``limit`` requests per
+        ``duration`` seconds. Returns ``(allowed, wait)``, where ``wait`` is
+        the number of seconds until a denied request would be allowed.
+        """
+        now = time.time() if now is None else now
+        window, elapsed = divmod(now, duration)
+        window = int(window)
+        weight = 1 - elapsed / duration
+        digest = key_hash(key)
+
+        self._acquire()
+        try:
+            offset, previous, current = self._find(digest, window)
+            if previous * weight + current >= limit:
+                return False, self._wait(previous, current, limit, elapsed, duration)
+            SLOT.pack_into(self._map, offset, digest, window, previous, current + 1)
+            return True, None
+        finally:
+            self._release()
+
+    def _find(self, digest, window):
+        """Offset of ``digest``'s slot and its counts, rolled to ``window``."""
+        start = digest % self.slots
+        free = oldest = None
+        oldest_window = None
+        for probe in range(PROBES):
+            offset = (start + probe) % self.slots * SLOT.size
+            slot_digest, slot_window, previous, current = SLOT.unpack_from(
+                self._map, offset
+            )
+            if slot_digest == digest:
+                if slot_window == window:
+                    return offset, previous, current
+                if slot_window == window - 1:
+                    return offset, current, 0
+                return offset, 0, 0
+            if free is None and (slot_digest == 0 or slot_window < window - 1):
+                free = offset  # Empty, or its counts no longer matter
+            if oldest is None or slot_window < oldest_window:
+                oldest, oldest_window = offset, slot_window
+        return (oldest if free is None else free), 0, 0
+
+    @staticmethod
+    def _wait(previous, current, limit, elapsed, duration):
+        if current >= limit or not previous:
+            return duration - elapsed
+        # Until the previous window's weight has decayed enough
+        return max(0.0, duration * (1 - (limit - current) / previous) - elapsed)
+
+    def clear(self):
+        self._acquire()
+        try:
+            self._map[:] = bytes(len(self._map))
+        finally:
+            self._release()
+
+    def close(self):
+        """Unmap the file; the next check opens it again."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                os.close(self._file)
+            self._file = self._map = self._pid = None
+
+
+store = SlidingWindowStore()
+
+
+def _reopen_store(setting, **kwargs):
+    if setting == "THROTTLE_STORE_PATH":
+        store.close()
+
+
+setting_changed.connect(_reopen_store)
+
+
+class SlidingWindowThrottleMixin:
+    store = store
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self.wait_seconds = self.store.hit(
+            self.key, self.num_requests, self.duration, self.timer()
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonSlidingWindowThrottle(SlidingWindowThrottleMixin, AnonRateThrottle):
+    pass
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottleMixin, UserRateThrottle):
+    pass
@@ -0,0 +1,27 @@
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+
+from .blacklist import blacklist_filter
+
+# User fields embedded in every token, so requests can be authenticated
+# without loading the user (see authentication.StatelessJWTAuthentication).
+# Not is_staff: privileges are always read from the stored user.
+USER_CLAIMS = ("email", "username", "is_active")
+
+
+class RefreshToken(tokens.RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        """Copy ``user``'s current USER_CLAIMS into the token."""
+        for claim in USER_CLAIMS:
+            self[claim] = getattr(user, claim)
+
+    def check_blacklist(self):
+        # Only JTIs the filter may contain need the database check
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
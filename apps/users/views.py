@@ -1,7 +1,7 @@
 from rest_framework import generics, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
 from .models import User
+from .tokens import RefreshToken
 from .serializers import RegisterSerializer, UserSerializer
 from rest_framework import status
 
@@ -67,4 +67,5 @@ class ProfileUpdateView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user may be built from token claims; edit the stored user
+        return User.objects.get(pk=self.request.user.pk)
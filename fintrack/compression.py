@@ -0,0 +1,122 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+Brotli (``br``) is used when the client accepts it and the ``brotli``
+package is installed, otherwise gzip. Responses smaller than
+``COMPRESSION_MIN_SIZE`` bytes are sent as they are, as compressing them
+costs more time than it saves on the wire; streaming responses (exports)
+are compressed chunk by chunk whatever their size. Otherwise this behaves
+like Django's GZipMiddleware, which it replaces: ``Vary: Accept-Encoding``
+and weakened ETags on compressed responses, and random padding in the
+gzip header against BREACH.
+"""
+
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+# Close to gzip's speed, with noticeably smaller output
+BROTLI_QUALITY = 4
+
+_coding_re = re.compile(r"^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+
+def accepted_codings(header):
+    """Content codings in an Accept-Encoding header, mapped to their q-value."""
+    codings = {}
+    for part in header.split(","):
+        match = _coding_re.match(part)
+        if match:
+            try:
+                codings[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                pass
+    return codings
+
+
+def choose_coding(header):
+    """The coding to compress a response with, or None."""
+    codings = accepted_codings(header)
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    quality = {coding: codings.get(coding, codings.get("*", 0)) for coding in offered}
+    # max() keeps the first of equals, so brotli wins ties
+    best = max(offered, key=quality.get)
+    return best if quality[best] > 0 else None
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        # Flush so that each chunk is sent as soon as it is ready
+        yield compressor.process(item) + compressor.flush()
+    yield compressor.finish()
+
+
+async def _abrotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    async for item in sequence:
+        yield compressor.process(item) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = choose_coding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            content = response.streaming_content
+            if coding == "br":
+                if response.is_async:
+                    response.streaming_content = _abrotli_sequence(content)
+                else:
+                    response.streaming_content = _brotli_sequence(content)
+            elif response.is_async:
+                response.streaming_content = self._agzip_sequence(content)
+            else:
+                response.streaming_content = compress_sequence(
+                    content, max_random_bytes=self.max_random_bytes
+                )
+            del response.headers["Content-Length"]
+        else:
+            if coding == "br":
+                compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+            else:
+                compressed = compress_string(
+                    response.content, max_random_bytes=self.max_random_bytes
+                )
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = coding
+        return response
+
+    async def _agzip_sequence(self, sequence):
+        async for chunk in sequence:
+            yield compress_string(chunk, max_random_bytes=self.max_random_bytes)
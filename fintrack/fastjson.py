@@ -0,0 +1,118 @@
+"""
+JSON encoding and decoding through orjson, when it is installed.
+
+orjson encodes dicts, lists, strings, numbers, dates, datetimes and UUIDs
+in C, straight to UTF-8 bytes. Anything else (Decimal, lazy translation
+strings, querysets, ...) goes through DRF's ``JSONEncoder.default``, so
+the output is the same as DRF's compact ``JSONRenderer``. Without orjson,
+or for indented output (``Accept: application/json; indent=4``), the
+stdlib ``json`` is used.
+
+Decimals come back from it as floats. Those that orjson would write
+differently (below 1e-4 or from 1e16 up: ``0.000099`` and ``1e16`` rather
+than ``9.9e-05`` and ``1e+16``) or as ``null`` (NaN and infinities, which
+DRF rejects) send the whole response to the stdlib. Floats already in the
+data are written by orjson, which is where the output can still differ;
+the API's own numbers are Decimals and integers.
+"""
+
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from fintrack import instrumentation
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib json module
+    orjson = None
+
+# Dict keys that are not strings are converted, as json.dumps does, and
+# UTC datetimes end in "Z", as DRF renders them
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z if orjson else 0
+
+_drf_default = JSONEncoder().default
+
+
+def _default(obj):
+    value = _drf_default(obj)
+    if isinstance(value, float) and not (
+        value == 0 or 1e-4 <= abs(value) < 1e16  # False for NaN
+    ):
+        raise TypeError(f"{value!r} is left to the stdlib")
+    return value
+
+
+def _orjson_dumps(obj):
+    """``obj`` through orjson, or None if it is left to the stdlib."""
+    try:
+        return orjson.dumps(obj, default=_default, option=OPTIONS)
+    except orjson.JSONEncodeError:  # Also integers wider than 64 bits
+        return None
+
+
+def dumps(obj):
+    """``obj`` as compact JSON, in UTF-8 bytes."""
+    if orjson is not None:
+        ret = _orjson_dumps(obj)
+        if ret is not None:
+            return ret
+    return json.dumps(
+        obj,
+        cls=JSONEncoder,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+def loads(data):
+    """Parse JSON from bytes or text; raises ValueError if invalid."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with instrumentation.timing("render"):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None
+            or self.get_indent(accepted_media_type, renderer_context)
+            or not (self.compact and self.ensure_ascii is False)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = _orjson_dumps(data)
+        if ret is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, escape the two characters that are valid in
+        # JSON but not in JavaScript source
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+                b"\xe2\x80\xa9", b"\\u2029"
+            )
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,50 @@
+"""
+Liveness and readiness probes for load balancers and orchestrators. Plain
+Django views: no authentication, throttling or DRF machinery.
+
+The probes are public, so a failure is reported without its details, which
+are logged instead. Migrations only get applied, never unapplied, under a
+running server: once a process has found the database fully migrated, its
+later probes only check that the database is reachable.
+"""
+
+import logging
+
+from django.db import DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger(__name__)
+
+_migrated = False
+
+
+def _unavailable(error):
+    return JsonResponse({"status": "unavailable", "error": error}, status=503)
+
+
+@require_GET
+def live(request):
+    """The process is up and serving requests."""
+    return JsonResponse({"status": "ok"})
+
+
+@require_GET
+def ready(request):
+    """The database is reachable and fully migrated."""
+    global _migrated
+    connection = connections["default"]
+    try:
+        if _migrated:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        else:
+            executor = MigrationExecutor(connection)
+            if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+                return _unavailable("Unapplied migrations.")
+            _migrated = True
+    except DatabaseError:
+        logger.exception("Readiness check failed")
+        return _unavailable("Database unavailable.")
+    return JsonResponse({"status": "ready"})
@@ -0,0 +1,381 @@
+"""
+Per-request performance instrumentation.
+
+``InstrumentationMiddleware`` measures every request: how many database
+queries it ran and how long they took, how long rendering the response
+body took, the rest of the time (view and serializer code), and, with
+``INSTRUMENTATION_TRACE_MEMORY``, the peak memory Python allocated while
+handling it. The figures are sent back in a ``Server-Timing`` header,
+which browsers' developer tools display, and added to per-route
+histograms that ``metrics`` serves in the Prometheus text format.
+
+Timings tell a client how much work its request caused, which can leak
+what other data exists (a slower search has more matches somewhere), so
+the header only goes to everyone with ``DEBUG`` on, and otherwise to staff
+users who ask for it with an ``X-Server-Timing: 1`` request header. Only
+those requests look up the user's staff status, which for a token user
+can cost a query.
+``/metrics`` is closed unless a ``METRICS_TOKEN`` is configured and sent,
+or the request comes from a staff user's session.
+
+Queries are counted by an execute wrapper installed on every database
+connection, which finds the current request's state in a context variable;
+queries that async views run on the DB thread pool count as well. A request
+that runs the same SQL (differing only in its parameters) at least
+``N_PLUS_ONE_THRESHOLD`` times is logged as a likely N+1, such as a
+serializer reading ``category.name`` from a queryset without
+``select_related("category")``, and counted in the metrics.
+
+As with the routing counters, figures are kept per process. Streaming
+responses are measured until the response starts, not while the body is
+sent. Memory tracing is process-wide, so its peaks are only meaningful with
+one request at a time per process (``manage.py serve --threads 1``), and it
+slows every allocation down: leave it off unless looking for one.
+"""
+
+import hmac
+import logging
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from fintrack import routing
+
+logger = logging.getLogger(__name__)
+
+_request_state = ContextVar("instrumentation_state", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+MEMORY_BUCKETS = tuple(2**power for power in range(16, 30, 2))  # 64 KiB-256 MiB
+
+
+class RequestState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = {}
+        self.timings = {}
+        self.memory = 0
+
+    def add_query(self, sql, duration):
+        with self.lock:
+            self.queries += 1
+            self.sql_time += duration
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def repeated(self, threshold):
+        """(count, sql) of each statement run at least ``threshold`` times."""
+        return sorted(
+            (
+                (count, sql)
+                for sql, count in self.statements.items()
+                if count >= threshold
+            ),
+            reverse=True,
+        )
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    state = _request_state.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.add_query(
+            sql if isinstance(sql, str) else str(sql), time.perf_counter() - start
+        )
+
+
+def _install(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        # First, so that connection.execute_wrapper() blocks, which pop the
+        # last wrapper, still remove their own
+        connection.execute_wrappers.insert(0, _execute_wrapper)
+
+
+@contextmanager
+def timing(name):
+    """
+    Add the time spent in the block to the current request's ``name``, less
+    the SQL run in it (such as a serializer's lazy loads), which ``db``
+    already reports.
+    """
+    state = _request_state.get()
+    if state is None:
+        yield
+        return
+    start, sql_start = time.perf_counter(), state.sql_time
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start - (state.sql_time - sql_start)
+        state.timings[name] = state.timings.get(name, 0.0) + max(duration, 0.0)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Label values -> [count per bucket (the last one is +Inf), sum]
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def exposition(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for values, (counts, total) in sorted(self.series.items()):
+            labels = _labels(self.labels, values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            yield f"{self.name}_sum{{{labels}}} {total}"
+            yield f"{self.name}_count{{{labels}}} {cumulative}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def exposition(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for values, count in sorted(self.series.items()):
+            yield f"{self.name}{{{_labels(self.labels, values)}}} {count}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+_metrics_lock = threading.Lock()
+ROUTE = ("route", "method")
+REQUESTS = Counter(
+    "fintrack_requests_total", "Requests handled.", ("route", "method", "status")
+)
+DURATION = Histogram(
+    "fintrack_request_duration_seconds",
+    "Time to handle a request, until its response starts.",
+    ROUTE,
+    DURATION_BUCKETS,
+)
+SQL_TIME = Histogram(
+    "fintrack_request_sql_seconds",
+    "Time spent running SQL per request.",
+    ROUTE,
+    DURATION_BUCKETS,
+)
+SERIALIZE_TIME = Histogram(
+    "fintrack_request_serialize_seconds",
+    "Time spent serializing the response data per request.",
+    ROUTE,
+    DURATION_BUCKETS,
+)
+RENDER_TIME = Histogram(
+    "fintrack_request_render_seconds",
+    "Time spent rendering the response body per request.",
+    ROUTE,
+    DURATION_BUCKETS,
+)
+QUERIES = Histogram(
+    "fintrack_request_queries", "Database queries per request.", ROUTE, QUERY_BUCKETS
+)
+PEAK_MEMORY = Histogram(
+    "fintrack_request_peak_memory_bytes",
+    "Peak memory allocated while handling a request.",
+    ROUTE,
+    MEMORY_BUCKETS,
+)
+N_PLUS_ONE = Counter(
+    "fintrack_n_plus_one_total",
+    "Requests that ran the same SQL statement repeatedly.",
+    ROUTE,
+)
+METRICS = [
+    REQUESTS,
+    DURATION,
+    SQL_TIME,
+    SERIALIZE_TIME,
+    RENDER_TIME,
+    QUERIES,
+    PEAK_MEMORY,
+    N_PLUS_ONE,
+]
+
+
+def route(request):
+    """The request's URL name, low-cardinality enough to label metrics with."""
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+def server_timing(state, total, peak=None):
+    """The Server-Timing header value for a request's figures (seconds)."""
+    rest = total - state.sql_time - sum(state.timings.values())
+    entries = [
+        f'db;dur={state.sql_time * 1000:.2f};desc="{state.queries} queries"',
+        *(
+            f"{name};dur={duration * 1000:.2f}"
+            for name, duration in state.timings.items()
+        ),
+        f'app;dur={max(rest, 0) * 1000:.2f};desc="View code"',
+        f"total;dur={total * 1000:.2f}",
+    ]
+    if peak is not None:
+        entries.append(f'mem;desc="Peak {peak // 1024} KiB"')
+    return ", ".join(entries)
+
+
+def _is_staff(request):
+    user = getattr(request, "user", None)
+    return user is not None and user.is_staff
+
+
+class InstrumentationMiddleware:
+    """
+    Time each request, add the figures to the ``/metrics`` histograms and,
+    with ``DEBUG`` or for staff who ask, send them in a ``Server-Timing``
+    header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.n_plus_one_threshold = getattr(settings, "N_PLUS_ONE_THRESHOLD", 5)
+        self.trace_memory = getattr(settings, "INSTRUMENTATION_TRACE_MEMORY", False)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        connection_created.connect(_install, dispatch_uid=__name__)
+        for connection in connections.all(initialized_only=True):
+            _install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, start = self.start()
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        self.finish(request, response, state, start)
+        return response
+
+    async def __acall__(self, request):
+        state, start = self.start()
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        self.finish(request, response, state, start)
+        return response
+
+    def start(self):
+        state = RequestState()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            state.memory = tracemalloc.get_traced_memory()[0]
+        return state, time.perf_counter()
+
+    def finish(self, request, response, state, start):
+        total = time.perf_counter() - start
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - state.memory
+        if settings.DEBUG or (
+            request.headers.get("X-Server-Timing") == "1" and _is_staff(request)
+        ):
+            response["Server-Timing"] = server_timing(state, total, peak)
+
+        labels = (route(request), request.method)
+        repeated = state.repeated(self.n_plus_one_threshold)
+        for count, sql in repeated:
+            logger.warning(
+                "Possible N+1 in %s %s (%s): %d runs of %s",
+                request.method,
+                request.path,
+                labels[0],
+                count,
+                sql,
+            )
+        with _metrics_lock:
+            REQUESTS.inc((*labels, response.status_code))
+            DURATION.observe(labels, total)
+            SQL_TIME.observe(labels, state.sql_time)
+            SERIALIZE_TIME.observe(labels, state.timings.get("serialize", 0.0))
+            RENDER_TIME.observe(labels, state.timings.get("render", 0.0))
+            QUERIES.observe(labels, state.queries)
+            if peak is not None:
+                PEAK_MEMORY.observe(labels, peak)
+            if repeated:
+                N_PLUS_ONE.inc(labels)
+
+
+def exposition():
+    """Every metric of this process, in the Prometheus text format."""
+    with _metrics_lock:
+        lines = [line for metric in METRICS for line in metric.exposition()]
+    lines.append(
+        "# HELP fintrack_db_routing_total Database routing decisions (see routing)."
+    )
+    lines.append("# TYPE fintrack_db_routing_total counter")
+    for decision, count in sorted(routing.stats().items()):
+        lines.append(f'fintrack_db_routing_total{{decision="{decision}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+@require_GET
+def metrics(request):
+    """
+    Prometheus scrape endpoint, for requests that send ``METRICS_TOKEN`` as
+    ``Authorization: Bearer <token>`` or come from a staff user's session.
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    authorized = bool(token) and hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    )
+    if not (authorized or _is_staff(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        exposition(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
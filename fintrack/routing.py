@@ -0,0 +1,175 @@
+"""
+Read/write splitting between the primary database and read replicas.
+
+Aliases listed in ``DATABASE_REPLICAS`` hold a copy of ``default`` that may
+lag behind it: a snapshot made by ``manage.py snapshot_replica`` or a real
+replica. Reads go to a replica only while handling a safe (GET/HEAD)
+request to an action a view has listed in ``replica_actions``. Everything
+else reads from the primary:
+- other endpoints;
+- any read after the request has written;
+- every request from a user who wrote within ``REPLICA_PIN_SECONDS``, so
+  users always see their own writes.
+
+Pins are kept in the default cache, which must therefore be shared by every
+worker process (``manage.py serve`` refuses to start several workers with
+replicas and a per-process cache).
+
+Routing decisions are counted per process; see ``stats()``.
+"""
+
+import random
+import threading
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY_PREFIX = "fintrack:db:pinned"
+
+_request_state = ContextVar("db_routing_state", default=None)
+
+_stats_lock = threading.Lock()
+_stats = {"replica_reads": 0, "primary_reads": 0, "writes": 0, "pinned_requests": 0}
+
+
+class RoutingState:
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Routing decisions made by this process since it started."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _pin_key(user_id):
+    return f"{PIN_KEY_PREFIX}:{user_id}"
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user.pk)) is not None
+
+
+def pin(user):
+    """Send ``user``'s reads to the primary until replicas have caught up."""
+    cache.set(_pin_key(user.pk), 1, getattr(settings, "REPLICA_PIN_SECONDS", 60))
+
+
+def read_from_replica(request):
+    """
+    Let the rest of ``request`` read from a replica, unless it has written or
+    its user is pinned to the primary.
+    """
+    state = _request_state.get()
+    if state is None or request.method not in SAFE_METHODS:
+        return
+    if is_pinned(request.user):
+        _count("pinned_requests")
+        return
+    state.use_replica = True
+
+
+def reading_from_replica():
+    """Whether the current request's reads go to a replica."""
+    state = _request_state.get()
+    return (
+        state is not None and state.use_replica and not state.wrote and bool(replicas())
+    )
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and state.use_replica and not state.wrote:
+            aliases = replicas()
+            if aliases:
+                _count("replica_reads")
+                return random.choice(aliases)
+        _count("primary_reads")
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        _count("writes")
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so any two rows can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Track each request's routing state and pin users after a write."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        self.finish(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state.wrote:
+            await sync_to_async(self.finish)(request, state)
+        return response
+
+    @staticmethod
+    def finish(request, state):
+        # DRF copies the authenticated user back onto the Django request
+        user = getattr(request, "user", None)
+        if state.wrote and user is not None and user.is_authenticated:
+            pin(user)
+
+
+class ReplicaReadMixin:
+    """
+    Serve the view actions listed in ``replica_actions`` from a read
+    replica, for safe requests from users without a recent write.
+    """
+
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            read_from_replica(request)
@@ -0,0 +1,77 @@
+"""
+Gunicorn, configured for ``manage.py serve``.
+
+The master process loads Django, imports the URLconf and every view once
+(``preload_app``), then forks the workers, which therefore start with all
+of that already in (copy-on-write shared) memory. Each worker exits after
+``max_requests`` requests, plus some jitter so that workers do not all
+restart at once, and the master replaces it. SIGTERM stops the workers
+gracefully, letting them finish the requests in progress.
+
+Workers are gunicorn's threaded WSGI workers, which keep connections alive
+between requests. With ``asgi=True`` they are uvicorn workers running the
+ASGI application instead, for the async views.
+"""
+
+import os
+
+from django.db import connections
+from django.urls import get_resolver
+from gunicorn.app.base import BaseApplication
+
+ASGI_WORKER = "uvicorn_worker.UvicornWorker"
+
+
+def _pre_fork(server, worker):
+    # Connections must not be shared with the forked workers
+    connections.close_all()
+
+
+class GunicornServer(BaseApplication):
+    def __init__(
+        self,
+        host="0.0.0.0",
+        port=8000,
+        workers=None,
+        threads=4,
+        max_requests=10000,
+        max_requests_jitter=1000,
+        backlog=2048,
+        asgi=False,
+        access_log=False,
+    ):
+        self.asgi = asgi
+        self.options = {
+            "bind": f"[{host}]:{port}" if ":" in host else f"{host}:{port}",
+            "workers": workers or os.cpu_count() or 1,
+            "max_requests": max_requests,
+            "max_requests_jitter": max_requests_jitter,
+            "backlog": backlog,
+            "preload_app": True,
+            "pre_fork": _pre_fork,
+            "accesslog": "-" if access_log else None,
+        }
+        if asgi:
+            self.options["worker_class"] = ASGI_WORKER
+        else:
+            self.options["worker_class"] = "gthread"
+            self.options["threads"] = threads
+        super().__init__()
+
+    def load_config(self):
+        for name, value in self.options.items():
+            self.cfg.set(name, value)
+
+    def load(self):
+        if self.asgi:
+            from django.core.asgi import get_asgi_application
+
+            application = get_asgi_application()
+        else:
+            from django.core.wsgi import get_wsgi_application
+
+            application = get_wsgi_application()
+        # Import the URLconf and, through it, every view module now rather
+        # than on each worker's first request
+        get_resolver().url_patterns
+        return application
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from urllib.parse import quote
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,14 +51,14 @@ INSTALLED_APPS = [
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "apps.users.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "apps.users.throttling.AnonSlidingWindowThrottle",
+        "apps.users.throttling.UserSlidingWindowThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": "5/minute",  # 5 requests per minute for anonymous users
@@ -64,6 +66,16 @@ REST_FRAMEWORK = {
     },
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # orjson when installed, else the same output through the stdlib
+    "DEFAULT_RENDERER_CLASSES": [
+        "fintrack.fastjson.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "fintrack.fastjson.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
 
@@ -89,18 +101,57 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "apps.users.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "apps.users.serializers.TokenRefreshSerializer",
 }
 
+# Access tokens younger than this authenticate from their claims alone; older
+# ones are checked against a per-process user cache refreshed this often. A
+# deactivated user is locked out within this window.
+STATELESS_USER_WINDOW = timedelta(minutes=5)
+STATELESS_USER_CACHE_SIZE = 10000
+
+# Blacklist writes from other worker processes reach this process's token
+# blacklist filter within this interval.
+TOKEN_BLACKLIST_SYNC_INTERVAL = timedelta(seconds=1)
+# Each sync re-reads rows blacklisted this long before the previous one, for
+# transactions that commit late and for clock differences between hosts.
+TOKEN_BLACKLIST_SYNC_OVERLAP = timedelta(minutes=1)
+
+# Rate limit counters, shared by all worker processes through this file.
+THROTTLE_STORE_PATH = BASE_DIR / "data" / "throttle.bin"
+THROTTLE_STORE_SLOTS = 65536
+
+# Tests keep the rate limit counters in a temporary file instead
+TEST_RUNNER = "fintrack.test_runner.TestRunner"
+
 MIDDLEWARE = [
+    "fintrack.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "fintrack.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "fintrack.routing.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Responses smaller than this are not compressed
+COMPRESSION_MIN_SIZE = 1024
+
+# Per-request query counts and timings, sent in a Server-Timing header (with
+# DEBUG, or to staff who ask) and served at /metrics to staff sessions and
+# holders of METRICS_TOKEN (see fintrack/instrumentation.py). A request running
+# the same SQL N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1.
+# Memory tracing slows every allocation down; enable it only to investigate.
+INSTRUMENTATION_ENABLED = True
+INSTRUMENTATION_TRACE_MEMORY = False
+N_PLUS_ONE_THRESHOLD = 5
+# When set, /metrics also accepts "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("FINTRACK_METRICS_TOKEN")
+
 ROOT_URLCONF = "fintrack.urls"
 
 TEMPLATES = [
@@ -124,14 +175,98 @@ WSGI_APPLICATION = "fintrack.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run once on every new SQLite connection. WAL lets readers proceed while a
+# write is in progress; synchronous=NORMAL is durable across crashes of the
+# app (only a power loss can drop the last commits). mmap and a 64 MiB page
+# cache keep hot pages out of read() calls.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # Negative means KiB
+    "temp_store": "MEMORY",
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         # "NAME": BASE_DIR / "db.sqlite3",
         "NAME": BASE_DIR / "data" / "db.sqlite3",
+        # Keep connections open between requests
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
+            # atomic() takes the write lock up front with BEGIN IMMEDIATE, so
+            # a transaction never fails trying to upgrade a read lock; other
+            # writers wait up to `timeout` seconds (busy_timeout) for it.
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
     }
 }
 
+# Read replicas: a comma-separated list of SQLite files refreshed from the
+# primary by `manage.py snapshot_replica`. Safe analytics and list requests
+# read from them (see fintrack/routing.py); users who wrote within
+# REPLICA_PIN_SECONDS keep reading from the primary. Snapshots are opened
+# read-only and stay in rollback-journal mode, so they have no -wal/-shm
+# files for a new snapshot to get out of step with.
+DATABASE_REPLICAS = []
+for index, path in enumerate(
+    filter(None, os.environ.get("FINTRACK_REPLICA_PATHS", "").split(","))
+):
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": f"file:{quote(path)}?mode=ro",
+        # Reconnect per request so a new snapshot is picked up promptly
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {
+            "init_command": ";".join(
+                f"PRAGMA {name}={value}"
+                for name, value in SQLITE_PRAGMAS.items()
+                if name != "journal_mode"
+            ),
+            "timeout": 20,
+        },
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["fintrack.routing.ReadReplicaRouter"]
+
+# Threads per process that run the async analytics views' queries
+ASYNC_DB_THREADS = 8
+REPLICA_PIN_SECONDS = 60
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Analytics responses, ETag/Last-Modified stamps, data versions and replica
+# pins live here. Local memory is per process, so with more than one worker
+# on a single box point FINTRACK_CACHE_DIR at a directory to share a
+# file-based cache instead: otherwise, after a write handled by one worker,
+# another keeps serving the responses it invalidated. ``manage.py serve``
+# runs a single worker unless the cache is shared.
+
+if os.environ.get("FINTRACK_CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ["FINTRACK_CACHE_DIR"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "fintrack",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
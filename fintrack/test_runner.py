@@ -0,0 +1,26 @@
+import tempfile
+from pathlib import Path
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Keep the rate limit counters in a temporary file while testing, so that
+    tests clearing them leave the limits of a server running from the same
+    checkout alone.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._throttle_dir = tempfile.TemporaryDirectory()
+        self._throttle_settings = override_settings(
+            THROTTLE_STORE_PATH=Path(self._throttle_dir.name) / "throttle.bin"
+        )
+        self._throttle_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._throttle_settings.disable()
+        self._throttle_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
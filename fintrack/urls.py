@@ -20,8 +20,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from fintrack import health, instrumentation
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("health/live/", health.live, name="health-live"),
+    path("health/ready/", health.ready, name="health-ready"),
+    path("metrics", instrumentation.metrics, name="metrics"),
     path("api/users/", include("apps.users.urls")),
     path("api/", include("apps.transactions.urls")),
 ]